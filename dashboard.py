@@ -1,8 +1,10 @@
 import dash
-from dash import dcc, html
+from dash import dcc, html, Input, Output, State
+from flask import jsonify
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 from pathlib import Path
 import numpy as np
 import json
@@ -12,58 +14,87 @@ import matplotlib.pyplot as plt
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
 import seaborn as sns
+import logging
+import os
+import threading
+import time
+from downsampling import downsample_series, parse_axis_range, rasterize_points, to_numeric_axis
+from figure_transport import enable_compression, encode_figure, log_payload_sizes
+from instrumentation import callback_latency_report, format_report, memory_usage, timed, timed_callback
+from region_geometry import level_for_scale, load_region_geometry
+from metrics.common.aggregations import aggregate_by_key
+from metrics.common.time_buckets import minute_of_day
+from metrics.common.calendar_cube import monthly_totals, week_rows, weekday_values
+from metrics.common.send_time import WEEKDAY_NAMES, recommend_send_windows, \
+    selection_counts, smoothed_shares
+from metrics.common.sorted_index import lookup_rows
+
+# Настройка логирования
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('Dashboard')
 
 # Загружаем данные из разных файлов
 PROJECT_ROOT = Path(__file__).parent.parent.parent
+PROCESSED_DIR = PROJECT_ROOT / 'Хакатон' / 'Stream_telecom' / 'processed_data'
+
+# Файлы пайплайна, которые читает дашборд
+DATA_FILES = {
+    # 1. Данные за первые 4 часа
+    'df_4hours': 'processed_data_first_4_hours.parquet',
+    # 2. Данные по дням
+    'df_days': 'processed_data_per_day.parquet',
+    # 3. Данные по месяцам
+    'df_months': 'processed_data_per_month.parquet',
+    # 4. Данные динамики кампаний
+    # Куб ISO год x неделя x день недели созданных кампаний
+    'campaign_calendar': 'campaign_dynamics_calendar.npz',
+    # 5. Данные скорости реакции: общая статистика, гистограмма и процентили (готовые корзины)
+    'overall_stats': 'response_time_analysis_overall_stats.json',
+    'response_histogram': 'response_time_analysis_histogram.parquet',
+    'response_percentiles': 'response_time_analysis_percentiles.parquet',
+    # Клики
+    'clicks_df': 'clicks_processed.parquet',
+    # Активность по часам и по регионам
+    'hour_activity': 'activity_by_timezone_by_hour.parquet',
+    'region_activity': 'activity_by_timezone_by_region.parquet',
+    # Матрица регион x устройство x час недели для рекомендаций времени отправки
+    'send_time_matrix': 'send_time_matrix.npz',
+    # Скользящие суммы, рост и аномалии дневных рядов кликов и кампаний
+    'time_series': 'time_series_daily.parquet',
+    # Удержание пользователей по недельным когортам первого клика
+    'retention': 'retention_week.parquet',
+    # Индексы итогов по клиентам: сами таблицы читаются по группам строк при выборе клиента
+    'member_rollups_index': 'member_rollups_index.npz',
+    'member_campaigns_index': 'member_campaigns_index.npz',
+    # Клики и уникальные пользователи по OS x устройство x браузер x час и итоги по срезам
+    'device_activity': 'device_activity.parquet',
+    'device_summary': 'device_activity_summary.parquet'
+}
 
-# 1. Данные за первые 4 часа
-df_4hours = pd.read_parquet(
-    PROJECT_ROOT / 'Хакатон' / 'Stream_telecom' / 'processed_data' / 'processed_data_first_4_hours.parquet')
-
-# 2. Данные по дням
-df_days = pd.read_parquet(
-    PROJECT_ROOT / 'Хакатон' / 'Stream_telecom' / 'processed_data' / 'processed_data_per_day.parquet')
-
-# 3. Данные по месяцам
-df_months = pd.read_parquet(
-    PROJECT_ROOT / 'Хакатон' / 'Stream_telecom' / 'processed_data' / 'processed_data_per_month.parquet')
-
-# 4. Данные динамики кампаний
-daily_dynamics = pd.read_parquet(
-    PROJECT_ROOT / 'Хакатон' / 'Stream_telecom' / 'processed_data' / 'campaign_dynamics_daily.parquet')
-monthly_dynamics = pd.read_parquet(
-    PROJECT_ROOT / 'Хакатон' / 'Stream_telecom' / 'processed_data' / 'campaign_dynamics_monthly.parquet')
-
-# 5. Данные скорости реакции
-response_stats = pd.read_parquet(
-    PROJECT_ROOT / 'Хакатон' / 'Stream_telecom' / 'processed_data' / 'response_time_analysis_campaign_stats.parquet')
-
-with open(
-        PROJECT_ROOT / 'Хакатон' / 'Stream_telecom' / 'processed_data' / 'response_time_analysis_overall_stats.json') as f:
-    overall_stats = json.load(f)
+# Таблицы итогов по клиентам, отсортированные по member_id (индекс -> таблица).
+# Целиком не загружаются, но входят в версию данных: индекс и таблица всегда из одной версии
+MEMBER_TABLES = {
+    'member_rollups_index': 'member_rollups.parquet',
+    'member_campaigns_index': 'member_campaigns.parquet'
+}
 
-# Загружаем клики
-clicks_df = pd.read_parquet(
-    PROJECT_ROOT / 'Хакатон' / 'Stream_telecom' / 'processed_data' / 'clicks_processed.parquet')
+# Сколько кампаний клиента показывать на графике
+MEMBER_TOP_CAMPAIGNS = 20
 
-# 1. Загрузка данных активности по часам
-hour_activity = pd.read_parquet(
-    PROJECT_ROOT / 'Хакатон' / 'Stream_telecom' / 'processed_data' / 'activity_by_timezone_by_hour.parquet')
+# Сколько клиентов предлагать в списке выбора (поиск по началу member_id)
+MEMBER_OPTIONS = 50
 
-# 2. Загрузка данных активности по регионам
-region_activity = pd.read_parquet(
-    PROJECT_ROOT / 'Хакатон' / 'Stream_telecom' / 'processed_data' / 'activity_by_timezone_by_region.parquet')
+# Длина рекомендуемого окна получения (часы) и число окон
+SEND_WINDOW_HOURS = 2
+SEND_WINDOWS_TOP = 3
 
-# Уникальные клиенты
-unique_clients = clicks_df['uid'].nunique()
-# или если нужно по member_id:
-# unique_clients = clicks_df['member_id'].nunique()
+# Как часто фоновый поток проверяет, не пересчитал ли пайплайн данные (секунды)
+REFRESH_INTERVAL = 30
 
 
-# Инициализация Dash-приложения
-app = dash.Dash(__name__, external_stylesheets=['styles.css'])
-app.title = "Анализ активности кампаний"
-
 # Настройки для всплывающих подсказок
 tooltip_style = {
     'bgcolor': 'rgba(30, 30, 30, 0.9)',
@@ -249,16 +280,25 @@ REGION_NAMES = {
     101: "Забайкальский край"
 }
 
-def load_and_prepare_geo_data():
-    """Загрузка и подготовка данных для тепловой карты по регионам России"""
+# Границы регионов: упрощаются один раз при старте и кэшируются на диске
+REGION_GEOMETRY = load_region_geometry(
+    REGION_NAMES,
+    cache_file=PROCESSED_DIR / 'russia_regions_simplified.json'
+)
 
-    clicks_file = PROJECT_ROOT / 'Хакатон' / 'Stream_telecom' / 'processed_data' / 'clicks_processed.parquet'
-    clicks = pd.read_parquet(clicks_file)
+weekdays_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+russian_weekdays = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+months_order = ['January', 'February', 'March', 'April', 'May', 'June',
+                'July', 'August', 'September', 'October', 'November', 'December']
+russian_months = ['Янв', 'Фев', 'Мар', 'Апр', 'Май', 'Июн',
+                  'Июл', 'Авг', 'Сен', 'Окт', 'Ноя', 'Дек']
+
+
+def load_and_prepare_geo_data(clicks):
+    """Подготовка данных для тепловой карты по регионам России"""
 
     # Группируем по региону и считаем уникальных клиентов по uid
-    region_stats = clicks.groupby('region').agg(
-        clients_count=('uid', 'nunique')
-    ).reset_index()
+    region_stats = aggregate_by_key(clicks['region'], clicks['uid'], key_name='region', distinct_name='clients_count')
 
     # Добавляем координаты (широта и долгота) из словаря
     region_stats['latitude'] = region_stats['region'].map(lambda x: REGION_COORDINATES.get(x, (None, None))[0])
@@ -273,240 +313,365 @@ def load_and_prepare_geo_data():
     return region_stats
 
 
-def create_plotly_heatmap():
-    """Создание интерактивной тепловой карты с Plotly"""
+# ========================================
+# Загрузка данных
+# ========================================
+def load_json(path):
+    with open(path) as f:
+        return json.load(f)
 
-    data = load_and_prepare_geo_data()
 
-    # Человеко-понятные названия
-    data['Название региона'] = data['region'].map(lambda x: REGION_NAMES.get(x, f"Регион {x}"))
-    data['Количество клиентов'] = data['clients_count']
-    data['Широта'] = data['latitude']
-    data['Долгота'] = data['longitude']
-    data['zcolor'] = np.log1p(data['Количество клиентов'])
+def load_npz(path):
+    """Словарь массивов из .npz (матрица времени отправки, календарный куб)"""
+    with np.load(path) as stored:
+        return {name: stored[name] for name in stored.files}
 
-    fig = px.density_mapbox(
-        data,
-        lat='Широта',
-        lon='Долгота',
-        z='Количество клиентов',
-        radius=25,
-        center=dict(lat=62, lon=94),
-        zoom=3,
-        mapbox_style="carto-positron",  # или "stamen-terrain", если предпочитаешь
-        hover_name='Название региона',
-        hover_data={
-            'Количество клиентов': ':,',
-            'region': False,
-            'Широта': False,
-            'Долгота': False
-        },
-        color_continuous_scale=[
-            #[0.000, '#FFF59D'],  светло-жёлтый (мягкий, но яркий)
-            [0.0000, '#FFEB3B'],  # чистый насыщенный жёлтый
-            [0.010, '#FFC107'],  # тёплый янтарный
-            [0.050, '#FF9800'],  # тёплый ярко-оранжевый
-            [0.100, '#F4511E'],  # огненно-оранжевый
-            [0.350, '#E53935'],  # насыщенный красно-оранжевый
-            [1.000, '#B71C1C']  # глубокий красный (почти винный)
-        ],
 
-    range_color=[data['Количество клиентов'].min(), data['Количество клиентов'].max()],
+def load_dataset(timings):
+    """Загрузка и подготовка всех данных дашборда (один словарь на версию данных)
 
-        opacity=0.8
-    )
+    Время чтения каждого файла и подготовки записывается в timings (секунды).
+    """
+    data = {}
+    for name, file_name in DATA_FILES.items():
+        path = PROCESSED_DIR / file_name
+        reader = {'.json': load_json, '.npz': load_npz}.get(path.suffix, pd.read_parquet)
+        data[name] = timed(timings, file_name, reader, path)
 
-    # Настройка ховеров
-    fig.update_traces(
-        hovertemplate="<b>%{hovertext}</b><br>Клиентов: %{z:,}<extra></extra>"
-    )
+    # Версия таблиц клиентов, к которой относятся загруженные индексы
+    data['member_tables'] = {file_name: file_identity(PROCESSED_DIR / file_name) for file_name in MEMBER_TABLES.values()}
+
+    timed(timings, 'подготовка данных', prepare_dataset, data)
+    return data
+
+
+def prepare_dataset(data):
+    """Производные таблицы и массивы, общие для нескольких графиков"""
+
+    # Уникальные клиенты
+    data['unique_clients'] = data['clicks_df']['uid'].nunique()
+    # или если нужно по member_id:
+    # data['unique_clients'] = data['clicks_df']['member_id'].nunique()
+
+    # Клики по дням (ряд прореживается на сервере под текущий масштаб)
+    df_days_sampled = data['df_days'].sort_values('click_date').reset_index(drop=True)
+
+    # Рассчитываем общее количество кликов
+    total_clicks_days = df_days_sampled['total_clicks'].sum()
+
+    # Добавляем столбец с процентом от общего количества
+    df_days_sampled['percentage'] = (df_days_sampled['total_clicks'] / total_clicks_days) * 100
+    data['df_days_sampled'] = df_days_sampled
+
+    # Клики по месяцам: рассчитываем общее количество и процент от него
+    df_months = data['df_months']
+    total_clicks_months = df_months['total_clicks'].sum()
+    df_months['percentage'] = (df_months['total_clicks'] / total_clicks_months) * 100
+
+    # Уровни активности для динамики создания кампаний по дням недели (дни с кампаниями из куба)
+    weekday_counts = weekday_values(data['campaign_calendar'])
+    data['weekday_activity'] = pd.DataFrame({
+        'day_of_week': np.repeat(weekdays_order, [len(values) for values in weekday_counts]),
+        'activity_level': pd.cut(
+            np.concatenate(weekday_counts),
+            bins=[0, 20, 50, 100, 500, 1000, 2000, 3000, 5000, 10000, np.inf],
+            labels=['0-20', '20-50', '50-100', '100-500', '500-1000', '1000-2000', '2000-3000', '3000-5000',
+                    '5000-10000', '10000+']
+        )
+    })
+
+    # Облако точек кликов (дата x время суток), отсортированное по времени
+    clicks_df = data['clicks_df']
+    click_order = np.argsort(clicks_df['click_time'].to_numpy(), kind='stable')
+    data['click_points_x'] = to_numeric_axis(clicks_df['click_time'].to_numpy()[click_order])
+    click_ns = clicks_df['click_time'].to_numpy('datetime64[ns]')[click_order]
+    data['click_points_y'] = np.where(np.isnat(click_ns), np.nan, minute_of_day(click_ns.view('int64')) / 60)
+
+    # Уникальные клиенты по регионам для карты
+    data['geo_region_stats'] = load_and_prepare_geo_data(clicks_df)
+
+
+# ========================================
+# Построение графиков
+# ========================================
+def create_plotly_heatmap(data):
+    """Карта клиентов по центроидам регионов, когда файла границ нет
+
+    Рисуется на обычных осях долгота x широта, без подложки: тайлы карты не загружаются.
+    """
+
+    data = data['geo_region_stats']
+    names = data['region'].map(lambda x: REGION_NAMES.get(x, f"Регион {x}"))
+    clients = data['clients_count']
+
+    fig = go.Figure(go.Scatter(
+        x=data['longitude'],
+        y=data['latitude'],
+        mode='markers',
+        text=names,
+        marker=dict(
+            size=np.sqrt(clients / max(clients.max(), 1)) * 40 + 4,
+            color=clients,
+            colorscale=[
+                [0.0000, '#FFEB3B'],
+                [0.010, '#FFC107'],
+                [0.050, '#FF9800'],
+                [0.100, '#F4511E'],
+                [0.350, '#E53935'],
+                [1.000, '#B71C1C']
+            ],
+            cmin=clients.min(),
+            cmax=clients.max(),
+            opacity=0.8,
+            line=dict(color='rgba(255, 255, 255, 0.3)', width=0.5),
+            colorbar=dict(
+                title='Активность клиентов',
+                tickvals=[clients.min(), clients.median(), clients.max()],
+                ticktext=['Низкая', 'Средняя', 'Высокая']
+            )
+        ),
+        customdata=clients,
+        hovertemplate="<b>%{text}</b><br>Клиентов: %{customdata:,}<extra></extra>"
+    ))
 
-    # Оформление легенды
     fig.update_layout(
         title='🗺️ Распределение клиентов по регионам России',
         margin=dict(l=0, r=0, t=50, b=0),
         height=600,
-        mapbox=dict(
-            zoom=3,
-            center=dict(lat=62, lon=94)
-        ),
-        coloraxis_colorbar=dict(
-            title='Активность клиентов',
-            tickvals=[
-                data['Количество клиентов'].min(),
-                data['Количество клиентов'].median(),
-                data['Количество клиентов'].max()
-            ],
-            ticktext=['Низкая', 'Средняя', 'Высокая']
+        xaxis=dict(visible=False),
+        # Градус широты на 62° с.ш. примерно вдвое длиннее градуса долготы
+        yaxis=dict(visible=False, scaleanchor='x', scaleratio=1 / np.cos(np.radians(62)))
+    )
+
+    return fig
+
+
+def create_plotly_choropleth(data, level=0):
+    """Хороплет регионов по заранее упрощенной локальной геометрии (без загрузки тайлов карты)"""
+    data = data['geo_region_stats']
+    names = data['region'].map(lambda x: REGION_NAMES.get(x, f"Регион {x}"))
+
+    fig = go.Figure(go.Choropleth(
+        geojson=REGION_GEOMETRY[level],
+        featureidkey='id',
+        locations=data['region'],
+        z=data['clients_count'],
+        text=names,
+        colorscale=[
+            [0.0000, '#FFEB3B'],
+            [0.010, '#FFC107'],
+            [0.050, '#FF9800'],
+            [0.100, '#F4511E'],
+            [0.350, '#E53935'],
+            [1.000, '#B71C1C']
+        ],
+        zmin=data['clients_count'].min(),
+        zmax=data['clients_count'].max(),
+        marker_line_color='rgba(255, 255, 255, 0.3)',
+        marker_line_width=0.5,
+        hovertemplate="<b>%{text}</b><br>Клиентов: %{z:,}<extra></extra>"
+    ))
+
+    fig.update_layout(
+        title='🗺️ Распределение клиентов по регионам России',
+        margin=dict(l=0, r=0, t=50, b=0),
+        geo=dict(
+            visible=False,
+            fitbounds='locations',
+            projection=dict(type='conic equal area', rotation=dict(lon=100)),
+            bgcolor='rgba(0,0,0,0)'
         )
     )
 
     return fig
 
 
+def create_geo_figure(data, level=0):
+    """Карта регионов: хороплет, если есть файл границ, иначе тепловая карта по центроидам"""
+    if REGION_GEOMETRY is not None:
+        return create_plotly_choropleth(data, level)
+    return create_plotly_heatmap(data)
+
+
 # 1. Топ-10 кампаний по кликам за первые 4 часа
-fig_top_clicks = px.bar(
-    df_4hours.nlargest(10, 'total_clicks').assign(campaign_id=lambda d: d['campaign_id'].astype(str)),
-    x='campaign_id',
-    y='total_clicks',
-    title='Топ-10 кампаний по кликам (первые 4 часа)',
-    color='total_clicks',
-    color_continuous_scale=['#ffe082', '#ffca28'],
-    labels={'campaign_id': 'ID кампании', 'total_clicks': 'Клики'}
-)
-fig_top_clicks.update_traces(
-    hovertemplate="<b>Кампания:</b> %{x}<br><b>Клики:</b> %{y:,}<extra></extra>"
-)
+def create_top_clicks_figure(data):
+    fig = px.bar(
+        data['df_4hours'].nlargest(10, 'total_clicks').assign(campaign_id=lambda d: d['campaign_id'].astype(str)),
+        x='campaign_id',
+        y='total_clicks',
+        title='Топ-10 кампаний по кликам (первые 4 часа)',
+        color='total_clicks',
+        color_continuous_scale=['#ffe082', '#ffca28'],
+        labels={'campaign_id': 'ID кампании', 'total_clicks': 'Клики'}
+    )
+    fig.update_traces(
+        hovertemplate="<b>Кампания:</b> %{x}<br><b>Клики:</b> %{y:,}<extra></extra>"
+    )
+    return fig
 
-# 2. Клики по дням (с шагом 5 дней для лучшей читаемости)
-df_days_sampled = df_days.sort_values('click_date').iloc[::1, :]
 
-# Рассчитываем общее количество кликов
-total_clicks_days = df_days_sampled['total_clicks'].sum()
+# 2. Клики по дням
+def create_daily_figure(data, x_range=None):
+    """График кликов по дням: в браузер уходит не более MAX_LINE_POINTS точек видимого диапазона"""
+    df_days_sampled = data['df_days_sampled']
+    idx = downsample_series(df_days_sampled['click_date'], df_days_sampled['total_clicks'], x_range)
+    data = df_days_sampled.iloc[idx]
 
-# Добавляем столбец с процентом от общего количества
-df_days_sampled['percentage'] = (df_days_sampled['total_clicks'] / total_clicks_days) * 100
+    fig = px.area(
+        data,
+        x='click_date',
+        y='total_clicks',
+        title='Клики по дням',
+        line_shape='linear',
+        labels={'click_date': 'Дата', 'total_clicks': 'Клики'}
+    )
+    fig.update_traces(
+        line=dict(color='#ffca28', width=2),
+        fillcolor='rgba(255, 202, 40, 0.2)',
+        hovertemplate="<b>Дата:</b> %{x}<br><b>Клики:</b> %{y:,}<br><b>Доля от общего числа:</b> %{customdata:.2f}%<extra></extra>",
+        customdata=data['percentage']
+    )
+    return fig
 
-fig_daily = px.area(
-    df_days_sampled,
-    x='click_date',
-    y='total_clicks',
-    title='Клики по дням',
-    line_shape='linear',
-    labels={'click_date': 'Дата', 'total_clicks': 'Клики'}
-)
-fig_daily.update_traces(
-    line=dict(color='#ffca28', width=2),
-    fillcolor='rgba(255, 202, 40, 0.2)',
-    hovertemplate="<b>Дата:</b> %{x}<br><b>Клики:</b> %{y:,}<br><b>Доля от общего числа:</b> %{customdata:.2f}%<extra></extra>",
-    customdata=df_days_sampled['percentage']
-)
 
 # 3. Клики по месяцам (все данные)
-# Рассчитываем общее количество кликов по месяцам
-total_clicks_months = df_months['total_clicks'].sum()
-
-# Добавляем столбец с процентом от общего количества
-df_months['percentage'] = (df_months['total_clicks'] / total_clicks_months) * 100
-
-fig_monthly = px.area(
-    df_months,
-    x='click_month',
-    y='total_clicks',
-    title='Клики по месяцам',
-    line_shape='linear',
-    labels={'click_month': 'Месяц', 'total_clicks': 'Клики'}
-)
-fig_monthly.update_traces(
-    line=dict(color='#4caf50', width=2),
-    fillcolor='rgba(76, 175, 80, 0.2)',
-    hovertemplate="<b>Месяц:</b> %{x}<br><b>Клики:</b> %{y:,}<br><b>Доля от общего числа:</b> %{customdata:.2f}%<extra></extra>",
-    customdata=df_months['percentage']
-)
+def create_monthly_figure(data):
+    df_months = data['df_months']
+    fig = px.area(
+        df_months,
+        x='click_month',
+        y='total_clicks',
+        title='Клики по месяцам',
+        line_shape='linear',
+        labels={'click_month': 'Месяц', 'total_clicks': 'Клики'}
+    )
+    fig.update_traces(
+        line=dict(color='#4caf50', width=2),
+        fillcolor='rgba(76, 175, 80, 0.2)',
+        hovertemplate="<b>Месяц:</b> %{x}<br><b>Клики:</b> %{y:,}<br><b>Доля от общего числа:</b> %{customdata:.2f}%<extra></extra>",
+        customdata=df_months['percentage']
+    )
+    return fig
 
-# 4. Динамика создания кампаний по дням недели
-weekdays_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-russian_weekdays = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
 
-daily_dynamics['activity_level'] = pd.cut(
-    daily_dynamics['campaigns_count'],
-    bins=[0, 20, 50, 100, 500, 1000, 2000, 3000, 5000, 10000, np.inf],
-    labels=['0-20', '20-50', '50-100', '100-500', '500-1000', '1000-2000', '2000-3000', '3000-5000', '5000-10000',
-            '10000+']
-)
+# 4. Динамика создания кампаний по дням недели
+def create_weekdays_figure(data):
+    weekday_activity = data['weekday_activity']
+    return px.bar(
+        weekday_activity.groupby(['day_of_week', 'activity_level'], observed=False).size().reset_index(name='count'),
+        x='day_of_week',
+        y='count',
+        color='activity_level',
+        category_orders={'day_of_week': weekdays_order},
+        title='Количество созданных компаний по дням недели',
+        labels={'day_of_week': 'День недели', 'count': 'Количество дней'}
+    )
 
-fig_weekdays = px.bar(
-    daily_dynamics.groupby(['day_of_week', 'activity_level']).size().reset_index(name='count'),
-    x='day_of_week',
-    y='count',
-    color='activity_level',
-    category_orders={'day_of_week': weekdays_order},
-    title='Количество созданных компаний по дням недели',
-    labels={'day_of_week': 'День недели', 'count': 'Количество дней'}
-)
 
 # 5. Динамика создания кампаний по месяцам
-months_order = ['January', 'February', 'March', 'April', 'May', 'June',
-                'July', 'August', 'September', 'October', 'November', 'December']
-russian_months = ['Янв', 'Фев', 'Мар', 'Апр', 'Май', 'Июн',
-                  'Июл', 'Авг', 'Сен', 'Окт', 'Ноя', 'Дек']
-
-monthly_sum = monthly_dynamics.groupby('month')['campaigns_count'].sum().reset_index()
+def create_months_figure(data):
+    monthly = monthly_totals(data['campaign_calendar'])
+    monthly_sum = pd.DataFrame({
+        'month': months_order,
+        'campaigns_count': np.bincount(monthly['month'] - 1, weights=monthly['count'], minlength=12).astype('int64')
+    })
 
-fig_months = px.bar(
-    monthly_sum,
-    x='month',
-    y='campaigns_count',
-    title='Количество созданных кампаний по месяцам',
-    labels={'month': 'Месяц', 'campaigns_count': 'Количество кампаний'},
-    color='campaigns_count',
-    color_continuous_scale='Blues'
-)
-fig_months.update_layout(
-    xaxis=dict(
-        categoryorder='array',
-        categoryarray=months_order,
-        tickvals=months_order,
-        ticktext=russian_months
+    fig = px.bar(
+        monthly_sum,
+        x='month',
+        y='campaigns_count',
+        title='Количество созданных кампаний по месяцам',
+        labels={'month': 'Месяц', 'campaigns_count': 'Количество кампаний'},
+        color='campaigns_count',
+        color_continuous_scale='Blues'
     )
-)
+    fig.update_layout(
+        xaxis=dict(
+            categoryorder='array',
+            categoryarray=months_order,
+            tickvals=months_order,
+            ticktext=russian_months
+        )
+    )
+    return fig
+
 
 # 6. Тепловая карта создания кампаний (по дням недели и неделям года)
-heatmap_data = daily_dynamics.pivot_table(
-    index='week_of_year',
-    columns='day_of_week',
-    values='campaigns_count',
-    aggfunc='mean'
-).sort_index(ascending=False)
-
-for day in weekdays_order:
-    if day not in heatmap_data.columns:
-        heatmap_data[day] = 0
-
-heatmap_data = heatmap_data[weekdays_order]
-
-fig_heatmap_week = go.Figure(data=go.Heatmap(
-    z=heatmap_data.values,
-    x=[russian_weekdays[weekdays_order.index(d)] for d in heatmap_data.columns],
-    y=heatmap_data.index.astype(str),
-    colorscale='YlGnBu',
-    hoverongaps=False,
-    hovertemplate="<b>Неделя:</b> %{y}<br><b>День:</b> %{x}<br><b>Кампаний:</b> %{z:.1f}<extra></extra>",
-    zmin=0
-))
-
-fig_heatmap_week.update_layout(
-    title='Создано кампаний по дням недели и неделям года',
-    xaxis_title='День недели',
-    yaxis_title='Неделя года',
-    height=400,
-    width=458,
-    yaxis=dict(
-        autorange=True,
-        type='category',
-        tickmode='array',
-        tickvals=heatmap_data.index.astype(str),
-        ticktext=heatmap_data.index.astype(str)
-    ),
-    xaxis=dict(
-        tickmode='array',
-        tickvals=[russian_weekdays[weekdays_order.index(d)] for d in weekdays_order],
-        ticktext=russian_weekdays
+def create_heatmap_week_figure(data):
+    """Строка - ISO год и неделя, поэтому недели разных лет не смешиваются"""
+    week_labels, week_counts = week_rows(data['campaign_calendar'])
+
+    fig = go.Figure(data=go.Heatmap(
+        z=week_counts,
+        x=russian_weekdays,
+        y=week_labels,
+        colorscale='YlGnBu',
+        hoverongaps=False,
+        hovertemplate="<b>Неделя:</b> %{y}<br><b>День:</b> %{x}<br><b>Кампаний:</b> %{z}<extra></extra>",
+        zmin=0
+    ))
+
+    fig.update_layout(
+        title='Создано кампаний по дням недели и неделям года',
+        xaxis_title='День недели',
+        yaxis_title='Неделя года',
+        height=400,
+        width=458,
+        yaxis=dict(
+            autorange='reversed',
+            type='category'
+        ),
+        xaxis=dict(
+            tickmode='array',
+            tickvals=russian_weekdays,
+            ticktext=russian_weekdays
+        )
     )
-)
+    return fig
+
 
 # 7. График скорости реакции клиентов
-fig_response_time = px.histogram(
-    response_stats,
-    x='avg_response_time_hours',
-    nbins=50,
-    title='Распределение времени реакции клиентов',
-    labels={'avg_response_time_hours': 'Среднее время реакции (часы)', 'count': 'Количество кампаний'},
-    color_discrete_sequence=['#ff7043']
-)
-fig_response_time.update_traces(
-    hovertemplate="<b>Время реакции:</b> %{x:.1f} ч<br><b>Кампаний:</b> %{y}<extra></extra>"
-)
+def create_response_time_figure(data):
+    """Распределение времени реакции по кликам из готовой логарифмической гистограммы"""
+    histogram = data['response_histogram']
+    left = histogram['bin_left_seconds'].to_numpy() / 3600
+    right = histogram['bin_right_seconds'].to_numpy() / 3600
+
+    # Первая корзина начинается с нуля - на логарифмической оси рисуем ее на шаг левее
+    left[0] = right[0] * right[0] / right[1]
+
+    fig = go.Figure(go.Scatter(
+        x=np.r_[left, right[-1]],
+        y=np.r_[histogram['share'].to_numpy(), histogram['share'].iloc[-1]] * 100,
+        customdata=np.c_[np.r_[histogram['bin_left_seconds'] / 3600, right[-1]],
+                         np.r_[right, right[-1]],
+                         np.r_[histogram['clicks'], histogram['clicks'].iloc[-1]]],
+        mode='lines',
+        line=dict(shape='hv', color='#ff7043', width=1.5),
+        fill='tozeroy',
+        fillcolor='rgba(255, 112, 67, 0.35)',
+        hovertemplate="<b>Время реакции:</b> %{customdata[0]:.2f}-%{customdata[1]:.2f} ч<br>"
+                      "<b>Кликов:</b> %{customdata[2]:,}<br><b>Доля:</b> %{y:.2f}%<extra></extra>"
+    ))
+
+    # Процентили времени реакции
+    percentiles = data['response_percentiles']
+    for row in percentiles[percentiles['percentile'].isin([50, 90, 99])].itertuples():
+        fig.add_vline(
+            x=max(row.response_time_hours, left[0]),
+            line=dict(color='#FFCA28', width=1, dash='dash'),
+            annotation_text=f"p{row.percentile}: {row.response_time_hours:.1f} ч",
+            annotation_position='top',
+            annotation_font=dict(color='#FFCA28', size=11)
+        )
+
+    fig.update_layout(
+        title='Распределение времени реакции клиентов',
+        xaxis=dict(title='Время реакции (часы, логарифмическая шкала)', type='log'),
+        yaxis=dict(title='Доля кликов, %'),
+        showlegend=False
+    )
+    return fig
 
 
 # Функция для создания таблицы статистики
@@ -577,6 +742,23 @@ def create_stats_table(stats):
                             'color': '#FFCA28'
                         })
                     ]),
+                    *[html.Tr([
+                        html.Td(label, style={
+                            'text-align': 'left',
+                            'padding': '12px 15px',
+                            'border-bottom': '1px solid rgba(255, 255, 255, 0.1)'
+                        }),
+                        html.Td(f"{stats[key]:.2f} часов", style={
+                            'text-align': 'right',
+                            'padding': '12px 15px',
+                            'border-bottom': '1px solid rgba(255, 255, 255, 0.1)',
+                            'font-weight': 'bold',
+                            'color': '#FFCA28'
+                        })
+                    ]) for label, key in [("Медианное время реакции (p50)", 'median_response_time_hours'),
+                                          ("90-й процентиль (p90)", 'p90_response_time_hours'),
+                                          ("99-й процентиль (p99)", 'p99_response_time_hours')]
+                      if key in stats],
                     html.Tr([
                         html.Td("Максимальное время реакции", style={
                             'text-align': 'left',
@@ -610,20 +792,12 @@ def create_stats_table(stats):
     })
 
 
-# Создаем географическую тепловую карту
-geo_heatmap = create_plotly_heatmap()
-
-
-def create_geo_pie_chart(top_n=5):
+def create_geo_pie_chart(data, top_n=5):
     """Создание круговой диаграммы географического распределения клиентов"""
-    # Загружаем данные кликов
-    clicks_file = PROJECT_ROOT / 'Хакатон' / 'Stream_telecom' / 'processed_data' / 'clicks_processed.parquet'
-    clicks = pd.read_parquet(clicks_file)
+    clicks = data['clicks_df']
 
     # Группируем по регионам и считаем уникальных клиентов
-    region_stats = clicks.groupby('region', observed=False).agg(
-        clients_count=('uid', 'nunique')
-    ).reset_index()
+    region_stats = aggregate_by_key(clicks['region'], clicks['uid'], key_name='region', distinct_name='clients_count')
 
     # Добавляем названия регионов (с заменой null на "Неопознанный регион")
     region_stats['region_name'] = region_stats['region'].map(
@@ -710,104 +884,440 @@ def create_geo_pie_chart(top_n=5):
 
     return fig
 
-# Создаем круговую диаграмму
-geo_pie_chart = create_geo_pie_chart(top_n=5)
 
 # 1. График активности по часам
-fig_hour_activity = px.bar(
-    hour_activity,
-    x='hour',
-    y='percentage',
-    title='Активность клиентов по часам (UTC)',
-    labels={'hour': 'Час дня', 'percentage': 'Процент кликов'},
-    color='percentage',
-    color_continuous_scale=['#1e88e5', '#0d47a1']
-)
-fig_hour_activity.update_traces(
-    hovertemplate="<b>Час:</b> %{x}:00<br><b>Доля кликов:</b> %{y:.1f}%<extra></extra>"
-)
+def create_hour_activity_figure(data):
+    fig = px.bar(
+        data['hour_activity'],
+        x='hour',
+        y='percentage',
+        title='Активность клиентов по часам (местное время)',
+        labels={'hour': 'Час дня', 'percentage': 'Процент кликов'},
+        color='percentage',
+        color_continuous_scale=['#1e88e5', '#0d47a1']
+    )
+    fig.update_traces(
+        hovertemplate="<b>Час:</b> %{x}:00<br><b>Доля кликов:</b> %{y:.1f}%<extra></extra>"
+    )
+    return fig
 
-# Исправленная часть кода для создания графика активности по регионам
 
 # 2. График активности по регионам (исключаем регион 0)
-# Фильтрация (исключаем регион 0) и сортировка
-region_activity_filtered = region_activity[region_activity['region'] != 0].sort_values('total_clicks', ascending=False).head(7)
-
-# Добавляем названия регионов
-region_activity_filtered['region_name'] = region_activity_filtered['region'].map(REGION_NAMES)
-
-# Создаем график с номерами регионов на оси X и названиями в легенде
-fig_region_activity = px.bar(
-    region_activity_filtered,
-    x='region',  # Используем номер региона на оси X
-    y='total_clicks',
-    title='Топ-7 регионов по активности (без неопознанных)',
-    labels={'region_name': 'Код региона', 'total_clicks': 'Количество кликов'},
-    color='region_name',  # Используем названия регионов для цвета
-    color_discrete_sequence=px.colors.qualitative.Pastel
-)
+def create_region_activity_figure(data):
+    region_activity = data['region_activity']
+
+    # Фильтрация (исключаем регион 0) и сортировка
+    region_activity_filtered = region_activity[region_activity['region'] != 0].sort_values('total_clicks', ascending=False).head(7)
+
+    # Добавляем названия регионов
+    region_activity_filtered['region_name'] = region_activity_filtered['region'].map(REGION_NAMES)
+
+    # Создаем график с номерами регионов на оси X и названиями в легенде
+    fig = px.bar(
+        region_activity_filtered,
+        x='region',  # Используем номер региона на оси X
+        y='total_clicks',
+        title='Топ-7 регионов по активности (без неопознанных)',
+        labels={'region_name': 'Код региона', 'total_clicks': 'Количество кликов'},
+        color='region_name',  # Используем названия регионов для цвета
+        color_discrete_sequence=px.colors.qualitative.Pastel
+    )
+
+    # Настраиваем отображение
+    fig.update_layout(
+        xaxis=dict(
+            type='category',  # Чтобы номера регионов отображались как категории
+            tickmode='array',
+            tickvals=region_activity_filtered['region'],
+            ticktext=region_activity_filtered['region']
+        ),
+        legend=dict(
+            title='Регионы',
+            orientation='v',
+            yanchor='top',
+            y=1,
+            xanchor='right',
+            x=1.2
+        )
+    )
 
-# Настраиваем отображение
-fig_region_activity.update_layout(
-    xaxis=dict(
-        type='category',  # Чтобы номера регионов отображались как категории
-        tickmode='array',
-        tickvals=region_activity_filtered['region'],
-        ticktext=region_activity_filtered['region']
-    ),
-    legend=dict(
-        title='Регионы',
-        orientation='v',
-        yanchor='top',
-        y=1,
-        xanchor='right',
-        x=1.2
+    fig.update_traces(
+        hovertemplate="<b>Кликов:</b> %{y:,}<extra></extra>"
     )
-)
+    return fig
 
-fig_region_activity.update_traces(
-    hovertemplate="<b>Кликов:</b> %{y:,}<extra></extra>"
-)
 
-# Добавляем новый график активности по часам (красно-голубой)
-fig_hour_activity_redblue = px.bar(
-    hour_activity,
-    x='hour',
-    y='percentage',
-    title='Оптимальное время для рассылок',
-    labels={'hour': 'Час дня', 'percentage': 'Процент кликов'},
-    color='percentage',
-    color_continuous_scale=['#1e88e5', '#e53935']  # Голубой -> Красный
-)
-fig_hour_activity_redblue.update_traces(
-    hovertemplate="<b>Час:</b> %{x}:00<br><b>Доля кликов:</b> %{y:.1f}%<extra></extra>"
-)
+# Новый график активности по часам (красно-голубой)
+def create_hour_activity_redblue_figure(data):
+    hour_activity = data['hour_activity']
+    fig = px.bar(
+        hour_activity,
+        x='hour',
+        y='percentage',
+        title='Оптимальное время для рассылок',
+        labels={'hour': 'Час дня', 'percentage': 'Процент кликов'},
+        color='percentage',
+        color_continuous_scale=['#1e88e5', '#e53935']  # Голубой -> Красный
+    )
+    fig.update_traces(
+        hovertemplate="<b>Час:</b> %{x}:00<br><b>Доля кликов:</b> %{y:.1f}%<extra></extra>"
+    )
 
-# Обновляем настройки для нового графика
-fig_hour_activity_redblue.update_layout(
-    plot_bgcolor='rgba(0,0,0,0)',
-    paper_bgcolor='rgba(0,0,0,0)',
-    font={'color': '#f5f5dc', 'size': 12},
-    title={'font': {'color': '#fff8dc', 'size': 16}, 'x': 0.5},
-    margin=dict(l=40, r=40, t=60, b=40),
-    height=350,
-    xaxis=dict(showgrid=True, gridcolor='rgba(255,255,255,0.1)', linecolor='rgba(255,255,255,0.3)'),
-    yaxis=dict(showgrid=True, gridcolor='rgba(255,255,255,0.1)', linecolor='rgba(255,255,255,0.3)'),
-    hoverlabel=tooltip_style,
-    coloraxis_colorbar=dict(
-        title='Доля кликов',
-        tickvals=[hour_activity['percentage'].min(), hour_activity['percentage'].max()],
-        ticktext=['Низкая', 'Высокая'],
-        yanchor="top",
-        y=1,
-        xanchor="left",
-        x=1.02
+    # Обновляем настройки для нового графика
+    fig.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#f5f5dc', 'size': 12},
+        title={'font': {'color': '#fff8dc', 'size': 16}, 'x': 0.5},
+        margin=dict(l=40, r=40, t=60, b=40),
+        height=350,
+        xaxis=dict(showgrid=True, gridcolor='rgba(255,255,255,0.1)', linecolor='rgba(255,255,255,0.3)'),
+        yaxis=dict(showgrid=True, gridcolor='rgba(255,255,255,0.1)', linecolor='rgba(255,255,255,0.3)'),
+        hoverlabel=tooltip_style,
+        coloraxis_colorbar=dict(
+            title='Доля кликов',
+            tickvals=[hour_activity['percentage'].min(), hour_activity['percentage'].max()],
+            ticktext=['Низкая', 'Высокая'],
+            yanchor="top",
+            y=1,
+            xanchor="left",
+            x=1.02
+        )
     )
-)
+    return fig
+
+
+# Тренды: скользящие средние кликов и созданных кампаний, аномальные дни
+def create_trends_figure(data):
+    """Окна посчитаны в пайплайне (time_series_daily.parquet), здесь только отрисовка"""
+    time_series = data['time_series']
+    fig = make_subplots(specs=[[{'secondary_y': True}]])
+
+    for window, color in ((7, '#ffca28'), (28, '#ff7043')):
+        fig.add_trace(go.Scatter(
+            x=time_series['date'],
+            y=time_series[f'clicks_{window}d'] / window,
+            name=f'Клики, среднее за {window} дн.',
+            line=dict(color=color, width=2),
+            customdata=time_series['clicks_wow_pct'],
+            hovertemplate="<b>%{x|%d.%m.%Y}</b><br><b>Кликов в день:</b> %{y:,.0f}"
+                          "<br><b>Неделя к неделе:</b> %{customdata:+.1f}%<extra></extra>"
+        ), secondary_y=False)
+
+    anomalies = time_series[time_series['clicks_anomaly']]
+    fig.add_trace(go.Scatter(
+        x=anomalies['date'],
+        y=anomalies['clicks'],
+        mode='markers',
+        name='Аномальный день',
+        marker=dict(color='#f44336', size=8, symbol='x'),
+        customdata=anomalies['clicks_zscore'],
+        hovertemplate="<b>%{x|%d.%m.%Y}</b><br><b>Клики:</b> %{y:,}<br><b>z:</b> %{customdata:.1f}<extra></extra>"
+    ), secondary_y=False)
+
+    fig.add_trace(go.Scatter(
+        x=time_series['date'],
+        y=time_series['campaigns_7d'] / 7,
+        name='Кампании, среднее за 7 дн.',
+        line=dict(color='#4caf50', width=2, dash='dot'),
+        hovertemplate="<b>%{x|%d.%m.%Y}</b><br><b>Кампаний в день:</b> %{y:.1f}<extra></extra>"
+    ), secondary_y=True)
+
+    fig.update_layout(title='Тренды кликов и создания кампаний', hovermode='x unified',
+                      legend=dict(orientation='h', y=-0.2))
+    fig.update_yaxes(title_text='Кликов в день', secondary_y=False)
+    fig.update_yaxes(title_text='Кампаний в день', secondary_y=True, showgrid=False)
+    return fig
+
+
+# Удержание: когорта первого клика x недель после него
+def create_retention_figure(data, max_periods=12):
+    """Матрица посчитана в пайплайне (retention_week.parquet); ячеек после конца данных в ней нет"""
+    retention = data['retention']
+    retention = retention[retention['period'] < max_periods]
+    matrix = retention.pivot(index='cohort_start', columns='period', values='retention')
+    sizes = retention.drop_duplicates('cohort_start').set_index('cohort_start')['cohort_size'].reindex(matrix.index)
+
+    # Нулевая неделя всегда 100%: шкала строится по вернувшимся, иначе их доли неразличимы
+    returned_max = matrix.drop(columns=0).max().max()
+
+    fig = go.Figure(data=go.Heatmap(
+        z=matrix.to_numpy(),
+        x=matrix.columns,
+        y=matrix.index.strftime('%d.%m.%Y'),
+        customdata=np.repeat(sizes.to_numpy()[:, None], matrix.shape[1], axis=1),
+        colorscale='YlGnBu',
+        hoverongaps=False,
+        hovertemplate="<b>Когорта:</b> %{y}<br><b>Неделя после первого клика:</b> %{x}"
+                      "<br><b>Вернулись:</b> %{z:.1f}%<br><b>Размер когорты:</b> %{customdata:,}<extra></extra>",
+        zmin=0,
+        zmax=returned_max if returned_max > 0 else 100
+    ))
+
+    fig.update_layout(
+        title='Удержание пользователей по недельным когортам первого клика, %',
+        xaxis_title='Недель после первого клика',
+        yaxis_title='Неделя первого клика',
+        height=500,
+        yaxis=dict(autorange='reversed', type='category'),
+        xaxis=dict(tickmode='linear', dtick=1)
+    )
+    return fig
+
+
+# Устройства: клики и уникальные пользователи по OS, устройствам и браузерам
+def create_device_breakdown_figure(data):
+    """Итоги по срезам посчитаны в пайплайне (device_activity_summary.parquet)"""
+    summary = data['device_summary']
+    summary = summary[summary['clicks'] > 0]
+    dimensions = list(summary['dimension'].cat.categories)
+    fig = make_subplots(rows=1, cols=len(dimensions), subplot_titles=dimensions, horizontal_spacing=0.12)
+
+    for i, dimension in enumerate(dimensions, 1):
+        part = summary[summary['dimension'] == dimension].sort_values('clicks')
+        fig.add_trace(go.Bar(
+            x=part['clicks'],
+            y=part['value'],
+            orientation='h',
+            marker_color='#ffca28',
+            customdata=np.stack([part['unique_users'], part['share']], axis=1),
+            hovertemplate="<b>%{y}</b><br><b>Клики:</b> %{x:,}<br><b>Пользователи:</b> %{customdata[0]:,}"
+                          "<br><b>Доля кликов:</b> %{customdata[1]:.1f}%<extra></extra>",
+            showlegend=False
+        ), row=1, col=i)
+
+    fig.update_layout(title='Клики по OS, устройствам и браузерам')
+    return fig
+
+
+def create_device_hours_figure(data):
+    """Доля кликов каждого устройства по местным часам - по кодам категорий куба"""
+    cube = data['device_activity']
+    codes = cube['device'].cat.codes.to_numpy()
+    devices = cube['device'].cat.categories
+    present = codes >= 0
+    counts = np.bincount(codes[present].astype('int64') * 24 + cube['hour'].to_numpy()[present],
+                         weights=cube['clicks'].to_numpy()[present], minlength=len(devices) * 24).reshape(-1, 24)
+
+    # Устройства без кликов (значения словаря, не встретившиеся в данных) не показываются
+    shown = counts.sum(axis=1) > 0
+    shares = counts[shown] / counts[shown].sum(axis=1, keepdims=True) * 100
+
+    fig = go.Figure(data=go.Heatmap(
+        z=shares,
+        x=list(range(24)),
+        y=list(devices[shown]),
+        colorscale='YlGnBu',
+        hovertemplate="<b>Устройство:</b> %{y}<br><b>Час:</b> %{x}:00<br><b>Доля кликов:</b> %{z:.2f}%<extra></extra>"
+    ))
+    fig.update_layout(
+        title='Доля кликов устройства по местным часам',
+        xaxis=dict(title='Час (местное время)', tickmode='linear', dtick=2),
+        yaxis_title='Устройство'
+    )
+    return fig
+
+
+# Клиент: итоги и кампании по сохраненным таблицам (без чтения кликов)
+def lookup_member(data, member_id=None):
+    """Итоги клиента и его кампании двоичным поиском по индексам; по умолчанию - первый клиент
+
+    Возвращает (member_id, итоги, кампании); вместо таблиц None, если клиента нет или пайплайн
+    уже перезаписал таблицы, а индексы этой версии данных еще старые.
+    """
+    index = data['member_rollups_index']
+    member_id = default_member(data) if member_id is None else int(member_id)
+    if member_id is None:
+        return None, None, None
+    if any(file_identity(PROCESSED_DIR / file_name) != identity for file_name, identity in data['member_tables'].items()):
+        return member_id, None, None
+
+    rollup = lookup_rows(index, PROCESSED_DIR / MEMBER_TABLES['member_rollups_index'], member_id)
+    campaigns = lookup_rows(data['member_campaigns_index'], PROCESSED_DIR / MEMBER_TABLES['member_campaigns_index'],
+                            member_id)
+    return member_id, rollup, campaigns
+
+
+def default_member(data):
+    """Первый клиент индекса; None, если таблица клиентов пуста"""
+    keys = data['member_rollups_index']['keys']
+    return int(keys[0]) if len(keys) else None
+
+
+def member_options(data, search=None, selected=None, limit=MEMBER_OPTIONS):
+    """Варианты списка клиентов: member_id, начинающиеся с введенных цифр
+
+    Ключи индекса отсортированы, поэтому клиенты с префиксом P - это диапазоны [P*10^k, (P+1)*10^k)
+    для каждой длины номера, каждый находится двоичным поиском. Выбранный клиент всегда в списке.
+    """
+    keys = data['member_rollups_index']['keys']
+    search = (search or '').strip()
+    if not search.isdigit():
+        found = list(keys[:limit])
+    else:
+        found = []
+        low, high = int(search), int(search) + 1
+        while len(keys) and low <= keys[-1] and len(found) < limit:
+            start = np.searchsorted(keys, low)
+            end = len(keys) if high > keys[-1] else np.searchsorted(keys, high)
+            found.extend(keys[start:end][:limit - len(found)])
+            if search.startswith('0'):
+                break
+            low, high = low * 10, high * 10
+
+    found = [int(key) for key in found]
+    if selected is not None and int(selected) not in found:
+        found.insert(0, int(selected))
+    return [{'label': f"Клиент {key}", 'value': key} for key in found]
+
+
+def create_member_figure(data, member=None):
+    """member - результат lookup_member; по умолчанию - первый клиент"""
+    member_id, _, campaigns = lookup_member(data) if member is None else member
+    top = campaigns.nlargest(MEMBER_TOP_CAMPAIGNS, 'clicks') if campaigns is not None else campaigns
+
+    fig = go.Figure()
+    if top is not None:
+        fig.add_trace(go.Bar(
+            x=top['campaign_id'].astype(str),
+            y=top['clicks'],
+            customdata=top['share'],
+            marker_color='#ffca28',
+            hovertemplate="<b>Кампания:</b> %{x}<br><b>Клики:</b> %{y:,}"
+                          "<br><b>Доля клиента:</b> %{customdata:.2f}%<extra></extra>"
+        ))
+
+    fig.update_layout(
+        title=(f'Клиент {member_id}: топ-{MEMBER_TOP_CAMPAIGNS} кампаний по кликам' if member_id is not None
+               else 'Итоги по клиентам пусты'),
+        xaxis=dict(title='Кампания', type='category'),
+        yaxis_title='Клики'
+    )
+    return fig
+
+
+def create_member_table(data, member=None):
+    _, rollup, _ = lookup_member(data) if member is None else member
+    cell_style = {'padding': '8px 10px', 'border-bottom': '1px solid rgba(255, 255, 255, 0.1)'}
+    if rollup is None:
+        return html.Div("Клиент не найден или данные обновляются", style=cell_style)
+
+    row = rollup.iloc[0]
+    rows = [
+        ('Клики', f"{row['clicks']:,}"),
+        ('Уникальные пользователи', f"{row['unique_users']:,}"),
+        ('Кампании', f"{row['campaigns']:,}"),
+        ('Первый клик', f"{row['first_click']:%d.%m.%Y %H:%M}"),
+        ('Последний клик', f"{row['last_click']:%d.%m.%Y %H:%M}"),
+        ('Среднее время реакции', f"{row['avg_response_seconds'] / 3600:.1f} ч"),
+        ('Медиана времени реакции', f"{row['median_response_seconds'] / 3600:.1f} ч"),
+        ('90-й процентиль', f"{row['p90_response_seconds'] / 3600:.1f} ч")
+    ]
+    return html.Table(
+        html.Tbody([html.Tr([html.Td(name, style=cell_style), html.Td(value, style={**cell_style, 'color': '#FFCA28'})])
+                    for name, value in rows]),
+        style={'width': '100%', 'border-collapse': 'collapse', 'font-size': '13px'}
+    )
+
+
+# Лучшее время получения для выбранных регионов и устройств
+def create_send_time_figure(data, regions=None, devices=None):
+    """Сглаженная доля кликов по дням недели и местным часам с отмеченными лучшими окнами"""
+    matrix = data['send_time_matrix']
+    counts = selection_counts(matrix, regions, devices)
+    shares = smoothed_shares(counts, matrix['region_device_how'].sum(axis=(0, 1))).reshape(7, 24) * 100
+    recommendations = recommend_send_windows(matrix, regions, devices, top_n=SEND_WINDOWS_TOP,
+                                             window_hours=SEND_WINDOW_HOURS)
+
+    fig = go.Figure(go.Heatmap(
+        z=shares,
+        x=[f"{hour:02d}" for hour in range(24)],
+        y=WEEKDAY_NAMES,
+        colorscale='YlOrRd',
+        hovertemplate="<b>%{y}, %{x}:00</b><br><b>Доля кликов:</b> %{z:.2f}%<extra></extra>",
+        showscale=False
+    ))
+
+    # Рамки вокруг рекомендованных окон (окно может переходить через полночь)
+    for row in recommendations.itertuples():
+        for hour in range(row.start_hour, row.start_hour + SEND_WINDOW_HOURS):
+            day = (row.weekday + hour // 24) % 7
+            fig.add_shape(type='rect', x0=hour % 24 - 0.5, x1=hour % 24 + 0.5, y0=day - 0.5, y1=day + 0.5,
+                          line=dict(color='#4caf50', width=2))
+        fig.add_annotation(x=row.start_hour, y=row.weekday, text=str(row.rank), showarrow=False,
+                           font=dict(color='#121212', size=12))
+
+    fig.update_layout(
+        title=f"Лучшее время получения (местное время, {counts.sum():,} кликов)",
+        xaxis=dict(title='Час', type='category'),
+        yaxis=dict(title='', autorange='reversed', type='category')
+    )
+    return fig
+
+
+def create_send_time_table(data, regions=None, devices=None):
+    recommendations = recommend_send_windows(data['send_time_matrix'], regions, devices,
+                                             top_n=SEND_WINDOWS_TOP, window_hours=SEND_WINDOW_HOURS)
+    cell_style = {'padding': '8px 10px', 'border-bottom': '1px solid rgba(255, 255, 255, 0.1)'}
+    header_style = {**cell_style, 'background': 'rgba(255, 202, 40, 0.2)'}
+
+    headers = ['#', 'Окно', 'Доля кликов [95% ДИ]', 'Лифт']
+    if 'send_utc_hour' in recommendations:
+        headers.append('Отправка (UTC)')
+
+    rows = []
+    for row in recommendations.itertuples():
+        cells = [
+            row.rank,
+            f"{row.weekday_name} {row.start_hour:02d}:00-{row.end_hour:02d}:00",
+            f"{row.share:.2f}% [{row.ci_low:.2f}-{row.ci_high:.2f}]",
+            f"{row.lift:.2f}"
+        ]
+        if 'send_utc_hour' in recommendations:
+            cells.append(f"{row.send_utc_hour:02d}:00")
+        rows.append(html.Tr([html.Td(cell, style={**cell_style, 'color': '#FFCA28'}) for cell in cells]))
+
+    return html.Table(
+        [html.Thead(html.Tr([html.Th(header, style=header_style) for header in headers])), html.Tbody(rows)],
+        style={'width': '100%', 'border-collapse': 'collapse', 'font-size': '13px'}
+    )
+
+
+# Плотность кликов: дата x время суток (облако точек растеризуется на сервере)
+def create_clicks_density_figure(data, x_range=None, y_range=None):
+    """Растер плотности кликов фиксированного размера для видимого диапазона"""
+    click_points_x, click_points_y = data['click_points_x'], data['click_points_y']
+
+    lo, hi = 0, len(click_points_x)
+    if x_range is not None:
+        lo = int(np.searchsorted(click_points_x, x_range[0], side='left'))
+        hi = int(np.searchsorted(click_points_x, x_range[1], side='right'))
+
+    z, x_centers, y_centers = rasterize_points(
+        click_points_x[lo:hi],
+        click_points_y[lo:hi],
+        x_range=x_range,
+        y_range=y_range or (0, 24)
+    )
+
+    fig = go.Figure(data=go.Heatmap(
+        z=z,
+        x=pd.to_datetime(x_centers),
+        y=y_centers,
+        colorscale='YlOrRd',
+        hoverongaps=False,
+        hovertemplate="<b>Дата:</b> %{x}<br><b>Время:</b> %{y:.1f} ч<br><b>Кликов:</b> %{z:,}<extra></extra>"
+    ))
+    fig.update_layout(
+        title='Плотность кликов по датам и времени суток (UTC)',
+        xaxis_title='Дата',
+        yaxis_title='Час дня'
+    )
+    return fig
+
 
 # Общие настройки для всех графиков
-for fig in [fig_hour_activity, fig_region_activity, fig_top_clicks, fig_daily, fig_monthly,
-            fig_weekdays, fig_months, fig_heatmap_week, fig_response_time, geo_heatmap]:
+def apply_common_layout(fig):
     fig.update_layout(
         plot_bgcolor='rgba(0,0,0,0)',
         paper_bgcolor='rgba(0,0,0,0)',
@@ -820,70 +1330,408 @@ for fig in [fig_hour_activity, fig_region_activity, fig_top_clicks, fig_daily, f
         hoverlabel=tooltip_style,
         coloraxis_showscale=False
     )
+    return fig
 
-app.layout = html.Div([
-    html.Div([
-        html.H1("📊 Анализ активности кампаний", className="main-header"),
-    ], className="header-container"),
-
-    # 1 строка: клики по дням, месяцам и топ кампаний
-    html.Div([
-        html.Div([dcc.Graph(figure=fig_daily, config={'displayModeBar': False})],
-                className="graph-cell", style={'width': '33%'}),
-        html.Div([dcc.Graph(figure=fig_monthly, config={'displayModeBar': False})],
-                className="graph-cell", style={'width': '33%'}),
-        html.Div([dcc.Graph(figure=fig_top_clicks, config={'displayModeBar': False})],
-                className="graph-cell", style={'width': '33%'}),
-    ], className="graph-row"),
-
-    # 2 строка: созданные кампании
-    html.Div([
-        html.Div([dcc.Graph(figure=fig_months, config={'displayModeBar': False})],
-                className="graph-cell", style={'width': '33%'}),
-        html.Div([dcc.Graph(figure=fig_weekdays, config={'displayModeBar': False})],
-                className="graph-cell", style={'width': '33%'}),
-        html.Div([dcc.Graph(figure=fig_heatmap_week, config={'displayModeBar': False})],
-                className="graph-cell", style={'width': '33%'}),
-    ], className="graph-row"),
-
-    # 3 строка: активность и время реакции
-    html.Div([
-        html.Div([dcc.Graph(figure=fig_hour_activity, config={'displayModeBar': False})],
-                 className="graph-cell", style={'width': '33%'}),
+
+def build_figures(data, timings):
+    """Все графики дашборда для одной версии данных; время построения каждого - в timings"""
+    builders = {
+        'fig_daily': create_daily_figure,
+        'fig_monthly': create_monthly_figure,
+        'fig_top_clicks': create_top_clicks_figure,
+        'fig_months': create_months_figure,
+        'fig_weekdays': create_weekdays_figure,
+        'fig_heatmap_week': create_heatmap_week_figure,
+        'fig_hour_activity': create_hour_activity_figure,
+        'fig_response_time': create_response_time_figure,
+        'geo_heatmap': create_geo_figure,
+        'fig_region_activity': create_region_activity_figure,
+        'fig_clicks_density': create_clicks_density_figure,
+        'fig_send_time': create_send_time_figure,
+        'fig_trends': create_trends_figure,
+        'fig_retention': create_retention_figure,
+        'fig_member': create_member_figure,
+        'fig_device_breakdown': create_device_breakdown_figure,
+        'fig_device_hours': create_device_hours_figure
+    }
+    figures = {name: timed(timings, name, builder, data) for name, builder in builders.items()}
+
+    for fig in figures.values():
+        apply_common_layout(fig)
+
+    # Графики со своим оформлением
+    figures['fig_hour_activity_redblue'] = timed(timings, 'fig_hour_activity_redblue',
+                                                 create_hour_activity_redblue_figure, data)
+    figures['geo_pie_chart'] = timed(timings, 'geo_pie_chart', create_geo_pie_chart, data, top_n=5)
+
+    # uirevision сохраняет масштаб при замене фигуры из callback
+    figures['fig_daily'].update_layout(uirevision='daily')
+    figures['fig_clicks_density'].update_layout(uirevision='clicks-density')
+    figures['geo_heatmap'].update_layout(uirevision='geo')
+
+    return figures
+
+
+# ========================================
+# Разметка страницы
+# ========================================
+def build_layout(data, figures):
+    # Числовые массивы фигур передаются в base64
+    figures = {name: encode_figure(fig) for name, fig in figures.items()}
+
+    return html.Div([
         html.Div([
-            html.H3("Общая статистика времени реакции", style={
-                'textAlign': 'center',
-                'color': '#fff8dc',
-                'marginBottom': '10px',
-                'fontSize': '16px'
+            html.H1("📊 Анализ активности кампаний", className="main-header"),
+        ], className="header-container"),
+
+        # 1 строка: клики по дням, месяцам и топ кампаний
+        html.Div([
+            html.Div([dcc.Graph(id='daily-graph', figure=figures['fig_daily'], config={'displayModeBar': False})],
+                    className="graph-cell", style={'width': '33%'}),
+            html.Div([dcc.Graph(figure=figures['fig_monthly'], config={'displayModeBar': False})],
+                    className="graph-cell", style={'width': '33%'}),
+            html.Div([dcc.Graph(figure=figures['fig_top_clicks'], config={'displayModeBar': False})],
+                    className="graph-cell", style={'width': '33%'}),
+        ], className="graph-row"),
+
+        # 2 строка: созданные кампании
+        html.Div([
+            html.Div([dcc.Graph(figure=figures['fig_months'], config={'displayModeBar': False})],
+                    className="graph-cell", style={'width': '33%'}),
+            html.Div([dcc.Graph(figure=figures['fig_weekdays'], config={'displayModeBar': False})],
+                    className="graph-cell", style={'width': '33%'}),
+            html.Div([dcc.Graph(figure=figures['fig_heatmap_week'], config={'displayModeBar': False})],
+                    className="graph-cell", style={'width': '33%'}),
+        ], className="graph-row"),
+
+        # 3 строка: активность и время реакции
+        html.Div([
+            html.Div([dcc.Graph(figure=figures['fig_hour_activity'], config={'displayModeBar': False})],
+                     className="graph-cell", style={'width': '33%'}),
+            html.Div([
+                html.H3("Общая статистика времени реакции", style={
+                    'textAlign': 'center',
+                    'color': '#fff8dc',
+                    'marginBottom': '10px',
+                    'fontSize': '16px'
+                }),
+                create_stats_table(data['overall_stats'])
+            ], className="graph-cell", style={
+                'width': '33%',
+                'padding': '10px',
+                'background': 'rgba(255,255,255,0.05)',
+                'borderRadius': '8px'
             }),
-            create_stats_table(overall_stats)
-        ], className="graph-cell", style={
-            'width': '33%',
-            'padding': '10px',
-            'background': 'rgba(255,255,255,0.05)',
-            'borderRadius': '8px'
-        }),
-        html.Div([dcc.Graph(figure=fig_response_time, config={'displayModeBar': False})],
-                 className="graph-cell", style={'width': '34%'})
-    ], className="graph-row"),
-
-    # 4 строка: оптимальное время и распределение по регионам
-    html.Div([
-        html.Div([dcc.Graph(figure=fig_hour_activity_redblue, config={'displayModeBar': False})],
-                className="graph-cell", style={'width': '33%'}),
-        html.Div([dcc.Graph(figure=geo_heatmap, config={'displayModeBar': True})],
-                className="graph-cell", style={'width': '67%'})
-    ], className="graph-row"),
-
-    # 5 строка: региональная аналитика
-    html.Div([
-        html.Div([dcc.Graph(figure=fig_region_activity, config={'displayModeBar': False})],
-                className="graph-cell", style={'width': '50%'}),
-        html.Div([dcc.Graph(figure=geo_pie_chart, config={'displayModeBar': False})],
-                className="graph-cell", style={'width': '50%'}),
-    ], className="graph-row")
-], className="dashboard-container")
+            html.Div([dcc.Graph(figure=figures['fig_response_time'], config={'displayModeBar': False})],
+                     className="graph-cell", style={'width': '34%'})
+        ], className="graph-row"),
+
+        # 4 строка: оптимальное время и распределение по регионам
+        html.Div([
+            html.Div([dcc.Graph(figure=figures['fig_hour_activity_redblue'], config={'displayModeBar': False})],
+                    className="graph-cell", style={'width': '33%'}),
+            html.Div([dcc.Graph(id='geo-heatmap', figure=figures['geo_heatmap'], config={'displayModeBar': True}),
+                      dcc.Store(id='geo-level', data=0)],
+                    className="graph-cell", style={'width': '67%'})
+        ], className="graph-row"),
+
+        # 5 строка: региональная аналитика
+        html.Div([
+            html.Div([dcc.Graph(figure=figures['fig_region_activity'], config={'displayModeBar': False})],
+                    className="graph-cell", style={'width': '50%'}),
+            html.Div([dcc.Graph(figure=figures['geo_pie_chart'], config={'displayModeBar': False})],
+                    className="graph-cell", style={'width': '50%'}),
+        ], className="graph-row"),
+
+        # 6 строка: плотность кликов
+        html.Div([
+            html.Div([dcc.Graph(id='clicks-density-graph', figure=figures['fig_clicks_density'], config={'displayModeBar': True})],
+                    className="graph-cell", style={'width': '100%'}),
+        ], className="graph-row"),
+
+        # 7 строка: лучшее время отправки по регионам и устройствам
+        html.Div([
+            html.Div([
+                html.Div([
+                    dcc.Dropdown(id='send-time-regions', multi=True, placeholder='Все регионы',
+                                 options=[{'label': REGION_NAMES.get(int(code), "Неопознанный регион"),
+                                           'value': int(code)}
+                                          for code in data['send_time_matrix']['region_codes']],
+                                 className='filter-dropdown'),
+                    dcc.Dropdown(id='send-time-devices', multi=True, placeholder='Все устройства',
+                                 options=[{'label': name, 'value': name}
+                                          for name in data['send_time_matrix']['device_names']],
+                                 className='filter-dropdown')
+                ], className='filter-row'),
+                dcc.Graph(id='send-time-graph', figure=figures['fig_send_time'], config={'displayModeBar': False})
+            ], className="graph-cell", style={'width': '67%'}),
+            html.Div([
+                html.H3("Рекомендуемые окна получения", style={
+                    'textAlign': 'center',
+                    'color': '#fff8dc',
+                    'marginBottom': '10px',
+                    'fontSize': '16px'
+                }),
+                html.Div(create_send_time_table(data), id='send-time-table')
+            ], className="graph-cell", style={'width': '33%'})
+        ], className="graph-row"),
+
+        # 8 строка: тренды и аномалии
+        html.Div([
+            html.Div([dcc.Graph(figure=figures['fig_trends'], config={'displayModeBar': False})],
+                    className="graph-cell", style={'width': '100%'}),
+        ], className="graph-row"),
+
+        # 9 строка: удержание по когортам
+        html.Div([
+            html.Div([dcc.Graph(figure=figures['fig_retention'], config={'displayModeBar': False})],
+                    className="graph-cell", style={'width': '100%'}),
+        ], className="graph-row"),
+
+        # 10 строка: итоги выбранного клиента
+        html.Div([
+            html.Div([
+                html.Div([
+                    # В разметке - только первые клиенты, остальные подбираются по вводу номера
+                    dcc.Dropdown(id='member-select', clearable=False, searchable=True,
+                                 value=default_member(data),
+                                 options=member_options(data),
+                                 placeholder='Введите member_id',
+                                 className='filter-dropdown')
+                ], className='filter-row'),
+                dcc.Graph(id='member-graph', figure=figures['fig_member'], config={'displayModeBar': False})
+            ], className="graph-cell", style={'width': '67%'}),
+            html.Div([
+                html.H3("Итоги клиента", style={
+                    'textAlign': 'center',
+                    'color': '#fff8dc',
+                    'marginBottom': '10px',
+                    'fontSize': '16px'
+                }),
+                html.Div(create_member_table(data), id='member-table')
+            ], className="graph-cell", style={'width': '33%'})
+        ], className="graph-row"),
+
+        # 11 строка: устройства, OS и браузеры
+        html.Div([
+            html.Div([dcc.Graph(figure=figures['fig_device_breakdown'], config={'displayModeBar': False})],
+                    className="graph-cell", style={'width': '50%'}),
+            html.Div([dcc.Graph(figure=figures['fig_device_hours'], config={'displayModeBar': False})],
+                    className="graph-cell", style={'width': '50%'}),
+        ], className="graph-row")
+    ], className="dashboard-container")
+
+
+# ========================================
+# Текущая версия данных и фоновое обновление
+# ========================================
+def file_identity(path):
+    """Время изменения и размер файла"""
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def data_signature():
+    """Версия данных пайплайна: время изменения и размер каждого файла (включая таблицы клиентов)"""
+    return tuple((file_name, *file_identity(PROCESSED_DIR / file_name))
+                 for file_name in (*DATA_FILES.values(), *MEMBER_TABLES.values()))
+
+
+def build_snapshot(signature):
+    """Данные, графики и разметка одной версии; callbacks читают их только через snapshot"""
+    start = time.perf_counter()
+    load_seconds, figure_seconds = {}, {}
+
+    data = load_dataset(load_seconds)
+    figures = build_figures(data, figure_seconds)
+
+    # Размер фигур, встраиваемых в первую страницу
+    log_payload_sizes(figures)
+
+    layout = timed(figure_seconds, 'разметка страницы', build_layout, data, figures)
+
+    metrics = {
+        'loaded_at': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'total_seconds': time.perf_counter() - start,
+        'load_seconds': load_seconds,
+        'figure_seconds': figure_seconds,
+        'memory_bytes': memory_usage(data)
+    }
+    logger.info(format_report('Загрузка данных:', load_seconds, 'сек'))
+    logger.info(format_report('Построение графиков:', figure_seconds, 'сек'))
+    logger.info(format_report('Память данных:', metrics['memory_bytes'], 'MB'))
+    logger.info(f"Версия данных собрана за {metrics['total_seconds']:.1f} сек")
+
+    return {
+        'signature': signature,
+        'data': data,
+        'layout': layout,
+        'metrics': metrics
+    }
+
+
+# Заменяется целиком одним присваиванием, поэтому запрос всегда видит согласованную версию
+snapshot = build_snapshot(data_signature())
+
+
+def watch_data_updates(interval=REFRESH_INTERVAL):
+    """Фоновый поток: при изменении файлов пайплайна собирает новую версию и подменяет snapshot"""
+    global snapshot
+    pending = None
+
+    while True:
+        time.sleep(interval)
+        try:
+            signature = data_signature()
+        except FileNotFoundError:
+            # Пайплайн прямо сейчас перезаписывает файлы
+            continue
+
+        if signature == snapshot['signature']:
+            pending = None
+            continue
+
+        # Ждем один интервал без изменений, чтобы не читать недописанные файлы
+        if signature != pending:
+            pending = signature
+            continue
+
+        logger.info("Обнаружены новые данные пайплайна, загрузка...")
+        try:
+            new_snapshot = build_snapshot(signature)
+        except Exception as e:
+            logger.error(f"Ошибка обновления данных, продолжаем показывать предыдущую версию: {str(e)}",
+                         exc_info=True)
+            continue
+
+        snapshot = new_snapshot
+        pending = None
+        logger.info("Данные дашборда обновлены")
+
+
+def serve_layout():
+    return snapshot['layout']
+
+
+# Инициализация Dash-приложения
+app = dash.Dash(__name__, external_stylesheets=['styles.css'])
+app.title = "Анализ активности кампаний"
+app.layout = serve_layout
+
+# Сжатие ответов сервера (HTML, JSON-фигуры, JS-бандлы)
+enable_compression(app.server)
+
+
+# Внутренняя статистика: время загрузки и построения, память, задержки callback
+@app.server.route('/metrics')
+def metrics_endpoint():
+    return jsonify({**snapshot['metrics'], 'callbacks': callback_latency_report()})
+
+
+# Пересчет прореженного ряда под новый масштаб
+@app.callback(
+    Output('daily-graph', 'figure'),
+    Input('daily-graph', 'relayoutData'),
+    prevent_initial_call=True
+)
+@timed_callback
+def update_daily_graph(relayout_data):
+    fig = apply_common_layout(create_daily_figure(snapshot['data'], parse_axis_range(relayout_data)))
+    fig.update_layout(uirevision='daily')
+    return encode_figure(fig)
+
+
+# Пересчет растера под новый масштаб
+@app.callback(
+    Output('clicks-density-graph', 'figure'),
+    Input('clicks-density-graph', 'relayoutData'),
+    prevent_initial_call=True
+)
+@timed_callback
+def update_clicks_density_graph(relayout_data):
+    fig = apply_common_layout(create_clicks_density_figure(
+        snapshot['data'],
+        parse_axis_range(relayout_data),
+        parse_axis_range(relayout_data, axis='yaxis', is_date=False)
+    ))
+    fig.update_layout(uirevision='clicks-density')
+    return encode_figure(fig)
+
+
+# Подмена уровня детализации границ при изменении масштаба карты
+@app.callback(
+    Output('geo-heatmap', 'figure'),
+    Output('geo-level', 'data'),
+    Input('geo-heatmap', 'relayoutData'),
+    State('geo-level', 'data'),
+    prevent_initial_call=True
+)
+@timed_callback
+def update_geo_detail(relayout_data, current_level):
+    scale = (relayout_data or {}).get('geo.projection.scale')
+    if REGION_GEOMETRY is None or scale is None:
+        return dash.no_update, dash.no_update
+
+    level = level_for_scale(scale, len(REGION_GEOMETRY))
+    if level == current_level:
+        return dash.no_update, dash.no_update
+
+    fig = apply_common_layout(create_plotly_choropleth(snapshot['data'], level))
+    fig.update_layout(uirevision='geo')
+    return encode_figure(fig), level
+
+
+# Рекомендации времени отправки для выбранных регионов и устройств
+@app.callback(
+    Output('send-time-graph', 'figure'),
+    Output('send-time-table', 'children'),
+    Input('send-time-regions', 'value'),
+    Input('send-time-devices', 'value'),
+    prevent_initial_call=True
+)
+@timed_callback
+def update_send_time(regions, devices):
+    data = snapshot['data']
+    fig = apply_common_layout(create_send_time_figure(data, regions, devices))
+    return encode_figure(fig), create_send_time_table(data, regions, devices)
+
+
+# Итоги выбранного клиента (поиск по индексу, клики не читаются)
+@app.callback(
+    Output('member-graph', 'figure'),
+    Output('member-table', 'children'),
+    Input('member-select', 'value'),
+    prevent_initial_call=True
+)
+@timed_callback
+def update_member(member_id):
+    data = snapshot['data']
+    # Один поиск по индексам на оба вывода
+    member = lookup_member(data, member_id)
+    fig = apply_common_layout(create_member_figure(data, member))
+    return encode_figure(fig), create_member_table(data, member)
+
+
+# Варианты списка клиентов по введенному началу member_id
+@app.callback(
+    Output('member-select', 'options'),
+    Input('member-select', 'search_value'),
+    State('member-select', 'value'),
+    prevent_initial_call=True
+)
+@timed_callback
+def update_member_options(search_value, member_id):
+    return member_options(snapshot['data'], search_value, member_id)
+
+
+def start_data_watcher():
+    """Фоновое обновление данных без перезапуска (в процессе, который обслуживает запросы)"""
+    threading.Thread(target=watch_data_updates, name='data-watcher', daemon=True).start()
+
 
 if __name__ == '__main__':
+    # С debug=True запросы обслуживает дочерний процесс перезагрузчика Werkzeug (WERKZEUG_RUN_MAIN=true);
+    # родительский только следит за кодом, второй поток обновления ему не нужен
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_data_watcher()
     app.run(debug=True)
@@ -0,0 +1,133 @@
+# downsampling.py
+import numpy as np
+import pandas as pd
+
+# ========================================
+# Конфигурация
+# ========================================
+# Максимум точек линии, отправляемых в браузер (независимо от объема данных)
+MAX_LINE_POINTS = 1500
+
+# Размер растра (строки x столбцы) для облаков точек
+RASTER_SHAPE = (96, 240)
+
+
+# ========================================
+# Разбор событий масштабирования (relayoutData)
+# ========================================
+def to_numeric_axis(values):
+    """Приводит значения оси к float64 (даты - в наносекунды с эпохи)"""
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype('datetime64[ns]').astype('int64').to_numpy(dtype='float64')
+    if values.dtype == object:
+        return pd.to_datetime(values).astype('datetime64[ns]').astype('int64').to_numpy(dtype='float64')
+    return values.to_numpy(dtype='float64')
+
+
+def parse_axis_range(relayout_data, axis='xaxis', is_date=True):
+    """Извлекает видимый диапазон оси из relayoutData; None - показать весь диапазон"""
+    if not relayout_data or relayout_data.get(f'{axis}.autorange'):
+        return None
+
+    if f'{axis}.range[0]' in relayout_data:
+        bounds = [relayout_data[f'{axis}.range[0]'], relayout_data[f'{axis}.range[1]']]
+    elif f'{axis}.range' in relayout_data:
+        bounds = relayout_data[f'{axis}.range']
+    else:
+        return None
+
+    if is_date:
+        bounds = [pd.Timestamp(b).value for b in bounds]
+
+    lo, hi = sorted(float(b) for b in bounds)
+    return lo, hi
+
+
+# ========================================
+# Прореживание временных рядов (LTTB)
+# ========================================
+def lttb_indices(x, y, n_out):
+    """Индексы точек по алгоритму Largest-Triangle-Three-Buckets"""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+
+    # Границы корзин: первая и последняя точки всегда сохраняются
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    prev = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], max(edges[i + 1], edges[i] + 1)
+
+        # Средняя точка следующей корзины (для последней - последняя точка ряда)
+        if i + 2 < len(edges):
+            next_start, next_stop = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+            avg_x = x[next_start:next_stop].mean()
+            avg_y = y[next_start:next_stop].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+
+        # Точка текущей корзины с максимальной площадью треугольника
+        area = np.abs(
+            (x[prev] - avg_x) * (y[start:stop] - y[prev])
+            - (x[prev] - x[start:stop]) * (avg_y - y[prev])
+        )
+        prev = start + int(np.argmax(area))
+        selected[i + 1] = prev
+
+    return selected
+
+
+def downsample_series(x, y, x_range=None, n_out=MAX_LINE_POINTS):
+    """Индексы точек отсортированного ряда для видимого диапазона, не более n_out"""
+    x_num = to_numeric_axis(x)
+
+    lo, hi = 0, len(x_num)
+    if x_range is not None:
+        # Берем по одной точке за границами, чтобы линия не обрывалась на краях
+        lo = max(int(np.searchsorted(x_num, x_range[0], side='left')) - 1, 0)
+        hi = min(int(np.searchsorted(x_num, x_range[1], side='right')) + 1, len(x_num))
+
+    window = lttb_indices(x_num[lo:hi], np.asarray(y, dtype='float64')[lo:hi], n_out)
+    return window + lo
+
+
+# ========================================
+# Растеризация облаков точек
+# ========================================
+def rasterize_points(x, y, x_range=None, y_range=None, shape=RASTER_SHAPE):
+    """Агрегирует точки в растер фиксированного размера (количество точек в ячейке)"""
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+
+    if x_range is None:
+        x_range = (x.min(), x.max()) if len(x) else (0.0, 1.0)
+    if y_range is None:
+        y_range = (y.min(), y.max()) if len(y) else (0.0, 1.0)
+
+    # Пустой диапазон (одна точка) расширяем, чтобы не получить нулевую ширину ячеек
+    if x_range[0] == x_range[1]:
+        x_range = (x_range[0] - 0.5, x_range[1] + 0.5)
+    if y_range[0] == y_range[1]:
+        y_range = (y_range[0] - 0.5, y_range[1] + 0.5)
+
+    counts, x_edges, y_edges = np.histogram2d(
+        x, y,
+        bins=(shape[1], shape[0]),
+        range=(x_range, y_range)
+    )
+
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+
+    # Пустые ячейки отдаем как NaN, чтобы они были прозрачными на графике
+    z = counts.T
+    z[z == 0] = np.nan
+    return z, x_centers, y_centers
@@ -0,0 +1,187 @@
+# figure_transport.py
+import base64
+import copy
+import gzip
+import json
+import logging
+
+import numpy as np
+from flask import request
+from plotly.utils import PlotlyJSONEncoder
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# ========================================
+# Конфигурация
+# ========================================
+# Атрибуты трасс с массивами данных, которые передаются как typed array
+ENCODED_KEYS = {'x', 'y', 'z', 'lat', 'lon', 'values', 'customdata', 'color', 'size'}
+
+# Короткие массивы выгоднее оставить обычными JSON-списками
+MIN_ENCODE_LENGTH = 16
+
+# Ответы меньше этого размера не сжимаются
+MIN_COMPRESS_SIZE = 1024
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'text/javascript',
+    'text/html',
+    'text/css',
+    'text/plain'
+}
+
+
+# ========================================
+# Бинарное кодирование массивов (plotly.js typed array spec)
+# ========================================
+def _typed_array_dtype(values):
+    """Минимальный dtype, поддерживаемый plotly.js, без потери значений; None - массив не числовой"""
+    if values.dtype == bool:
+        return np.dtype('u1')
+    if values.dtype.kind in 'iu':
+        if values.size == 0:
+            return np.dtype('i4')
+        lo, hi = values.min(), values.max()
+        for dtype in ('i1', 'u1', 'i2', 'u2', 'i4', 'u4'):
+            info = np.iinfo(dtype)
+            if info.min <= lo and hi <= info.max:
+                return np.dtype(dtype)
+        return np.dtype('f8')
+    if values.dtype.kind == 'f':
+        # Счетчики и округленные значения точно представимы во float32
+        if values.dtype.itemsize <= 4 or np.array_equal(values.astype('f4'), values, equal_nan=True):
+            return np.dtype('f4')
+        return np.dtype('f8')
+    return None
+
+
+def encode_array(values):
+    """Массив -> {'dtype', 'bdata', 'shape'} или None, если кодирование не применимо"""
+    try:
+        values = np.asarray(values)
+    except (ValueError, TypeError):
+        return None
+
+    if values.ndim not in (1, 2) or len(values) < MIN_ENCODE_LENGTH:
+        return None
+
+    dtype = _typed_array_dtype(values)
+    if dtype is None:
+        return None
+
+    values = np.ascontiguousarray(values, dtype=dtype.newbyteorder('<'))
+
+    # Разреженные массивы (много NaN/нулей) в JSON бывают короче base64
+    if len(values.tobytes()) * 4 / 3 >= len(json.dumps(values.tolist())):
+        return None
+
+    spec = {
+        'dtype': dtype.str.lstrip('<|'),
+        'bdata': base64.b64encode(values.tobytes()).decode('ascii')
+    }
+    if values.ndim == 2:
+        spec['shape'] = f'{values.shape[0]},{values.shape[1]}'
+    return spec
+
+
+def _encode_trace(obj):
+    for key, value in obj.items():
+        if isinstance(value, dict):
+            _encode_trace(value)
+        elif key in ENCODED_KEYS and isinstance(value, (list, tuple, np.ndarray)):
+            spec = encode_array(value)
+            if spec is not None:
+                obj[key] = spec
+    return obj
+
+
+def encode_figure(fig):
+    """Фигура -> dict, в котором числовые массивы трасс переданы в base64"""
+    fig_dict = fig.to_plotly_json() if hasattr(fig, 'to_plotly_json') else copy.deepcopy(fig)
+    fig_dict['data'] = [_encode_trace(dict(trace)) for trace in fig_dict.get('data', [])]
+    return fig_dict
+
+
+# ========================================
+# Размер передаваемых фигур
+# ========================================
+def figure_payload_size(fig):
+    """Размер фигуры в JSON (байты): исходный, после кодирования и после gzip"""
+    plain = fig.to_plotly_json() if hasattr(fig, 'to_plotly_json') else fig
+    plain_bytes = json.dumps(plain, cls=PlotlyJSONEncoder).encode('utf-8')
+    encoded_bytes = json.dumps(encode_figure(fig), cls=PlotlyJSONEncoder).encode('utf-8')
+
+    return {
+        'json_bytes': len(plain_bytes),
+        'encoded_bytes': len(encoded_bytes),
+        'gzip_bytes': len(gzip.compress(encoded_bytes))
+    }
+
+
+def log_payload_sizes(figures):
+    """Выводит в лог размер каждой фигуры; figures - словарь {название: фигура}"""
+    total = {'json_bytes': 0, 'encoded_bytes': 0, 'gzip_bytes': 0}
+    for name, fig in figures.items():
+        size = figure_payload_size(fig)
+        for key in total:
+            total[key] += size[key]
+        logger.info(
+            f"Фигура {name}: JSON {size['json_bytes'] / 1024:.1f} KB | "
+            f"base64 {size['encoded_bytes'] / 1024:.1f} KB | "
+            f"gzip {size['gzip_bytes'] / 1024:.1f} KB"
+        )
+
+    logger.info(
+        f"Все фигуры: JSON {total['json_bytes'] / 1024:.1f} KB | "
+        f"base64 {total['encoded_bytes'] / 1024:.1f} KB | "
+        f"gzip {total['gzip_bytes'] / 1024:.1f} KB"
+    )
+    return total
+
+
+# ========================================
+# Сжатие ответов (brotli, если установлен, иначе gzip)
+# ========================================
+def enable_compression(server, min_size=MIN_COMPRESS_SIZE):
+    """Подключает сжатие ответов Flask-сервера дашборда"""
+
+    @server.after_request
+    def compress_response(response):
+        if (response.status_code != 200
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        accept_encoding = request.headers.get('Accept-Encoding', '').lower()
+        if brotli is not None and 'br' in accept_encoding:
+            encoding = 'br'
+        elif 'gzip' in accept_encoding:
+            encoding = 'gzip'
+        else:
+            return response
+
+        # Статика (JS-бандлы Dash) отдается потоком - читаем ее целиком
+        response.direct_passthrough = False
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        if encoding == 'br':
+            data = brotli.compress(data, quality=5)
+        else:
+            data = gzip.compress(data, compresslevel=6)
+
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        response.headers['Content-Length'] = str(len(data))
+        response.vary.add('Accept-Encoding')
+        return response
+
+    return server
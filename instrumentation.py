@@ -0,0 +1,103 @@
+# instrumentation.py
+import functools
+import threading
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+# ========================================
+# Конфигурация
+# ========================================
+# Верхние границы корзин гистограммы задержек callback (миллисекунды)
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+
+# Гистограммы задержек по имени callback; изменяются только под блокировкой
+_callback_latency = {}
+_latency_lock = threading.Lock()
+
+
+# ========================================
+# Замер времени
+# ========================================
+def timed(timings, name, func, *args, **kwargs):
+    """Вызывает func и записывает время выполнения в timings[name] (секунды)"""
+    start = perf_counter()
+    result = func(*args, **kwargs)
+    timings[name] = perf_counter() - start
+    return result
+
+
+def memory_usage(data):
+    """Память, занимаемая каждым DataFrame/массивом (или словарем массивов) набора данных (байты)"""
+    usage = {}
+    for name, value in data.items():
+        if isinstance(value, pd.DataFrame):
+            usage[name] = int(value.memory_usage(deep=True).sum())
+        elif isinstance(value, np.ndarray):
+            usage[name] = int(value.nbytes)
+        elif isinstance(value, dict) and value and all(isinstance(v, np.ndarray) for v in value.values()):
+            usage[name] = int(sum(v.nbytes for v in value.values()))
+    return usage
+
+
+def format_report(title, values, unit):
+    """Строки отчета для лога, от самого тяжелого пункта к самому легкому"""
+    lines = [title]
+    for name, value in sorted(values.items(), key=lambda item: item[1], reverse=True):
+        if unit == 'MB':
+            lines.append(f"  {name:<48} {value / 1024 ** 2:10.2f} MB")
+        else:
+            lines.append(f"  {name:<48} {value:10.3f} сек")
+    return '\n'.join(lines)
+
+
+# ========================================
+# Задержка callback
+# ========================================
+def record_latency(name, seconds):
+    latency_ms = seconds * 1000
+    bucket = int(np.searchsorted(LATENCY_BUCKETS_MS, latency_ms))
+
+    with _latency_lock:
+        stats = _callback_latency.setdefault(name, {
+            'count': 0,
+            'sum_ms': 0.0,
+            'max_ms': 0.0,
+            'buckets': [0] * len(LATENCY_BUCKETS_MS)
+        })
+        stats['count'] += 1
+        stats['sum_ms'] += latency_ms
+        stats['max_ms'] = max(stats['max_ms'], latency_ms)
+        stats['buckets'][bucket] += 1
+
+
+def timed_callback(func):
+    """Декоратор callback Dash: записывает задержку каждого вызова в гистограмму"""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record_latency(func.__name__, perf_counter() - start)
+
+    return wrapper
+
+
+def callback_latency_report():
+    """Снимок гистограмм задержек: накопленные счетчики по верхней границе корзины ('le', мс)"""
+    with _latency_lock:
+        report = {}
+        for name, stats in _callback_latency.items():
+            report[name] = {
+                'count': stats['count'],
+                'avg_ms': stats['sum_ms'] / stats['count'],
+                'max_ms': stats['max_ms'],
+                'buckets': [
+                    {'le': str(bound) if bound != float('inf') else '+Inf', 'count': int(count)}
+                    for bound, count in zip(LATENCY_BUCKETS_MS, np.cumsum(stats['buckets']))
+                ]
+            }
+    return report
@@ -142,10 +142,19 @@ def main():
         project_root / 'metrics' / 'campaign dinamics' / 'campaign_dinamics.py',
         project_root / 'metrics' / 'campaign_activity_first_4_hours' / '4_hour_activity.py',
         project_root / 'metrics' / 'clicks_per_day_and_month_activity' / 'clicks_per_day_and_month.py',
+        project_root / 'metrics' / 'time_series' / 'time_series.py',
         project_root / 'metrics' / 'geographic_pie_chart' / 'geographic_pie_chart.py',
         project_root / 'metrics' / 'geography distribution' / 'geography distribution.py',
         project_root / 'metrics' / 'response_analysis' / 'response analysis.py',
+        project_root / 'metrics' / 'response_curve' / 'response_curve.py',
         project_root / 'metrics' / 'time_optimizer' / 'time_optimizer.py',
+        project_root / 'metrics' / 'unique_users' / 'unique_users.py',
+        project_root / 'metrics' / 'retention' / 'retention.py',
+        project_root / 'metrics' / 'sessions' / 'sessions.py',
+        project_root / 'metrics' / 'attribution' / 'attribution.py',
+        project_root / 'metrics' / 'members' / 'members.py',
+        project_root / 'metrics' / 'devices' / 'devices.py',
+        project_root / 'metrics' / 'languages' / 'languages.py',
         project_root / 'dashboard.py'
     ]
 
@@ -1,4 +1,5 @@
 import pandas as pd
+import numpy as np
 from datetime import timedelta
 import sys
 from time import time
@@ -7,6 +8,12 @@ import seaborn as sns
 from tabulate import tabulate
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from metrics.common.aggregations import add_percentage, aggregate_by_key
+from metrics.common.histograms import count_matrix
+from metrics.common.timezones import HOURS_PER_WEEK, hour_of_day, hour_of_week, local_time_ns, region_utc_offsets, \
+    timezone_label
+
 # Настройка стиля графиков
 plt.style.use('seaborn-v0_8')
 sns.set_palette("husl")
@@ -136,20 +143,24 @@ def load_data():
         sys.exit(1)
 
 
-# Анализ активности по часам
+# Местное время клика (int64 нс) по смещению региона; клики без времени отбрасываются
+def local_click_times(clicks):
+    click_ns = clicks['click_time'].to_numpy('datetime64[ns]').view('int64')
+    valid = ~np.isnat(clicks['click_time'].to_numpy('datetime64[ns]'))
+    regions = clicks['region'].to_numpy()
+    return local_time_ns(click_ns[valid], regions[valid]), valid
+
+
+# Анализ активности по часам (местное время региона клика)
 def analyze_activity_by_hour(clicks):
-    print("\nАнализ активности по часам...")
+    print("\nАнализ активности по часам (местное время)...")
     start_time = time()
 
     try:
-        clicks['hour'] = clicks['click_time'].dt.hour
-        activity = clicks.groupby('hour').agg(
-            total_clicks=('uid', 'count'),
-            unique_users=('uid', 'nunique')
-        ).reset_index()
-
-        total = activity['total_clicks'].sum()
-        activity['percentage'] = (activity['total_clicks'] / total) * 100
+        local_ns, valid = local_click_times(clicks)
+        activity = aggregate_by_key(hour_of_day(local_ns), clicks['uid'].to_numpy()[valid], key_name='hour',
+                                    count_name='total_clicks', distinct_name='unique_users')
+        add_percentage(activity, 'total_clicks')
 
         print(f"Анализ завершен за {time() - start_time:.1f} сек")
         return activity
@@ -166,16 +177,16 @@ def analyze_activity_by_region(clicks):
 
     try:
         # Исключаем регион с ID 0 (неопознанный)
-        filtered_clicks = clicks[clicks['region'] != 0]
+        known = clicks['region'].to_numpy() != 0
+        region_activity = aggregate_by_key(clicks['region'].to_numpy()[known], clicks['uid'].to_numpy()[known],
+                                           key_name='region', count_name='total_clicks',
+                                           distinct_name='unique_users')
 
         # Добавляем названия регионов
-        filtered_clicks['region_name'] = filtered_clicks['region'].map(REGION_NAMES)
-        filtered_clicks['region_name'] = filtered_clicks['region_name'].fillna("Неизвестный регион")
-
-        region_activity = filtered_clicks.groupby(['region', 'region_name']).agg(
-            total_clicks=('uid', 'count'),
-            unique_users=('uid', 'nunique')
-        ).reset_index().sort_values('total_clicks', ascending=False)
+        region_activity.insert(1, 'region_name',
+                               region_activity['region'].map(REGION_NAMES).fillna("Неизвестный регион"))
+        region_activity = region_activity.sort_values('total_clicks', ascending=False)
+        region_activity['utc_offset'] = region_utc_offsets(region_activity['region'])
 
         print(f"Анализ завершен за {time() - start_time:.1f} сек")
         return region_activity
@@ -185,8 +196,48 @@ def analyze_activity_by_region(clicks):
         return None
 
 
+# Активность по часам недели в местном времени: по регионам и по часовым поясам
+def analyze_hour_of_week(clicks):
+    print("\nАнализ активности по часам недели (местное время)...")
+    start_time = time()
+
+    try:
+        local_ns, valid = local_click_times(clicks)
+        how = hour_of_week(local_ns)
+        regions = clicks['region'].to_numpy()[valid]
+
+        region_index, region_codes = pd.factorize(regions, sort=True)
+        counts = count_matrix(region_index, how, len(region_codes), HOURS_PER_WEEK)
+
+        by_region = pd.DataFrame({
+            'region': np.repeat(region_codes, HOURS_PER_WEEK),
+            'utc_offset': np.repeat(region_utc_offsets(region_codes), HOURS_PER_WEEK),
+            'weekday': np.tile(np.arange(HOURS_PER_WEEK) // 24, len(region_codes)),
+            'hour': np.tile(np.arange(HOURS_PER_WEEK) % 24, len(region_codes)),
+            'total_clicks': counts.ravel()
+        })
+        by_region['region_name'] = by_region['region'].map(REGION_NAMES).fillna("Неизвестный регион")
+
+        # Часовой пояс - сумма строк его регионов
+        by_timezone = by_region.groupby(['utc_offset', 'weekday', 'hour'], as_index=False)['total_clicks'].sum()
+        by_timezone['timezone'] = by_timezone['utc_offset'].map(timezone_label)
+
+        # Доля часа недели внутри региона / пояса
+        for table, key in ((by_region, 'region'), (by_timezone, 'utc_offset')):
+            totals = table.groupby(key)['total_clicks'].transform('sum')
+            table['percentage'] = table['total_clicks'] / totals * 100
+
+        print(f"Анализ завершен за {time() - start_time:.1f} сек")
+        print(f"Регионов: {len(region_codes)}, часовых поясов: {by_timezone['utc_offset'].nunique()}")
+        return by_region, by_timezone
+
+    except Exception as e:
+        print(f"Ошибка анализа: {str(e)}", file=sys.stderr)
+        return None
+
+
 # Визуализация данных
-def visualize_data(hour_activity, region_activity):
+def visualize_data(hour_activity, region_activity, timezone_hour_of_week):
     import os
     if not os.path.exists(PLOTS_DIR):
         os.makedirs(PLOTS_DIR)
@@ -196,7 +247,7 @@ def visualize_data(hour_activity, region_activity):
     # График активности по часам с подписями
     plt.figure(figsize=(14, 7))
     ax = sns.barplot(data=hour_activity, x='hour', y='percentage', color='blue')
-    plt.title('Активность клиентов по часам (UTC)', fontsize=16)
+    plt.title('Активность клиентов по часам (местное время)', fontsize=16)
     plt.xlabel('Час дня', fontsize=14)
     plt.ylabel('Процент кликов', fontsize=14)
 
@@ -237,6 +288,18 @@ def visualize_data(hour_activity, region_activity):
     plt.savefig(f'{PLOTS_DIR}/activity_by_region.png', dpi=300)
     plt.close()
 
+    # Тепловая карта: часовой пояс x местный час (доля кликов пояса)
+    tz_hours = timezone_hour_of_week.groupby(['utc_offset', 'hour'])['percentage'].sum().unstack('hour')
+    tz_hours.index = tz_hours.index.map(timezone_label)
+    plt.figure(figsize=(14, 7))
+    sns.heatmap(tz_hours, cmap='YlOrRd', cbar_kws={'label': 'Процент кликов пояса'})
+    plt.title('Активность по местным часам в разных часовых поясах', fontsize=16)
+    plt.xlabel('Час дня (местное время)', fontsize=14)
+    plt.ylabel('Часовой пояс', fontsize=14)
+    plt.tight_layout()
+    plt.savefig(f'{PLOTS_DIR}/activity_by_timezone_hour.png', dpi=300)
+    plt.close()
+
     print(f"Графики сохранены в {PLOTS_DIR}")
 
 
@@ -244,17 +307,23 @@ if __name__ == '__main__':
     clicks, campaigns, regions = load_data()
     hour_activity = analyze_activity_by_hour(clicks)
     region_activity = analyze_activity_by_region(clicks)
+    hour_of_week = analyze_hour_of_week(clicks)
 
-    if hour_activity is not None and region_activity is not None:
-        visualize_data(hour_activity, region_activity)
+    if hour_activity is not None and region_activity is not None and hour_of_week is not None:
+        region_hour_of_week, timezone_hour_of_week = hour_of_week
+        visualize_data(hour_activity, region_activity, timezone_hour_of_week)
 
         # Сохраняем результаты анализа в файлы Parquet
         try:
             hour_activity.to_parquet(PROJECT_ROOT / 'processed_data' / 'activity_by_timezone_by_hour.parquet')
             region_activity.to_parquet(PROJECT_ROOT / 'processed_data' / 'activity_by_timezone_by_region.parquet')
+            region_hour_of_week.to_parquet(f"{OUTPUT_FILE}_hour_of_week_by_region.parquet")
+            timezone_hour_of_week.to_parquet(f"{OUTPUT_FILE}_hour_of_week_by_timezone.parquet")
             print("\nРезультаты анализа сохранены в файлы:")
             print(f"- {PROJECT_ROOT / 'processed_data' / 'activity_by_timezone_by_hour.parquet'}")
             print(f"- {PROJECT_ROOT / 'processed_data' / 'activity_by_timezone_by_region.parquet'}")
+            print(f"- {OUTPUT_FILE}_hour_of_week_by_region.parquet")
+            print(f"- {OUTPUT_FILE}_hour_of_week_by_timezone.parquet")
         except Exception as e:
             print(f"\nОшибка при сохранении результатов анализа: {str(e)}", file=sys.stderr)
 
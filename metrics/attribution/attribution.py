@@ -0,0 +1,185 @@
+import pandas as pd
+import numpy as np
+import sys
+from time import time
+import matplotlib.pyplot as plt
+import seaborn as sns
+from tabulate import tabulate
+from pathlib import Path
+import argparse
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from metrics.common.aggregations import distinct_by_key
+from metrics.common.attribution import ATTRIBUTION_MODELS, attribution_credits, merge_credits
+from metrics.common.parquet_stream import iter_parquet_batches, parquet_num_rows
+from metrics.common.user_partitions import USER_PARTITIONS, iter_user_partitions
+
+# Настройка стиля графиков
+plt.style.use('seaborn-v0_8')
+sns.set_palette("husl")
+
+# ========================================
+# Конфигурация
+# ========================================
+PROJECT_ROOT = Path(__file__).parent.parent.parent  # Поднимаемся на уровень выше metrics/
+(PROJECT_ROOT / 'processed_data').mkdir(parents=True, exist_ok=True)
+CLICKS_FILE = PROJECT_ROOT / 'processed_data' / 'clicks_processed.parquet'
+PLOTS_DIR = PROJECT_ROOT / 'plots'
+OUTPUT_FILE = PROJECT_ROOT / 'processed_data' / 'campaign_attribution.parquet'
+
+# Из кликов читаются только эти колонки, пакетами
+CLICK_COLUMNS = ['uid', 'member_id', 'campaign_id', 'click_time']
+
+# Сколько кампаний показывать на графике и в таблице
+TOP_CAMPAIGNS = 15
+
+
+# ========================================
+# Загрузка данных
+# ========================================
+def load_data(click_files=(CLICKS_FILE,)):
+    print("Загрузка данных для атрибуции кампаний...")
+
+    try:
+        # Клики не загружаются целиком: пакеты читаются партиция за партицией
+        clicks = (batch for path in click_files for batch in iter_parquet_batches(path, CLICK_COLUMNS))
+        print(f"Кликов: {sum(parquet_num_rows(path) for path in click_files):,}")
+        return clicks
+
+    except Exception as e:
+        print(f"Ошибка загрузки данных: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+# ========================================
+# Атрибуция
+# ========================================
+def analyze_attribution(clicks, n_partitions=USER_PARTITIONS):
+    """Кредиты first-touch, last-touch и linear по кампаниям
+
+    Клики раскладываются на диск по партициям хэша uid: цепочки пользователей целиком
+    лежат в одной партиции, поэтому кредиты партиций просто складываются.
+    """
+    print(f"\nАтрибуция кампаний (партиций {n_partitions})...")
+    start_time = time()
+
+    credits, members = [], []
+    users, multi_campaign_users = 0, 0
+    for part in iter_user_partitions(clicks, n_partitions):
+        part = part[part['click_time'].notna() & part['campaign_id'].notna()]
+        # В партиции могут остаться только клики без времени или кампании
+        if not len(part):
+            continue
+        credits.append(attribution_credits(
+            part['uid'].to_numpy(),
+            part['click_time'].to_numpy('datetime64[ns]').view('int64'),
+            part['campaign_id'].to_numpy()
+        ))
+        members.append(part[['campaign_id', 'member_id']].drop_duplicates('campaign_id'))
+
+        # Пользователи, кликавшие больше одной кампании
+        user_codes, uniques = pd.factorize(part['uid'])
+        campaigns_per_user = distinct_by_key(user_codes, part['campaign_id'].to_numpy(), len(uniques))
+        users += len(uniques)
+        multi_campaign_users += int((campaigns_per_user > 1).sum())
+
+    attribution = merge_credits(credits)
+    member_of_campaign = (pd.concat(members, ignore_index=True).drop_duplicates('campaign_id') if members
+                          else pd.DataFrame({'campaign_id': pd.Series(dtype='int64'), 'member_id': pd.Series(dtype='int64')}))
+    attribution = member_of_campaign.merge(attribution, on='campaign_id', how='right')
+
+    for model in ATTRIBUTION_MODELS:
+        attribution[f'{model}_pct'] = attribution[model] / max(users, 1) * 100
+
+    print(f"Атрибуция завершена за {time() - start_time:.1f} сек")
+    print(f"Кампаний: {len(attribution):,}, пользователей: {users:,}, "
+          f"из них с несколькими кампаниями: {multi_campaign_users:,} ({multi_campaign_users / max(users, 1):.1%})")
+    return attribution
+
+
+# ========================================
+# Визуализация данных
+# ========================================
+def visualize_attribution(attribution):
+    import os
+    if not os.path.exists(PLOTS_DIR):
+        os.makedirs(PLOTS_DIR)
+
+    print("\nСоздание визуализаций...")
+
+    top = attribution.nlargest(TOP_CAMPAIGNS, 'linear')
+    positions = np.arange(len(top))
+    width = 0.27
+
+    fig, ax = plt.subplots(figsize=(14, 7))
+    for i, (model, label) in enumerate(zip(ATTRIBUTION_MODELS, ('Первое касание', 'Последнее касание', 'Линейная'))):
+        ax.bar(positions + (i - 1) * width, top[model], width, label=label)
+    ax.set_xticks(positions)
+    ax.set_xticklabels(top['campaign_id'].astype(str), rotation=45)
+    ax.set_title(f'Атрибуция пользователей по моделям: топ-{TOP_CAMPAIGNS} кампаний')
+    ax.set_xlabel('Кампания')
+    ax.set_ylabel('Кредит (пользователей)')
+    ax.legend()
+
+    fig.tight_layout()
+    fig.savefig(f'{PLOTS_DIR}/campaign_attribution.png')
+    plt.close(fig)
+
+    print(f"Графики сохранены в папку {PLOTS_DIR}")
+
+
+# ========================================
+# Сохранение результатов
+# ========================================
+def save_results(attribution):
+    print("\nСохранение результатов...")
+
+    try:
+        attribution.to_parquet(OUTPUT_FILE, engine='pyarrow')
+        print(f"Результаты сохранены в {OUTPUT_FILE}")
+    except Exception as e:
+        print(f"Ошибка при сохранении: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+# ========================================
+# Вывод красивых таблиц
+# ========================================
+def print_tables(attribution):
+    top = attribution.nlargest(TOP_CAMPAIGNS, 'linear')[
+        ['campaign_id', 'member_id', 'clicks', 'users', *ATTRIBUTION_MODELS, 'linear_pct']
+    ].round(2).astype(object)
+    print(f"\nТоп-{TOP_CAMPAIGNS} кампаний по линейной атрибуции:")
+    print(tabulate(top, headers='keys', tablefmt='pretty', showindex=False))
+
+
+# ========================================
+# Главная функция
+# ========================================
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Атрибуция кампаний по цепочкам кликов пользователей')
+    parser.add_argument('--partitions', type=int, default=USER_PARTITIONS,
+                        help='Число партиций по хэшу uid для внешней сортировки')
+    parser.add_argument('--clicks', nargs='+', type=Path, default=[CLICKS_FILE],
+                        help='Файлы кликов (партиции), обрабатываются по очереди')
+    args = parser.parse_args()
+
+    if args.partitions <= 0:
+        parser.error('--partitions должно быть положительным')
+
+    # Загрузка данных
+    clicks = load_data(args.clicks)
+
+    # Атрибуция
+    attribution = analyze_attribution(clicks, args.partitions)
+
+    # Визуализация данных
+    visualize_attribution(attribution)
+
+    # Вывод таблиц
+    print_tables(attribution)
+
+    # Сохранение результатов
+    save_results(attribution)
+
+    print("\nГотово! Атрибуция кампаний завершена.")
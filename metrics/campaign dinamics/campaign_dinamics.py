@@ -9,6 +9,12 @@ import seaborn as sns
 from tabulate import tabulate
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from metrics.common.aggregations import aggregate_by_key
+from metrics.common.calendar_cube import build_calendar_cube, monthly_totals, save_calendar_cube, week_rows, \
+    weekday_values
+from metrics.common.time_buckets import day_labels, iso_week, time_bucket, weekday, year_and_month
+
 # Настройка стиля графиков
 plt.style.use('seaborn-v0_8')
 sns.set_palette("husl")
@@ -23,6 +29,14 @@ PLOTS_DIR = PROJECT_ROOT / 'plots' / 'campaign_dynamics'
 PLOTS_DIR.mkdir(parents=True, exist_ok=True)
 OUTPUT_FILE = PROJECT_ROOT / 'processed_data' / 'campaign_dynamics'
 
+# Куб ISO год x неделя x день недели: из него строятся все графики по календарю
+CALENDAR_FILE = f"{OUTPUT_FILE}_calendar.npz"
+
+# Порядок дней недели и месяцев (совпадает с номерами из time_buckets)
+WEEKDAYS_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+MONTHS_ORDER = ['January', 'February', 'March', 'April', 'May', 'June',
+                'July', 'August', 'September', 'October', 'November', 'December']
+
 
 # ========================================
 # Загрузка данных
@@ -55,89 +69,62 @@ def analyze_campaign_dynamics(campaigns):
     print("\nАнализ динамики создания кампаний...")
     start_time = time()
 
-    # Создаем копию данных
-    df = campaigns.copy()
-
-    # Извлекаем временные компоненты
-    df['date'] = df['created_at'].dt.date
-    df['day_of_week'] = df['created_at'].dt.day_name()
-    df['week_of_year'] = df['created_at'].dt.isocalendar().week
-    df['month'] = df['created_at'].dt.month_name()
-    df['year'] = df['created_at'].dt.year
-    df['year_month'] = df['created_at'].dt.to_period('M')
+    # Номера дня и месяца создания (int64 от начала эпохи), без datetime-объектов по строкам
+    created_at = campaigns['created_at'].to_numpy('datetime64[ns]')
+    valid = ~np.isnat(created_at)
+    created_ns = created_at[valid].view('int64')
+    ids = campaigns['id'].to_numpy()[valid]
 
     # 1. Динамика по дням в разрезе недели
-    daily_dynamics = df.groupby(['date', 'day_of_week', 'week_of_year']).agg(
-        campaigns_count=('id', 'count')
-    ).reset_index()
-
-    # 2. Динамика по месяцам в разрезе года
-    monthly_dynamics = df.groupby(['year', 'month', 'year_month']).agg(
-        campaigns_count=('id', 'count')
-    ).reset_index()
-
-    # Упорядочивание дней недели и месяцев
-    weekdays_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    months_order = ['January', 'February', 'March', 'April', 'May', 'June',
-                    'July', 'August', 'September', 'October', 'November', 'December']
-
-    daily_dynamics['day_of_week'] = pd.Categorical(
-        daily_dynamics['day_of_week'],
-        categories=weekdays_order,
-        ordered=True
-    )
-
-    monthly_dynamics['month'] = pd.Categorical(
-        monthly_dynamics['month'],
-        categories=months_order,
-        ordered=True
-    )
+    created_days = time_bucket(created_ns, 'day')
+    daily_dynamics = aggregate_by_key(created_days, ids, key_name='day', count_name='campaigns_count')
+    days = daily_dynamics.pop('day').to_numpy()
+    daily_dynamics.insert(0, 'date', day_labels(days))
+    daily_dynamics.insert(1, 'day_of_week', pd.Categorical.from_codes(weekday(days), WEEKDAYS_ORDER, ordered=True))
+    daily_dynamics.insert(2, 'week_of_year', pd.array(iso_week(days), dtype='UInt32'))
+
+    # 2. Динамика по месяцам в разрезе года (строки в хронологическом порядке)
+    monthly_dynamics = aggregate_by_key(time_bucket(created_ns, 'month'), ids, key_name='month',
+                                        count_name='campaigns_count')
+    months = monthly_dynamics.pop('month').to_numpy()
+    years, month_numbers = year_and_month(months)
+    monthly_dynamics.insert(0, 'year', years)
+    monthly_dynamics.insert(1, 'month', pd.Categorical.from_codes(month_numbers - 1, MONTHS_ORDER, ordered=True))
+    monthly_dynamics.insert(2, 'year_month', pd.arrays.PeriodArray(months, dtype='period[M]'))
+
+    # 3. Календарный куб для графиков (считается один раз)
+    calendar_cube = build_calendar_cube(created_days)
 
     print(f"Анализ завершен за {time() - start_time:.1f} сек")
-    return daily_dynamics, monthly_dynamics
+    return daily_dynamics, monthly_dynamics, calendar_cube
 
 
 # ========================================
 # Визуализация динамики
 # ========================================
-def visualize_campaign_dynamics(daily_dynamics, monthly_dynamics):
+def visualize_campaign_dynamics(calendar_cube):
     print("\nСоздание визуализаций динамики кампаний...")
 
-    months_order = ['January', 'February', 'March', 'April', 'May', 'June',
-                    'July', 'August', 'September', 'October', 'November', 'December']
-    weekdays_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
     russian_weekdays = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
 
-    # 1. График по дням недели
+    # 1. График по дням недели (дни, в которые создавались кампании)
     plt.figure(figsize=(12, 6))
-    sns.boxplot(
-        data=daily_dynamics,
-        x='day_of_week',
-        y='campaigns_count',
-        showfliers=False,
-        color='lightgreen',
-        order=weekdays_order
-    )
+    plt.boxplot(weekday_values(calendar_cube), showfliers=False, patch_artist=True,
+                boxprops=dict(facecolor='lightgreen'))
     plt.title('Распределение количества создаваемых кампаний по дням недели')
     plt.xlabel('День недели')
     plt.ylabel('Количество кампаний')
-    plt.xticks(rotation=45)
+    plt.xticks(range(1, len(WEEKDAYS_ORDER) + 1), WEEKDAYS_ORDER, rotation=45)
     plt.tight_layout()
     plt.savefig(f'{PLOTS_DIR}/campaigns_per_weekday.png', dpi=300)
     plt.close()
 
-    # 2. График по месяцам
+    # 2. График по месяцам (сумма по всем годам)
     fig, ax = plt.subplots(figsize=(12, 6))
-    monthly_sum = monthly_dynamics.groupby('month')['campaigns_count'].sum().reset_index()
-
-    sns.barplot(
-        data=monthly_sum,
-        x='month',
-        y='campaigns_count',
-        color='skyblue',
-        order=months_order,
-        ax=ax
-    )
+    monthly = monthly_totals(calendar_cube)
+    monthly_sum = np.bincount(monthly['month'] - 1, weights=monthly['count'], minlength=12)
+
+    ax.bar(MONTHS_ORDER, monthly_sum, color='skyblue')
 
     for p in ax.patches:
         ax.annotate(f"{int(p.get_height()):,}",
@@ -154,25 +141,20 @@ def visualize_campaign_dynamics(daily_dynamics, monthly_dynamics):
     fig.savefig(f'{PLOTS_DIR}/campaigns_per_month_fixed.png', dpi=300)
     plt.close(fig)
 
-    # 3. Тепловая карта
-    fig, ax = plt.subplots(figsize=(12, 8))
-    heatmap_data = daily_dynamics.pivot_table(
-        index='week_of_year',
-        columns='day_of_week',
-        values='campaigns_count',
-        aggfunc='mean'
-    )
+    # 3. Тепловая карта: недели разных лет не смешиваются (строка - ISO год и неделя)
+    week_labels, week_counts = week_rows(calendar_cube)
+    fig, ax = plt.subplots(figsize=(12, max(8, len(week_labels) * 0.25)))
 
     sns.heatmap(
-        heatmap_data,
+        pd.DataFrame(week_counts, index=week_labels, columns=russian_weekdays),
         cmap='YlGnBu',
         annot=True,
-        fmt='.1f',
+        fmt='d',
         linewidths=.5,
         ax=ax
     )
 
-    ax.set_title('Среднее количество создаваемых кампаний по дням недели и неделям года')
+    ax.set_title('Количество создаваемых кампаний по дням недели и неделям года')
     ax.set_xlabel('День недели')
     ax.set_ylabel('Неделя года')
     fig.tight_layout()
@@ -185,13 +167,14 @@ def visualize_campaign_dynamics(daily_dynamics, monthly_dynamics):
 # ========================================
 # Сохранение результатов
 # ========================================
-def save_campaign_dynamics(daily_dynamics, monthly_dynamics):
+def save_campaign_dynamics(daily_dynamics, monthly_dynamics, calendar_cube):
     print("\nСохранение результатов анализа динамики...")
 
     try:
         daily_dynamics.to_parquet(f"{OUTPUT_FILE}_daily.parquet", engine='pyarrow')
         monthly_dynamics.to_parquet(f"{OUTPUT_FILE}_monthly.parquet", engine='pyarrow')
-        print(f"Результаты сохранены в {OUTPUT_FILE}_daily.parquet и {OUTPUT_FILE}_monthly.parquet")
+        save_calendar_cube(calendar_cube, CALENDAR_FILE)
+        print(f"Результаты сохранены в {OUTPUT_FILE}_daily.parquet, {OUTPUT_FILE}_monthly.parquet и {CALENDAR_FILE}")
     except Exception as e:
         print(f"Ошибка при сохранении: {str(e)}", file=sys.stderr)
         sys.exit(1)
@@ -205,12 +188,12 @@ if __name__ == '__main__':
     campaigns = load_campaign_data()
 
     # Анализ динамики
-    daily_dynamics, monthly_dynamics = analyze_campaign_dynamics(campaigns)
+    daily_dynamics, monthly_dynamics, calendar_cube = analyze_campaign_dynamics(campaigns)
 
     # Визуализация
-    visualize_campaign_dynamics(daily_dynamics, monthly_dynamics)
+    visualize_campaign_dynamics(calendar_cube)
 
     # Сохранение результатов
-    save_campaign_dynamics(daily_dynamics, monthly_dynamics)
+    save_campaign_dynamics(daily_dynamics, monthly_dynamics, calendar_cube)
 
     print("\nАнализ динамики создания кампаний завершен!")
\ No newline at end of file
@@ -1,4 +1,5 @@
 import pandas as pd
+import numpy as np
 from datetime import timedelta, datetime
 import sys
 from time import time
@@ -6,6 +7,11 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from tabulate import tabulate
 from pathlib import Path
+import argparse
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from metrics.common.histograms import count_matrix
+from metrics.common.joins import NAT_INT64, apply_key_lookup, build_key_lookup
 
 # Настройка стиля графиков
 plt.style.use('seaborn-v0_8')
@@ -22,6 +28,12 @@ REGIONS_FILE = PROJECT_ROOT / 'processed_data' / 'regions_processed.parquet'
 PLOTS_DIR = PROJECT_ROOT / 'plots'
 OUTPUT_FILE = PROJECT_ROOT / 'processed_data' / 'processed_data'
 
+# Окно активности после создания кампании
+ACTIVITY_WINDOW = timedelta(hours=4)
+
+# Окна накопленной активности по умолчанию (переопределяются через --windows)
+ACTIVITY_WINDOWS = ['1h', '4h', '24h', '7d']
+
 
 # ========================================
 # Загрузка данных
@@ -94,25 +106,40 @@ def visualize_data(activity_stats):
 # ========================================
 # Анализ активности
 # ========================================
+def device_matrix(campaign_ids, devices):
+    """Широкая матрица кампания x устройство: колонка device_<название> на каждое устройство"""
+    campaign_index, campaigns = pd.factorize(campaign_ids, sort=True)
+    devices = devices.astype('category')
+
+    counts = count_matrix(campaign_index, devices.cat.codes.to_numpy(),
+                          len(campaigns), len(devices.cat.categories))
+
+    return pd.DataFrame(counts, index=pd.Index(campaigns, name='campaign_id'),
+                        columns=[f'device_{name}' for name in devices.cat.categories])
+
+
 def analyze_activity(clicks, campaigns):
     print("\nАнализ активности в первые 4 часа кампании...")
     start_time = time()
 
-    # Объединяем клики с информацией о кампаниях
-    merged = pd.merge(clicks, campaigns, left_on='campaign_id', right_on='id', how='left')
-
-    # Вычисляем разницу между временем клика и созданием кампании
-    merged['time_since_campaign_start'] = merged['click_time'] - merged['created_at']
+    # Время создания кампании по ее id (без объединения таблиц)
+    created_at = build_key_lookup(campaigns['id'].to_numpy(),
+                                  campaigns['created_at'].to_numpy('datetime64[ns]').view('int64'),
+                                  fill=NAT_INT64)
+    created = apply_key_lookup(created_at, clicks['campaign_id'].to_numpy())
+    click_time = clicks['click_time'].to_numpy('datetime64[ns]').view('int64')
 
-    # Фильтруем только клики в первые 4 часа
-    first_4_hours = merged[merged['time_since_campaign_start'] <= timedelta(hours=4)]
+    # Фильтруем только клики в первые 4 часа (клики без кампании или времени отбрасываются)
+    in_window = ((created != NAT_INT64) & (click_time != NAT_INT64)
+                 & (click_time - created <= ACTIVITY_WINDOW // pd.Timedelta(1, 'ns')))
+    first_4_hours = clicks.loc[in_window, ['campaign_id', 'uid', 'region', 'device', 'click_time']]
+    first_4_hours['created_at'] = created[in_window].view('datetime64[ns]')
 
     # Группируем по кампании и считаем метрики
     activity_stats = first_4_hours.groupby('campaign_id').agg(
         total_clicks=('uid', 'count'),
         unique_users=('uid', 'nunique'),
         regions_count=('region', 'nunique'),
-        devices=('device', lambda x: x.value_counts().to_dict()),
         first_click_time=('click_time', 'min'),
         last_click_time=('click_time', 'max'),
         campaign_created=('created_at', 'first')
@@ -123,33 +150,121 @@ def analyze_activity(clicks, campaigns):
 
     # Добавляем процент активности от 4 часов
     activity_stats['activity_percentage'] = (
-            activity_stats['activity_duration'].dt.total_seconds() / (4 * 3600) * 100
+            activity_stats['activity_duration'].dt.total_seconds() / ACTIVITY_WINDOW.total_seconds() * 100
     ).round(1)
 
+    # Разбивка по устройствам - колонки device_<название> вместо словаря в ячейке
+    devices = device_matrix(first_4_hours['campaign_id'].to_numpy(), first_4_hours['device'])
+    activity_stats = activity_stats.join(devices, on='campaign_id')
+
     print(f"Анализ завершен за {time() - start_time:.1f} сек")
     print(f"Проанализировано {len(activity_stats)} кампаний")
 
     return activity_stats
 
 
+# ========================================
+# Накопленная активность по нескольким окнам
+# ========================================
+def cumulative_distinct(campaign_index, codes, window, n_campaigns, n_windows):
+    """Число разных значений (пользователей, регионов) кампании, накопленное по окнам
+
+    Значение учитывается начиная с самого раннего окна, в котором оно встретилось.
+    """
+    pairs = pd.DataFrame({'campaign': campaign_index, 'code': codes, 'window': window})
+    first_window = pairs[pairs['code'] >= 0].groupby(['campaign', 'code'])['window'].min().reset_index()
+    counts = count_matrix(first_window['campaign'], first_window['window'], n_campaigns, n_windows)
+    return counts.cumsum(axis=1)
+
+
+def analyze_activity_windows(clicks, campaigns, windows=ACTIVITY_WINDOWS):
+    """Клики, пользователи и регионы за каждое окно после создания кампании - за один проход
+
+    Каждый клик относится к самому короткому окну, в которое он попадает, а значения
+    для длинных окон получаются накоплением. Результат - таблица (campaign_id, window).
+    """
+    print(f"\nАнализ накопленной активности по окнам {', '.join(windows)}...")
+    start_time = time()
+
+    # Окна по возрастанию длины
+    windows = sorted(windows, key=pd.Timedelta)
+    window_ns = np.array([pd.Timedelta(window).value for window in windows], dtype='int64')
+    n_windows = len(windows)
+
+    created_at = build_key_lookup(campaigns['id'].to_numpy(),
+                                  campaigns['created_at'].to_numpy('datetime64[ns]').view('int64'),
+                                  fill=NAT_INT64)
+    created = apply_key_lookup(created_at, clicks['campaign_id'].to_numpy())
+    click_time = clicks['click_time'].to_numpy('datetime64[ns]').view('int64')
+
+    # Самое короткое окно, в которое попадает клик (как и для 4 часов: время с создания <= окна)
+    window = np.searchsorted(window_ns, click_time - created, side='left')
+    valid = (created != NAT_INT64) & (click_time != NAT_INT64) & (window < n_windows)
+
+    window = window[valid]
+    click_time = click_time[valid]
+    campaign_index, campaign_ids = pd.factorize(clicks['campaign_id'].to_numpy()[valid], sort=True)
+    n_campaigns = len(campaign_ids)
+    uid_codes, _ = pd.factorize(clicks['uid'].to_numpy()[valid])
+    region_codes, _ = pd.factorize(clicks['region'].to_numpy()[valid])
+
+    # Клики (с uid, как total_clicks) по самому короткому окну, затем накопление
+    total_clicks = count_matrix(campaign_index, window, n_campaigns, n_windows,
+                                weights=uid_codes >= 0).astype('int64').cumsum(axis=1)
+    unique_users = cumulative_distinct(campaign_index, uid_codes, window, n_campaigns, n_windows)
+    regions_count = cumulative_distinct(campaign_index, region_codes, window, n_campaigns, n_windows)
+
+    # Первый и последний клик: минимум и максимум с накоплением по окнам
+    cell = campaign_index * n_windows + window
+    first_click = np.full(n_campaigns * n_windows, np.iinfo('int64').max)
+    last_click = np.full(n_campaigns * n_windows, NAT_INT64)
+    np.minimum.at(first_click, cell, click_time)
+    np.maximum.at(last_click, cell, click_time)
+    first_click = np.minimum.accumulate(first_click.reshape(n_campaigns, n_windows), axis=1).ravel()
+    last_click = np.maximum.accumulate(last_click.reshape(n_campaigns, n_windows), axis=1).ravel()
+    first_click[first_click == np.iinfo('int64').max] = NAT_INT64
+
+    window_stats = pd.DataFrame({
+        'campaign_id': np.repeat(campaign_ids, n_windows),
+        'window': pd.Categorical(np.tile(windows, n_campaigns), categories=windows, ordered=True),
+        'window_hours': np.tile(window_ns / 3600e9, n_campaigns),
+        'total_clicks': total_clicks.ravel(),
+        'unique_users': unique_users.ravel(),
+        'regions_count': regions_count.ravel(),
+        'first_click_time': first_click.view('datetime64[ns]'),
+        'last_click_time': last_click.view('datetime64[ns]')
+    })
+
+    # Процент окна, в течение которого кампания была активна
+    window_stats['activity_percentage'] = (
+            (window_stats['last_click_time'] - window_stats['first_click_time']).dt.total_seconds()
+            / (window_stats['window_hours'] * 3600) * 100
+    ).round(1)
+
+    print(f"Анализ завершен за {time() - start_time:.1f} сек")
+    print(f"Проанализировано {n_campaigns} кампаний, окон: {n_windows}")
+
+    return window_stats
+
+
 # ========================================
 # Сохранение результатов
 # ========================================
-def save_results(df):
+def save_results(df, suffix='first_4_hours'):
     print("\nСохранение результатов...")
     try:
         # Пробуем сохранить в Parquet
         try:
-            df.to_parquet(f"{OUTPUT_FILE}_first_4_hours.parquet", engine='pyarrow')
-            print(f"Результаты сохранены в {OUTPUT_FILE}_first_4_hours.parquet")
+            df.to_parquet(f"{OUTPUT_FILE}_{suffix}.parquet", engine='pyarrow')
+            print(f"Результаты сохранены в {OUTPUT_FILE}_{suffix}.parquet")
         except:
             try:
-                df.to_parquet(f"{OUTPUT_FILE}_first_4_hours.parquet", engine='fastparquet')
-                print(f"Результаты сохранены в {OUTPUT_FILE}_first_4_hours.parquet (использован fastparquet)")
+                df.to_parquet(f"{OUTPUT_FILE}_{suffix}.parquet", engine='fastparquet')
+                print(f"Результаты сохранены в {OUTPUT_FILE}_{suffix}.parquet (использован fastparquet)")
             except:
                 # Если не получилось сохранить в Parquet, сохраняем в CSV
-                df.to_csv(f"{OUTPUT_FILE}_first_4_hours.csv.gz", compression='gzip', index=False)
-                print(f"Результаты сохранены в {OUTPUT_FILE}_first_4_hours.csv.gz")
+                df.to_csv(f"{OUTPUT_FILE}_{suffix}.csv.gz", compression='gzip', index=False)
+                print(f"Результаты сохранены в {OUTPUT_FILE}_{suffix}.csv.gz")
     except Exception as e:
         print(f"Ошибка при сохранении: {str(e)}", file=sys.stderr)
         sys.exit(1)
@@ -173,23 +288,49 @@ def print_tables(activity_stats):
         print(tabulate(top5, headers='keys', tablefmt='pretty', showindex=False))
 
 
+def print_window_tables(window_stats):
+    print("\nНакопленная активность по окнам (все кампании):")
+    summary = window_stats.assign(active=window_stats['total_clicks'] > 0).groupby('window', observed=True).agg(
+        campaigns=('active', 'sum'),
+        total_clicks=('total_clicks', 'sum'),
+        avg_unique_users=('unique_users', 'mean'),
+        avg_regions_count=('regions_count', 'mean')
+    ).reset_index()
+    print(tabulate(summary, headers='keys', tablefmt='pretty', showindex=False, floatfmt=".1f"))
+
+
 # ========================================
 # Главная функция
 # ========================================
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Активность кампаний в первые часы после создания')
+    parser.add_argument('--windows', nargs='+', default=ACTIVITY_WINDOWS,
+                        help='Окна накопленной активности, например 1h 4h 24h 7d')
+    args = parser.parse_args()
+
+    for window in args.windows:
+        try:
+            if pd.Timedelta(window) <= pd.Timedelta(0):
+                parser.error(f"Окно должно быть положительным: {window}")
+        except ValueError:
+            parser.error(f"Некорректное окно: {window}")
+
     # Загрузка данных
     clicks, campaigns, regions = load_data()
 
     # Анализ активности
     activity_stats = analyze_activity(clicks, campaigns)
+    window_stats = analyze_activity_windows(clicks, campaigns, args.windows)
 
     # Визуализация данных
     visualize_data(activity_stats)
 
     # Вывод таблиц
     print_tables(activity_stats)
+    print_window_tables(window_stats)
 
     # Сохранение результатов
     save_results(activity_stats)
+    save_results(window_stats, 'activity_windows')
 
     print("\nГотово! Анализ завершен.")
\ No newline at end of file
@@ -1,4 +1,5 @@
 import pandas as pd
+import numpy as np
 from datetime import timedelta
 import sys
 from time import time
@@ -6,6 +7,12 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from tabulate import tabulate
 from pathlib import Path
+import argparse
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from metrics.common.aggregations import add_percentage, aggregate_by_key
+from metrics.common.parquet_stream import iter_parquet_batches, parquet_num_rows, row_group_statistics
+from metrics.common.time_buckets import BUCKET_UNITS, bucket_labels, time_bucket
 
 # Настройка стиля графиков
 plt.style.use('seaborn-v0_8')
@@ -17,32 +24,37 @@ sns.set_palette("husl")
 PROJECT_ROOT = Path(__file__).parent.parent.parent  # Поднимаемся на уровень выше metrics/
 (PROJECT_ROOT / 'processed_data').mkdir(parents=True, exist_ok=True)
 CLICKS_FILE = PROJECT_ROOT / 'processed_data' / 'clicks_processed.parquet'
-CAMPAIGN_FILE = PROJECT_ROOT / 'processed_data' / 'campaign_processed.parquet'
-REGIONS_FILE = PROJECT_ROOT / 'processed_data' / 'regions_processed.parquet'
 PLOTS_DIR = PROJECT_ROOT / 'plots'
 OUTPUT_FILE = PROJECT_ROOT / 'processed_data' / 'processed_data'
 
+# Из кликов нужна только колонка времени
+TIME_COLUMN = 'click_time'
+
+# Детализации по умолчанию (их читает дашборд) и колонка подписи интервала в результатах
+DEFAULT_UNITS = ('day', 'month')
+LABEL_COLUMNS = {
+    'hour': 'click_hour',
+    'day': 'click_date',
+    'week': 'click_week',
+    'month': 'click_month',
+    'quarter': 'click_quarter'
+}
+
 
 # ========================================
 # Загрузка данных
 # ========================================
-def load_data():
+def load_data(click_files=(CLICKS_FILE,)):
+    """Клики не загружаются целиком: из файлов читается только колонка click_time"""
     print("Загрузка данных...")
-    start_time = time()
 
     try:
-        # Загружаем обработанные данные
-        clicks = pd.read_parquet(CLICKS_FILE)
-        campaigns = pd.read_parquet(CAMPAIGN_FILE)
+        missing = [str(path) for path in click_files if not Path(path).exists()]
+        if missing:
+            raise FileNotFoundError(f"Нет файлов кликов: {', '.join(missing)}")
 
-        # Преобразуем created_at из Unix timestamp в наносекундах
-        campaigns['created_at'] = pd.to_datetime(campaigns['created_at'].astype('int64') // 10 ** 9, unit='s')
-
-        print(f"Данные загружены за {time() - start_time:.1f} сек")
-        print(f"Кликов: {len(clicks):,}")
-        print(f"Кампаний: {len(campaigns):,}")
-
-        return clicks, campaigns
+        print(f"Кликов: {sum(parquet_num_rows(path) for path in click_files):,}")
+        return list(click_files)
 
     except Exception as e:
         print(f"Ошибка загрузки данных: {str(e)}", file=sys.stderr)
@@ -50,43 +62,86 @@ def load_data():
 
 
 # ========================================
-# Анализ кликов по дням и месяцам
+# Подсчет кликов по интервалам
 # ========================================
-def analyze_clicks_per_day_and_month(clicks, campaigns):
-    print("\nАнализ кликов по дням и месяцам кампаний...")
+def constant_row_groups(statistics, units):
+    """Группы строк, целиком попадающие в один интервал каждой детализации (по min/max в метаданных)
+
+    Их клики учитываются без чтения данных: {номер группы: (строк, {детализация: номер интервала})}.
+    """
+    constant = {}
+    for i, stats in enumerate(statistics):
+        if stats['null_count'] or stats['rows'] == 0:
+            continue
+        bounds = np.array([pd.Timestamp(stats['min']).value, pd.Timestamp(stats['max']).value])
+        buckets = {unit: time_bucket(bounds, unit) for unit in units}
+        if all(bucket[0] == bucket[1] for bucket in buckets.values()):
+            constant[i] = (stats['rows'], {unit: bucket[0] for unit, bucket in buckets.items()})
+    return constant
+
+
+def count_clicks(click_files, units):
+    """Количество кликов по номерам интервалов: {детализация: DataFrame (bucket, total_clicks)} и всего строк"""
+    parts = {unit: [] for unit in units}
+    total_rows = 0
+
+    for path in click_files:
+        statistics = row_group_statistics(path, TIME_COLUMN)
+        constant = constant_row_groups(statistics, units) if statistics is not None else {}
+        for rows, buckets in constant.values():
+            total_rows += rows
+            for unit, bucket in buckets.items():
+                parts[unit].append(pd.DataFrame({'bucket': [bucket], 'total_clicks': [rows]}))
+
+        # Остальные группы строк читаются пакетами, только колонка времени
+        row_groups = None
+        if constant:
+            row_groups = [i for i in range(len(statistics)) if i not in constant]
+            if not row_groups:
+                continue
+
+        for batch in iter_parquet_batches(path, [TIME_COLUMN], row_groups=row_groups):
+            click_time = batch[TIME_COLUMN].to_numpy('datetime64[ns]')
+            total_rows += len(click_time)
+            click_ns = click_time[~np.isnat(click_time)].view('int64')
+            for unit in units:
+                parts[unit].append(aggregate_by_key(time_bucket(click_ns, unit), key_name='bucket',
+                                                    count_name='total_clicks'))
+
+    counts = {}
+    for unit in units:
+        counts[unit] = (pd.concat(parts[unit], ignore_index=True)
+                        .groupby('bucket', sort=True, as_index=False)['total_clicks'].sum())
+    return counts, total_rows
+
+
+def analyze_clicks_per_period(click_files, units=DEFAULT_UNITS):
+    """Клики и их доля по интервалам выбранных детализаций: {детализация: DataFrame}"""
+    print(f"\nАнализ кликов по интервалам: {', '.join(units)}...")
     start_time = time()
 
-    # Объединяем клики с информацией о кампаниях
-    merged = pd.merge(clicks, campaigns, left_on='campaign_id', right_on='id', how='left')
-
-    # Вычисляем день и месяц клика
-    merged['click_date'] = merged['click_time'].dt.date
-    merged['click_month'] = merged['click_time'].dt.to_period('M')
-
-    # Преобразуем click_month в строку для правильной визуализации
-    merged['click_month'] = merged['click_month'].astype(str)
+    counts, total_clicks_all_time = count_clicks(click_files, units)
 
-    # Группируем по дням и месяцам
-    clicks_per_day = merged.groupby('click_date').agg(
-        total_clicks=('uid', 'count')
-    ).reset_index()
-
-    clicks_per_month = merged.groupby('click_month').agg(
-        total_clicks=('uid', 'count')
-    ).reset_index()
-
-    # Получаем общее количество кликов
-    total_clicks_all_time = len(merged)
-
-    # Добавляем процентное соотношение кликов по дням и месяцам
-    clicks_per_day['percentage'] = (clicks_per_day['total_clicks'] / total_clicks_all_time) * 100
-    clicks_per_month['percentage'] = (clicks_per_month['total_clicks'] / total_clicks_all_time) * 100
+    result = {}
+    for unit in units:
+        table = counts[unit]
+        # Подписи (даты, строки месяцев) строятся только для итоговых строк
+        table.insert(0, LABEL_COLUMNS[unit], bucket_labels(table.pop('bucket'), unit))
+        table['total_clicks'] = table['total_clicks'].astype('int64')
+        result[unit] = add_percentage(table, 'total_clicks', total=total_clicks_all_time)
 
     # Выводим результаты
     print(f"Анализ завершен за {time() - start_time:.1f} сек")
-    print(f"Проанализировано {len(clicks_per_day)} дней и {len(clicks_per_month)} месяцев")
+    print(f"Проанализировано: {', '.join(f'{len(result[unit])} ({unit})' for unit in units)}")
     print(f"Общее количество кликов: {total_clicks_all_time}")
 
+    return result
+
+
+def analyze_clicks_per_day_and_month(click_files=(CLICKS_FILE,)):
+    result = analyze_clicks_per_period(click_files, ('day', 'month'))
+    clicks_per_day, clicks_per_month = result['day'], result['month']
+
     # Покажем примеры
     print("\nКлики по дням:")
     print(clicks_per_day.head())
@@ -135,20 +190,19 @@ def visualize_data(clicks_per_day, clicks_per_month):
 # ========================================
 # Сохранение результатов
 # ========================================
-def save_results(clicks_per_day, clicks_per_month):
+def save_results(result):
     print("\nСохранение результатов...")
 
     try:
-        # Пробуем сохранить в Parquet
-        try:
-            clicks_per_day.to_parquet(f"{OUTPUT_FILE}_per_day.parquet", engine='pyarrow')
-            clicks_per_month.to_parquet(f"{OUTPUT_FILE}_per_month.parquet", engine='pyarrow')
-            print(f"Результаты сохранены в {OUTPUT_FILE}_per_day.parquet и {OUTPUT_FILE}_per_month.parquet")
-        except:
-            # Если не получилось сохранить в Parquet, сохраняем в CSV
-            clicks_per_day.to_csv(f"{OUTPUT_FILE}_per_day.csv.gz", compression='gzip', index=False)
-            clicks_per_month.to_csv(f"{OUTPUT_FILE}_per_month.csv.gz", compression='gzip', index=False)
-            print(f"Результаты сохранены в {OUTPUT_FILE}_per_day.csv.gz и {OUTPUT_FILE}_per_month.csv.gz")
+        for unit, table in result.items():
+            # Пробуем сохранить в Parquet
+            try:
+                table.to_parquet(f"{OUTPUT_FILE}_per_{unit}.parquet", engine='pyarrow')
+                print(f"Результаты сохранены в {OUTPUT_FILE}_per_{unit}.parquet")
+            except:
+                # Если не получилось сохранить в Parquet, сохраняем в CSV
+                table.to_csv(f"{OUTPUT_FILE}_per_{unit}.csv.gz", compression='gzip', index=False)
+                print(f"Результаты сохранены в {OUTPUT_FILE}_per_{unit}.csv.gz")
     except Exception as e:
         print(f"Ошибка при сохранении: {str(e)}", file=sys.stderr)
         sys.exit(1)
@@ -157,37 +211,41 @@ def save_results(clicks_per_day, clicks_per_month):
 # ========================================
 # Вывод красивых таблиц
 # ========================================
-def print_tables(clicks_per_day, clicks_per_month):
+def print_tables(result):
     print("\nСводная статистика по кликам:")
 
-    # Топ-5 по дням
-    top5_days = clicks_per_day.nlargest(5, 'total_clicks')[['click_date', 'total_clicks', 'percentage']]
-    print("\nТоп-5 дней по количеству кликов:")
-    print(tabulate(top5_days, headers='keys', tablefmt='pretty', floatfmt=".1f"))
-
-    # Топ-5 по месяцам
-    top5_months = clicks_per_month.nlargest(5, 'total_clicks')[['click_month', 'total_clicks', 'percentage']]
-    print("\nТоп-5 месяцев по количеству кликов:")
-    print(tabulate(top5_months, headers='keys', tablefmt='pretty', floatfmt=".1f"))
+    # Топ-5 интервалов каждой детализации
+    for unit, table in result.items():
+        top5 = table.nlargest(5, 'total_clicks')[[LABEL_COLUMNS[unit], 'total_clicks', 'percentage']]
+        print(f"\nТоп-5 интервалов ({unit}) по количеству кликов:")
+        print(tabulate(top5, headers='keys', tablefmt='pretty', floatfmt=".1f"))
 
 
 # ========================================
 # Главная функция
 # ========================================
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Клики по календарным интервалам')
+    parser.add_argument('--granularity', nargs='+', choices=BUCKET_UNITS, default=list(DEFAULT_UNITS),
+                        help='Детализации: hour, day, week, month, quarter')
+    parser.add_argument('--clicks', nargs='+', type=Path, default=[CLICKS_FILE],
+                        help='Файлы кликов (партиции), обрабатываются по очереди')
+    args = parser.parse_args()
+
     # Загрузка данных
-    clicks, campaigns = load_data()
+    click_files = load_data(args.clicks)
 
-    # Анализ кликов по дням и месяцам
-    clicks_per_day, clicks_per_month = analyze_clicks_per_day_and_month(clicks, campaigns)
+    # Анализ кликов по интервалам
+    result = analyze_clicks_per_period(click_files, tuple(dict.fromkeys(args.granularity)))
 
-    # Визуализация данных
-    visualize_data(clicks_per_day, clicks_per_month)
+    # Визуализация данных (графики по дням и месяцам)
+    if 'day' in result and 'month' in result:
+        visualize_data(result['day'], result['month'])
 
     # Вывод таблиц
-    print_tables(clicks_per_day, clicks_per_month)
+    print_tables(result)
 
     # Сохранение результатов
-    save_results(clicks_per_day, clicks_per_month)
+    save_results(result)
 
-    print("\nГотово! Анализ завершен.")
\ No newline at end of file
+    print("\nГотово! Анализ завершен.")
@@ -0,0 +1 @@
+# Общие функции метрик: потоковое чтение, соединения, агрегаты
@@ -0,0 +1,51 @@
+# metrics/common/aggregations.py
+import numpy as np
+import pandas as pd
+
+
+# ========================================
+# Счетчики по ключу
+# ========================================
+def count_by_key(codes, n_keys=0, weights=None):
+    """Количество (или сумма weights) по плотному ключу 0..n_keys-1 (np.bincount)"""
+    return np.bincount(np.asarray(codes, dtype='int64'), weights=weights, minlength=n_keys)
+
+
+def distinct_by_key(codes, values, n_keys=0):
+    """Число уникальных непустых значений по плотному ключу 0..n_keys-1"""
+    value_codes, _ = pd.factorize(values)
+    codes = np.asarray(codes, dtype='int64')
+    present = value_codes >= 0
+
+    # Пара (ключ, значение) упаковывается в один int64; уникальные пары считаются по ключу
+    pairs = np.unique((codes[present] << 32) | value_codes[present])
+    return np.bincount(pairs >> 32, minlength=n_keys)
+
+
+def aggregate_by_key(keys, values=None, key_name='key', count_name=None, distinct_name=None):
+    """Аналог groupby(key).agg(count, nunique): таблица, отсортированная по ключу
+
+    count_name - число непустых values (все строки, если values не задан),
+    distinct_name - число уникальных непустых values. Пустые ключи отбрасываются.
+    """
+    codes, uniques = pd.factorize(keys, sort=True)
+    present = codes >= 0
+    codes = codes[present]
+    table = pd.DataFrame({key_name: uniques})
+
+    if values is not None:
+        values = np.asarray(values)[present]
+    if count_name is not None:
+        counted = codes if values is None else codes[pd.notna(values)]
+        table[count_name] = count_by_key(counted, len(uniques))
+    if distinct_name is not None:
+        table[distinct_name] = distinct_by_key(codes, values, len(uniques))
+
+    return table
+
+
+def add_percentage(table, column, name='percentage', total=None):
+    """Доля строки в процентах от total (по умолчанию - от суммы колонки)"""
+    total = table[column].sum() if total is None else total
+    table[name] = (table[column] / total) * 100
+    return table
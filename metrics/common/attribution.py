@@ -0,0 +1,67 @@
+# metrics/common/attribution.py
+import numpy as np
+import pandas as pd
+
+from metrics.common.aggregations import count_by_key, distinct_by_key
+
+# ========================================
+# Конфигурация
+# ========================================
+# Модели атрибуции: каждый пользователь распределяет между кампаниями ровно 1 единицу
+ATTRIBUTION_MODELS = ('first_touch', 'last_touch', 'linear')
+
+
+# ========================================
+# Атрибуция по отсортированным касаниям
+# ========================================
+def empty_credits(campaign_dtype='int64'):
+    """Таблица кредитов без кампаний (нет ни одного касания)"""
+    return pd.DataFrame({
+        'campaign_id': pd.Series(dtype=campaign_dtype),
+        'clicks': pd.Series(dtype='int64'),
+        'users': pd.Series(dtype='int64'),
+        **{model: pd.Series(dtype='float64') for model in ATTRIBUTION_MODELS}
+    })
+
+
+def attribution_credits(uids, time_ns, campaign_ids):
+    """Кредиты кампаний по цепочкам кликов пользователей
+
+    Клики каждого пользователя упорядочиваются по времени: first_touch отдает единицу
+    кампании первого клика, last_touch - последнего, linear делит ее поровну между всеми
+    кликами. Возвращает DataFrame (campaign_id, clicks, users, first_touch, last_touch,
+    linear), отсортированный по кампании; клики без кампании не считаются касаниями.
+    """
+    campaign_ids = np.asarray(campaign_ids)
+    touches = pd.notna(campaign_ids)
+    if not touches.any():
+        return empty_credits(campaign_ids.dtype)
+    user_codes, _ = pd.factorize(np.asarray(uids)[touches])
+    campaign_codes, campaigns = pd.factorize(campaign_ids[touches], sort=True)
+    time_ns = np.asarray(time_ns, dtype='int64')[touches]
+
+    order = np.lexsort((time_ns, user_codes))
+    users, campaign_codes = user_codes[order], campaign_codes[order]
+
+    # Цепочка пользователя - непрерывный отрезок отсортированного массива
+    starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+    ends = np.r_[starts[1:], len(users)]
+    lengths = ends - starts
+
+    n_campaigns = len(campaigns)
+    return pd.DataFrame({
+        'campaign_id': campaigns,
+        'clicks': count_by_key(campaign_codes, n_campaigns),
+        'users': distinct_by_key(campaign_codes, users, n_campaigns),
+        'first_touch': count_by_key(campaign_codes[starts], n_campaigns).astype('float64'),
+        'last_touch': count_by_key(campaign_codes[ends - 1], n_campaigns).astype('float64'),
+        'linear': count_by_key(campaign_codes, n_campaigns, np.repeat(1 / lengths, lengths))
+    })
+
+
+def merge_credits(parts):
+    """Сумма кредитов по партициям с непересекающимися пользователями"""
+    parts = [part for part in parts if part is not None and len(part)]
+    if not parts:
+        return empty_credits()
+    return pd.concat(parts, ignore_index=True).groupby('campaign_id', sort=True, as_index=False).sum()
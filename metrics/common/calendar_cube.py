@@ -0,0 +1,97 @@
+# metrics/common/calendar_cube.py
+import numpy as np
+import pandas as pd
+
+from metrics.common.time_buckets import iso_week_start, iso_year_week, time_bucket, weekday, year_and_month
+from metrics.common.timezones import NS_PER_DAY
+
+# ========================================
+# Конфигурация
+# ========================================
+# Недель в ISO году не больше 53, дней в неделе - 7
+ISO_WEEKS = 53
+WEEKDAYS = 7
+
+
+# ========================================
+# Построение и хранение куба
+# ========================================
+def build_calendar_cube(days):
+    """Плотный куб количества событий: ISO год x ISO неделя x день недели
+
+    days - номера дней событий от начала эпохи. Результат - словарь массивов:
+    iso_years (int16, Y) и counts (int32, Y x 53 x 7); индекс недели - номер недели минус 1.
+    """
+    years, weeks = iso_year_week(days)
+    first_year = int(years.min()) if len(years) else 1970
+    n_years = int(years.max()) - first_year + 1 if len(years) else 0
+
+    flat = ((years.astype('int64') - first_year) * ISO_WEEKS + (weeks - 1)) * WEEKDAYS + weekday(days)
+    counts = np.bincount(flat, minlength=n_years * ISO_WEEKS * WEEKDAYS).astype('int32')
+    return {
+        'iso_years': np.arange(first_year, first_year + n_years, dtype='int16'),
+        'counts': counts.reshape(n_years, ISO_WEEKS, WEEKDAYS)
+    }
+
+
+def save_calendar_cube(cube, path):
+    np.savez_compressed(path, **cube)
+
+
+def load_calendar_cube(path):
+    with np.load(path) as stored:
+        return {name: stored[name] for name in stored.files}
+
+
+# ========================================
+# Срезы куба (без повторной группировки событий)
+# ========================================
+def cube_days(cube):
+    """Номер дня для каждой ячейки куба (та же форма, что у counts)"""
+    week_start = iso_week_start(cube['iso_years'])
+    return (week_start[:, None, None]
+            + np.arange(ISO_WEEKS)[None, :, None] * 7
+            + np.arange(WEEKDAYS)[None, None, :])
+
+
+def weekday_values(cube):
+    """Количество событий в каждый день с событиями, по дням недели: список из 7 массивов"""
+    counts = cube['counts']
+    return [counts[:, :, day][counts[:, :, day] > 0] for day in range(WEEKDAYS)]
+
+
+def monthly_totals(cube):
+    """Сумма событий по календарным месяцам: DataFrame (year, month, count) в хронологическом порядке"""
+    counts = cube['counts'].ravel()
+    filled = counts > 0
+    months = time_bucket(cube_days(cube).ravel()[filled] * NS_PER_DAY, 'month')
+
+    codes, uniques = pd.factorize(months, sort=True)
+    years, month_numbers = year_and_month(uniques)
+    return pd.DataFrame({
+        'year': years,
+        'month': month_numbers,
+        'count': np.bincount(codes, weights=counts[filled]).astype('int64')
+    })
+
+
+def week_rows(cube):
+    """Строки неделя x день недели от первой до последней недели с событиями
+
+    Возвращает подписи недель (2024-W05) и матрицу количеств (недели x 7).
+    """
+    counts = cube['counts'].reshape(-1, WEEKDAYS)
+    filled = np.flatnonzero(counts.sum(axis=1))
+    if not len(filled):
+        return [], np.zeros((0, WEEKDAYS), dtype='int32')
+
+    rows = np.arange(filled[0], filled[-1] + 1)
+
+    # 53-я неделя есть не в каждом ISO году: ее понедельник должен относиться к тому же году
+    mondays = cube_days(cube)[:, :, 0].ravel()[rows]
+    rows = rows[iso_year_week(mondays)[0] == cube['iso_years'][rows // ISO_WEEKS]]
+
+    years = cube['iso_years'][rows // ISO_WEEKS]
+    weeks = rows % ISO_WEEKS + 1
+    labels = [f"{year}-W{week:02d}" for year, week in zip(years, weeks)]
+    return labels, counts[rows]
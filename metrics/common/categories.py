@@ -0,0 +1,46 @@
+# metrics/common/categories.py
+import numpy as np
+import pandas as pd
+
+
+# ========================================
+# Общий словарь категорий для пакетов и партиций
+# ========================================
+def new_dictionary():
+    """Пустой словарь категорий; значения добавляются в порядке первого появления"""
+    return pd.Index([], dtype=object)
+
+
+def global_codes(values, dictionary):
+    """Коды значений в общем словаре и обновленный словарь
+
+    У каждого пакета parquet свой словарь категорий, поэтому коды пакета переводятся
+    в общие через таблицу перекодировки размером со словарь пакета: строки сравниваются
+    только на уровне словарей, не по строкам кликов. Пропуски получают код -1.
+    """
+    values = pd.Series(values)
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype('category')
+
+    categories = values.cat.categories
+    if not len(categories):
+        return np.full(len(values), -1, dtype='int32'), dictionary
+    dictionary = dictionary.append(categories.difference(dictionary, sort=False))
+    remap = dictionary.get_indexer(categories).astype('int32')
+
+    codes = values.cat.codes.to_numpy()
+    return np.where(codes >= 0, remap[np.maximum(codes, 0)], -1).astype('int32'), dictionary
+
+
+def sorted_dictionary(codes, dictionary):
+    """Перекодировка в словарь, отсортированный по значению: (новые коды, отсортированный словарь)"""
+    order = np.argsort(np.asarray(dictionary, dtype=str), kind='stable')
+    remap = np.empty(len(order), dtype='int32')
+    remap[order] = np.arange(len(order), dtype='int32')
+    codes = np.asarray(codes, dtype='int32')
+    return np.where(codes >= 0, remap[np.maximum(codes, 0)], -1).astype('int32'), dictionary[order]
+
+
+def as_categorical(codes, dictionary):
+    """Колонка category по кодам общего словаря (-1 - пропуск)"""
+    return pd.Categorical.from_codes(np.asarray(codes, dtype='int32'), categories=dictionary)
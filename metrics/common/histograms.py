@@ -0,0 +1,83 @@
+# metrics/common/histograms.py
+import numpy as np
+import pandas as pd
+
+# ========================================
+# Конфигурация
+# ========================================
+# Корзин на один порядок величины (шаг границ ~26%)
+BINS_PER_DECADE = 10
+
+
+# ========================================
+# Логарифмические корзины
+# ========================================
+def log_bin_edges(max_value, min_value=1, bins_per_decade=BINS_PER_DECADE):
+    """Границы корзин: [0, min_value), затем логарифмически до max_value включительно
+
+    Границы фиксированы, поэтому гистограммы разных партиций и запусков складываются.
+    """
+    n_bins = int(np.ceil(np.log10(max_value / min_value) * bins_per_decade))
+    return np.r_[0.0, min_value * 10 ** (np.arange(n_bins + 1) / bins_per_decade)]
+
+
+def bin_index(values, edges):
+    """Номер корзины; значения за пределами границ попадают в крайние корзины"""
+    index = np.searchsorted(edges, values, side='right') - 1
+    return np.clip(index, 0, len(edges) - 2).astype('int16')
+
+
+# ========================================
+# Счетчики по парам (группа, корзина)
+# ========================================
+def count_pairs(groups, codes):
+    """Уникальные пары (группа, код) и их количество, отсортированные по группе и коду"""
+    groups = np.asarray(groups, dtype='int64')
+    codes = np.asarray(codes).astype('int64')
+
+    # Пара упаковывается в один int64 для np.unique
+    keys, counts = np.unique((groups << 32) | (codes & 0xFFFFFFFF), return_counts=True)
+    return keys >> 32, (keys & 0xFFFFFFFF).astype('uint32').view('int32'), counts.astype('int64')
+
+
+def grouped_histogram(groups, values, edges):
+    """Разреженная гистограмма по группам: DataFrame (group, bin, count)"""
+    groups, bins, counts = count_pairs(groups, bin_index(values, edges))
+    return pd.DataFrame({'group': groups, 'bin': bins.astype('int16'), 'count': counts})
+
+
+def merge_histograms(histograms):
+    """Сумма разреженных гистограмм (партиции, пакеты, запуски)"""
+    histograms = [h for h in histograms if h is not None and len(h)]
+    if not histograms:
+        return pd.DataFrame({'group': pd.Series(dtype='int64'), 'bin': pd.Series(dtype='int16'),
+                             'count': pd.Series(dtype='int64')})
+    return (pd.concat(histograms, ignore_index=True)
+            .groupby(['group', 'bin'], sort=True, as_index=False)['count'].sum())
+
+
+def total_histogram(histogram, edges):
+    """Гистограмма без разбиения на группы, со всеми корзинами (включая пустые)"""
+    counts = np.bincount(histogram['bin'].to_numpy(), weights=histogram['count'].to_numpy(),
+                         minlength=len(edges) - 1).astype('int64')
+    total = counts.sum()
+    return pd.DataFrame({
+        'bin': np.arange(len(edges) - 1, dtype='int16'),
+        'bin_left': edges[:-1],
+        'bin_right': edges[1:],
+        'count': counts,
+        'share': counts / total if total else np.zeros(len(counts))
+    })
+
+
+def count_matrix(row_codes, col_codes, n_rows, n_cols, weights=None):
+    """Плотная матрица счетчиков n_rows x n_cols; строки с отрицательным кодом (пропуски) не считаются"""
+    row_codes = np.asarray(row_codes, dtype='int64')
+    col_codes = np.asarray(col_codes, dtype='int64')
+    valid = (row_codes >= 0) & (col_codes >= 0)
+    if weights is not None:
+        weights = np.asarray(weights)[valid]
+
+    counts = np.bincount(row_codes[valid] * n_cols + col_codes[valid], weights=weights,
+                         minlength=n_rows * n_cols)
+    return counts.reshape(n_rows, n_cols)
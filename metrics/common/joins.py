@@ -0,0 +1,54 @@
+# metrics/common/joins.py
+import numpy as np
+
+# ========================================
+# Конфигурация
+# ========================================
+# Плотный массив строится, если он не длиннее DENSE_MAX_RATIO * число ключей (+ запас)
+DENSE_MAX_RATIO = 8
+DENSE_MIN_SIZE = 1 << 16
+
+# Пустое значение для времени в int64 (так NaT хранится в datetime64[ns])
+NAT_INT64 = np.iinfo('int64').min
+
+
+# ========================================
+# Соединение по целочисленному ключу без pd.merge
+# ========================================
+def build_key_lookup(keys, values, fill):
+    """Таблица ключ -> значение для целочисленных ключей (например, id кампании)
+
+    Для компактных неотрицательных ключей - плотный массив, индекс которого и есть ключ;
+    иначе - отсортированные ключи для двоичного поиска.
+    """
+    keys = np.asarray(keys)
+    values = np.asarray(values)
+
+    if len(keys) and keys.min() >= 0 and keys.max() < DENSE_MAX_RATIO * len(keys) + DENSE_MIN_SIZE:
+        table = np.full(int(keys.max()) + 1, fill, dtype=values.dtype)
+        table[keys] = values
+        return {'dense': table, 'fill': fill}
+
+    order = np.argsort(keys, kind='stable')
+    return {'keys': keys[order], 'values': values[order], 'fill': fill}
+
+
+def apply_key_lookup(lookup, query):
+    """Значения для массива ключей; для неизвестных ключей - fill"""
+    query = np.asarray(query)
+
+    if 'dense' in lookup:
+        table = lookup['dense']
+        known = (query >= 0) & (query < len(table))
+        result = np.full(len(query), lookup['fill'], dtype=table.dtype)
+        result[known] = table[query[known]]
+        return result
+
+    keys, values = lookup['keys'], lookup['values']
+    result = np.full(len(query), lookup['fill'], dtype=values.dtype)
+    if len(keys) == 0:
+        return result
+    pos = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+    known = keys[pos] == query
+    result[known] = values[pos[known]]
+    return result
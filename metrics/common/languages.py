@@ -0,0 +1,39 @@
+# metrics/common/languages.py
+import numpy as np
+import pandas as pd
+
+# ========================================
+# Конфигурация
+# ========================================
+# Клики без языка (BCP 47: язык не определен)
+UNKNOWN_LANGUAGE = 'und'
+
+
+# ========================================
+# Нормализация языка по словарю категорий
+# ========================================
+def language_base(names):
+    """Основной подтег языка в нижнем регистре: ru-RU, RU, ru_ru -> ru"""
+    names = pd.Index(names, dtype=object).str.strip().str.lower()
+    base = names.str.split(r'[-_]', n=1, regex=True).str[0]
+    return base.where(base.str.len() > 0, UNKNOWN_LANGUAGE)
+
+
+def normalize_languages(values):
+    """Колонка category с нормализованными языками; пропуски - UNKNOWN_LANGUAGE
+
+    Варианты сводятся на уровне словаря категорий (несколько значений на язык),
+    коды строк только перекодируются, строки кликов не обрабатываются.
+    """
+    values = pd.Series(values)
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype('category')
+
+    base = language_base(values.cat.categories)
+    languages = pd.Index(base.unique()).append(pd.Index([UNKNOWN_LANGUAGE])).unique().sort_values()
+    remap = languages.get_indexer(base).astype('int32')
+
+    codes = values.cat.codes.to_numpy()
+    unknown = languages.get_loc(UNKNOWN_LANGUAGE)
+    codes = np.where(codes >= 0, remap[np.maximum(codes, 0)] if len(remap) else unknown, unknown)
+    return pd.Series(pd.Categorical.from_codes(codes.astype('int32'), categories=languages), index=values.index)
@@ -0,0 +1,63 @@
+# metrics/common/parquet_stream.py
+import pandas as pd
+
+# ========================================
+# Конфигурация
+# ========================================
+# Строк в одном пакете при потоковом чтении parquet
+BATCH_SIZE = 500_000
+
+
+# ========================================
+# Потоковое чтение
+# ========================================
+def parquet_num_rows(path):
+    """Количество строк файла по метаданным, без чтения данных"""
+    try:
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    except ImportError:
+        return len(pd.read_parquet(path, columns=[]))
+
+
+def row_group_statistics(path, column):
+    """Статистики колонки по группам строк: список словарей (rows, min, max, null_count) или None
+
+    None - если PyArrow нет или в файле не записаны min/max колонки.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        return None
+
+    metadata = pq.ParquetFile(path).metadata
+    index = metadata.schema.names.index(column)
+    statistics = []
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        stats = row_group.column(index).statistics
+        if stats is None or not stats.has_min_max or not stats.has_null_count:
+            return None
+        statistics.append({'rows': row_group.num_rows, 'min': stats.min, 'max': stats.max,
+                           'null_count': stats.null_count})
+    return statistics
+
+
+def iter_parquet_batches(path, columns, batch_size=BATCH_SIZE, row_groups=None):
+    """Читает только нужные колонки файла пакетами по batch_size строк (DataFrame на пакет)
+
+    row_groups - номера групп строк, которые нужно прочитать (по умолчанию все).
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        # Без PyArrow читаем колонки целиком и отдаем их теми же пакетами
+        if row_groups is not None:
+            raise ImportError("Чтение отдельных групп строк требует PyArrow")
+        df = pd.read_parquet(path, columns=columns)
+        for start in range(0, len(df), batch_size):
+            yield df.iloc[start:start + batch_size]
+        return
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=columns, row_groups=row_groups):
+        yield batch.to_pandas()
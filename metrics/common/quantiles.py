@@ -0,0 +1,98 @@
+# metrics/common/quantiles.py
+import numpy as np
+import pandas as pd
+
+from metrics.common.histograms import count_pairs
+
+# ========================================
+# Конфигурация
+# ========================================
+# Относительная точность скетча: оценка квантиля отличается от точной не более чем на 1%
+RELATIVE_ACCURACY = 0.01
+
+# Корзина для нулевых значений (логарифм от нуля не определен)
+ZERO_BUCKET = np.iinfo('int32').min
+
+SKETCH_COLUMNS = ['group', 'bucket', 'count']
+
+
+# ========================================
+# Логарифмические корзины
+# ========================================
+def _gamma(relative_accuracy):
+    return (1 + relative_accuracy) / (1 - relative_accuracy)
+
+
+def value_to_bucket(values, relative_accuracy=RELATIVE_ACCURACY):
+    """Номер корзины: значения из (gamma^(i-1), gamma^i] попадают в корзину i"""
+    values = np.asarray(values, dtype='float64')
+    buckets = np.full(len(values), ZERO_BUCKET, dtype='int32')
+    positive = values > 0
+    buckets[positive] = np.ceil(np.log(values[positive]) / np.log(_gamma(relative_accuracy)))
+    return buckets
+
+
+def bucket_to_value(buckets, relative_accuracy=RELATIVE_ACCURACY):
+    """Представитель корзины с относительной ошибкой не больше relative_accuracy"""
+    gamma = _gamma(relative_accuracy)
+    buckets = np.asarray(buckets)
+    values = 2 * np.power(gamma, buckets.astype('float64')) / (gamma + 1)
+    return np.where(buckets == ZERO_BUCKET, 0.0, values)
+
+
+# ========================================
+# Скетч квантилей по группам (разреженные счетчики корзин)
+# ========================================
+def build_sketch(groups, values, relative_accuracy=RELATIVE_ACCURACY):
+    """Скетч одного пакета: DataFrame (group, bucket, count), отсортированный по group и bucket"""
+    groups, buckets, counts = count_pairs(groups, value_to_bucket(values, relative_accuracy))
+    return pd.DataFrame({'group': groups, 'bucket': buckets, 'count': counts})
+
+
+def merge_sketches(sketches):
+    """Объединение скетчей разных пакетов, партиций или запусков (сложение счетчиков)"""
+    sketches = [sketch[SKETCH_COLUMNS] for sketch in sketches if sketch is not None and len(sketch)]
+    if not sketches:
+        return pd.DataFrame({'group': pd.Series(dtype='int64'), 'bucket': pd.Series(dtype='int32'),
+                             'count': pd.Series(dtype='int64')})
+    if len(sketches) == 1:
+        return sketches[0].reset_index(drop=True)
+
+    return (pd.concat(sketches, ignore_index=True)
+            .groupby(['group', 'bucket'], sort=True, as_index=False)['count'].sum())
+
+
+def sketch_quantiles(sketch, quantiles, relative_accuracy=RELATIVE_ACCURACY):
+    """Квантили по каждой группе скетча: DataFrame с индексом group и колонкой на квантиль"""
+    sketch = sketch.sort_values(['group', 'bucket'], ignore_index=True)
+    groups = sketch['group'].to_numpy()
+    cumulative = sketch.groupby('group', sort=False)['count'].cumsum().to_numpy()
+    totals = sketch.groupby('group', sort=False)['count'].transform('sum').to_numpy()
+    values = bucket_to_value(sketch['bucket'].to_numpy(), relative_accuracy)
+
+    # Первая строка каждой группы и позиция границы групп
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    result = pd.DataFrame(index=pd.Index(groups[starts], name='group'))
+
+    def value_at_rank(rank):
+        # Первая корзина группы, накрывающая ранг (накрытые строки идут подряд до конца группы)
+        covered = cumulative > rank
+        first = np.minimum.reduceat(np.where(covered, np.arange(len(sketch)), len(sketch)), starts)
+        return values[first]
+
+    group_totals = totals[starts]
+    for q in quantiles:
+        # Ранг квантиля как у точного расчета (q * (n - 1)) с линейной интерполяцией между соседями
+        rank = q * (group_totals - 1)
+        lower = np.repeat(np.floor(rank), np.diff(np.r_[starts, len(sketch)]))
+        low, high = value_at_rank(lower), value_at_rank(np.minimum(lower + 1, totals - 1))
+        result[q] = low + (rank - np.floor(rank)) * (high - low)
+
+    return result
+
+
+def sketch_totals(sketch):
+    """Скетч всех значений без разбиения на группы (группа 0)"""
+    total = sketch.groupby('bucket', sort=True, as_index=False)['count'].sum()
+    total.insert(0, 'group', np.int64(0))
+    return total
@@ -0,0 +1,152 @@
+# metrics/common/send_time.py
+import numpy as np
+import pandas as pd
+
+from metrics.common.histograms import count_matrix
+from metrics.common.timezones import HOURS_PER_WEEK, region_utc_offsets
+
+# ========================================
+# Конфигурация
+# ========================================
+# Сглаживание по соседним часам недели (циклически: воскресенье 23:00 соседствует с понедельником 00:00)
+SMOOTHING_KERNEL = (0.25, 0.5, 0.25)
+
+# Вес общего профиля всех кликов: малые выборки тянутся к нему, большие почти не меняются
+PRIOR_CLICKS = 200
+
+# z-значение для 95% доверительного интервала (интервал Уилсона)
+CONFIDENCE_Z = 1.96
+
+WEEKDAY_NAMES = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+
+
+# ========================================
+# Матрица часов недели
+# ========================================
+def build_send_time_matrix(regions, devices, campaign_ids, how):
+    """Клики по часу недели (местное время): регион x устройство x час и кампания x час
+
+    devices - категориальная колонка устройства, how - час недели клика (0..167).
+    """
+    devices = pd.Series(devices).astype('category')
+    region_index, region_codes = pd.factorize(np.asarray(regions), sort=True)
+    campaign_index, campaign_codes = pd.factorize(np.asarray(campaign_ids), sort=True)
+    device_codes = devices.cat.codes.to_numpy()
+    n_devices = len(devices.cat.categories)
+
+    # Регион и устройство объединяются в одну строку матрицы
+    region_device = count_matrix(region_index * n_devices + device_codes, how,
+                                 len(region_codes) * n_devices, HOURS_PER_WEEK)
+
+    return {
+        'region_codes': region_codes.astype('int16'),
+        'device_names': np.asarray(devices.cat.categories, dtype=str),
+        'campaign_ids': campaign_codes.astype('int32'),
+        'region_device_how': region_device.reshape(len(region_codes), n_devices, HOURS_PER_WEEK).astype('int32'),
+        'campaign_how': count_matrix(campaign_index, how, len(campaign_codes), HOURS_PER_WEEK).astype('int32')
+    }
+
+
+def save_send_time_matrix(matrix, path):
+    np.savez_compressed(path, **matrix)
+
+
+def load_send_time_matrix(path):
+    with np.load(path) as stored:
+        return {name: stored[name] for name in stored.files}
+
+
+# ========================================
+# Рекомендации по выбранному срезу
+# ========================================
+def selection_counts(matrix, regions=None, devices=None, campaigns=None):
+    """Клики по часам недели для выбранных регионов и устройств или для выбранных кампаний
+
+    Кампании хранятся отдельной матрицей, поэтому сочетаются только сами с собой.
+    """
+    if campaigns:
+        rows = np.isin(matrix['campaign_ids'], campaigns)
+        return matrix['campaign_how'][rows].sum(axis=0)
+
+    counts = matrix['region_device_how']
+    if regions:
+        counts = counts[np.isin(matrix['region_codes'], regions)]
+    if devices:
+        counts = counts[:, np.isin(matrix['device_names'], devices)]
+    return counts.sum(axis=(0, 1))
+
+
+def smoothed_shares(counts, prior_counts):
+    """Доля кликов по часам недели: циклическое сглаживание и стягивание к общему профилю"""
+    counts = np.asarray(counts, dtype='float64')
+    smoothed = sum(weight * np.roll(counts, shift)
+                   for shift, weight in zip((1, 0, -1), SMOOTHING_KERNEL))
+
+    prior = np.asarray(prior_counts, dtype='float64')
+    prior = prior / prior.sum() if prior.sum() else np.full(HOURS_PER_WEEK, 1 / HOURS_PER_WEEK)
+    return (smoothed + PRIOR_CLICKS * prior) / (counts.sum() + PRIOR_CLICKS)
+
+
+def wilson_interval(successes, total, z=CONFIDENCE_Z):
+    """Доверительный интервал доли successes / total"""
+    successes = np.asarray(successes, dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = successes / total
+        denominator = 1 + z ** 2 / total
+        center = (p + z ** 2 / (2 * total)) / denominator
+        margin = z * np.sqrt(p * (1 - p) / total + z ** 2 / (4 * total ** 2)) / denominator
+    return center - margin, center + margin
+
+
+def best_windows(counts, prior_counts, top_n=3, window_hours=2):
+    """Лучшие непересекающиеся окна по кликам среза за час недели (местное время)
+
+    Окна ранжируются по сглаженной доле share; observed_share и интервал ci_low..ci_high -
+    фактическая доля кликов среза в окне и ее 95% доверительный интервал.
+    """
+    counts = np.asarray(counts)
+    shares = smoothed_shares(counts, prior_counts)
+    total = counts.sum()
+
+    # Сумма по окну, начинающемуся в каждом часе недели
+    window_shares = sum(np.roll(shares, -offset) for offset in range(window_hours))
+    window_clicks = sum(np.roll(counts, -offset) for offset in range(window_hours))
+
+    starts = []
+    available = np.ones(HOURS_PER_WEEK, dtype=bool)
+    for _ in range(min(top_n, HOURS_PER_WEEK // window_hours)):
+        start = int(np.argmax(np.where(available, window_shares, -np.inf)))
+        starts.append(start)
+        # Окна, пересекающиеся с выбранным, больше не рассматриваются
+        available[(start + np.arange(-window_hours + 1, window_hours)) % HOURS_PER_WEEK] = False
+
+    starts = np.array(starts, dtype='int64')
+    ci_low, ci_high = wilson_interval(window_clicks[starts], total)
+
+    return pd.DataFrame({
+        'rank': np.arange(1, len(starts) + 1),
+        'weekday': starts // 24,
+        'weekday_name': [WEEKDAY_NAMES[day] for day in starts // 24],
+        'start_hour': starts % 24,
+        'end_hour': (starts + window_hours) % 24,
+        'share': window_shares[starts] * 100,
+        'observed_share': window_clicks[starts] / total * 100 if total else np.nan,
+        'ci_low': ci_low * 100,
+        'ci_high': ci_high * 100,
+        'clicks': window_clicks[starts].astype('int64'),
+        'lift': window_shares[starts] / (window_hours / HOURS_PER_WEEK)
+    })
+
+
+def recommend_send_windows(matrix, regions=None, devices=None, campaigns=None, top_n=3, window_hours=2):
+    """Лучшие непересекающиеся окна получения (местное время) для выбранного среза"""
+    counts = selection_counts(matrix, regions, devices, campaigns)
+    recommendations = best_windows(counts, matrix['region_device_how'].sum(axis=(0, 1)), top_n, window_hours)
+
+    # Для одного часового пояса - время отправки в UTC
+    if regions:
+        offsets = np.unique(region_utc_offsets(regions))
+        if len(offsets) == 1:
+            recommendations['send_utc_hour'] = (recommendations['start_hour'] - int(offsets[0])) % 24
+
+    return recommendations
@@ -0,0 +1,53 @@
+# metrics/common/sessions.py
+import numpy as np
+import pandas as pd
+
+from metrics.common.aggregations import distinct_by_key
+from metrics.common.time_buckets import NS_PER_MINUTE
+
+# ========================================
+# Конфигурация
+# ========================================
+# Перерыв между кликами пользователя, после которого начинается новая сессия (минуты)
+SESSION_GAP_MINUTES = 30
+
+
+# ========================================
+# Разметка сессий
+# ========================================
+def sessionize(user_codes, time_ns, gap_minutes=SESSION_GAP_MINUTES):
+    """Порядок кликов по (пользователь, время) и позиции начала сессий в этом порядке
+
+    Новая сессия начинается на первом клике пользователя и после перерыва больше gap_minutes.
+    """
+    user_codes = np.asarray(user_codes, dtype='int64')
+    time_ns = np.asarray(time_ns, dtype='int64')
+    order = np.lexsort((time_ns, user_codes))
+    if not len(order):
+        return order, np.zeros(0, dtype='int64')
+    users, times = user_codes[order], time_ns[order]
+
+    new_session = np.r_[True, (users[1:] != users[:-1]) | (np.diff(times) > gap_minutes * NS_PER_MINUTE)]
+    return order, np.flatnonzero(new_session)
+
+
+def session_summary(uids, time_ns, campaign_ids, regions, gap_minutes=SESSION_GAP_MINUTES):
+    """Одна строка на сессию: uid, регион первого клика, начало и конец, длительность,
+    число кликов и уникальных кампаний"""
+    user_codes, _ = pd.factorize(uids)
+    order, starts = sessionize(user_codes, time_ns, gap_minutes)
+    times = np.asarray(time_ns, dtype='int64')[order]
+
+    # Клики сессии идут подряд: номер сессии повторяется по числу ее кликов
+    ends = np.r_[starts[1:], len(order)] if len(starts) else starts
+    session_codes = np.repeat(np.arange(len(starts)), ends - starts)
+
+    return pd.DataFrame({
+        'uid': np.asarray(uids)[order[starts]],
+        'region': np.asarray(regions)[order[starts]],
+        'session_start': times[starts].view('datetime64[ns]'),
+        'session_end': times[ends - 1].view('datetime64[ns]'),
+        'duration_sec': (times[ends - 1] - times[starts]) // 10 ** 9,
+        'clicks': ends - starts,
+        'campaigns': distinct_by_key(session_codes, np.asarray(campaign_ids)[order], len(starts))
+    })
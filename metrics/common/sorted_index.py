@@ -0,0 +1,73 @@
+# metrics/common/sorted_index.py
+import numpy as np
+import pandas as pd
+
+# ========================================
+# Конфигурация
+# ========================================
+# Строк в группе parquet: поиск по ключу читает только группы, где лежат его строки
+INDEX_ROW_GROUP_SIZE = 4096
+
+
+# ========================================
+# Запись таблицы, отсортированной по ключу, и ее индекса
+# ========================================
+def build_sorted_index(keys, row_group_size=INDEX_ROW_GROUP_SIZE):
+    """Индекс отсортированной колонки ключа: уникальные ключи и диапазон строк [start, end) каждого"""
+    keys = np.asarray(keys, dtype='int64')
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.zeros(0, dtype='int64')
+    return {
+        'keys': keys[starts],
+        'starts': starts.astype('int64'),
+        'ends': np.r_[starts[1:], len(keys)].astype('int64'),
+        'row_group_size': np.int64(row_group_size)
+    }
+
+
+def write_sorted_table(table, key, path, index_path, row_group_size=INDEX_ROW_GROUP_SIZE):
+    """Сохраняет таблицу, отсортированную по целочисленному ключу, и индекс ключей в .npz
+
+    Возвращает индекс (тот же словарь массивов, что записан в index_path).
+    """
+    table = table.sort_values(key, kind='stable', ignore_index=True)
+    table.to_parquet(path, engine='pyarrow', index=False, row_group_size=row_group_size)
+
+    index = build_sorted_index(table[key].to_numpy(), row_group_size)
+    np.savez_compressed(index_path, **index)
+    return index
+
+
+def load_sorted_index(index_path):
+    with np.load(index_path) as stored:
+        return {name: stored[name] for name in stored.files}
+
+
+# ========================================
+# Поиск строк ключа без чтения всей таблицы
+# ========================================
+def key_rows(index, key):
+    """Диапазон строк [start, end) ключа двоичным поиском; None, если ключа нет"""
+    keys = index['keys']
+    pos = np.searchsorted(keys, key)
+    if pos == len(keys) or keys[pos] != key:
+        return None
+    return int(index['starts'][pos]), int(index['ends'][pos])
+
+
+def lookup_rows(index, path, key):
+    """Строки таблицы для ключа: читаются только группы строк, в которые попадает его диапазон"""
+    rows = key_rows(index, key)
+    if rows is None:
+        return None
+    start, end = rows
+
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        return pd.read_parquet(path).iloc[start:end].reset_index(drop=True)
+
+    size = int(index['row_group_size'])
+    first_group, last_group = start // size, (end - 1) // size
+    part = pq.ParquetFile(path).read_row_groups(list(range(first_group, last_group + 1))).to_pandas()
+    offset = first_group * size
+    return part.iloc[start - offset:end - offset].reset_index(drop=True)
@@ -0,0 +1,117 @@
+# metrics/common/time_buckets.py
+import numpy as np
+
+from metrics.common.timezones import NS_PER_DAY, NS_PER_HOUR
+
+# ========================================
+# Конфигурация
+# ========================================
+# 1970-01-01 - четверг: сдвиг, чтобы недели начинались с понедельника
+EPOCH_WEEKDAY = 3
+
+BUCKET_UNITS = ('hour', 'day', 'week', 'month', 'quarter')
+
+NS_PER_MINUTE = 60 * 10 ** 9
+
+
+# ========================================
+# Номера интервалов от начала эпохи (int64), без datetime-объектов по строкам
+# ========================================
+def time_bucket(time_ns, unit):
+    """Номер часа, дня, недели (с понедельника), месяца или квартала, в который попадает время (int64 нс)"""
+    time_ns = np.asarray(time_ns, dtype='int64')
+    if unit == 'hour':
+        return time_ns // NS_PER_HOUR
+    if unit == 'day':
+        return time_ns // NS_PER_DAY
+    if unit == 'week':
+        return (time_ns // NS_PER_DAY + EPOCH_WEEKDAY) // 7
+    if unit == 'month':
+        return time_ns.view('datetime64[ns]').astype('datetime64[M]').view('int64')
+    if unit == 'quarter':
+        return time_ns.view('datetime64[ns]').astype('datetime64[M]').view('int64') // 3
+    raise ValueError(f"Неизвестный интервал: {unit} (допустимы {', '.join(BUCKET_UNITS)})")
+
+
+def bucket_start(codes, unit):
+    """Начало интервала по его номеру (datetime64[ns]) - для подписей итоговых строк"""
+    codes = np.asarray(codes, dtype='int64')
+    if unit == 'hour':
+        return (codes * NS_PER_HOUR).view('datetime64[ns]')
+    if unit == 'day':
+        return (codes * NS_PER_DAY).view('datetime64[ns]')
+    if unit == 'week':
+        return ((codes * 7 - EPOCH_WEEKDAY) * NS_PER_DAY).view('datetime64[ns]')
+    if unit == 'month':
+        return codes.view('datetime64[M]').astype('datetime64[ns]')
+    if unit == 'quarter':
+        return (codes * 3).view('datetime64[M]').astype('datetime64[ns]')
+    raise ValueError(f"Неизвестный интервал: {unit} (допустимы {', '.join(BUCKET_UNITS)})")
+
+
+# ========================================
+# Календарные поля по номеру дня или месяца (малые целые коды)
+# ========================================
+def weekday(days):
+    """День недели по номеру дня: 0 - понедельник, 6 - воскресенье"""
+    return ((np.asarray(days, dtype='int64') + EPOCH_WEEKDAY) % 7).astype('int8')
+
+
+def iso_year_week(days):
+    """Год и номер недели ISO 8601 (1..53): неделя относится к году, на который приходится ее четверг"""
+    days = np.asarray(days, dtype='int64')
+    thursday = days - weekday(days) + 3
+    years = thursday.view('datetime64[D]').astype('datetime64[Y]')
+    year_start = years.astype('datetime64[D]').view('int64')
+    return (years.view('int64') + 1970).astype('int16'), ((thursday - year_start) // 7 + 1).astype('int8')
+
+
+def iso_week(days):
+    """Номер недели ISO 8601 (1..53)"""
+    return iso_year_week(days)[1]
+
+
+def iso_week_start(years):
+    """Номер дня понедельника первой недели ISO года (неделя, в которую входит 4 января)"""
+    january_4 = (np.asarray(years, dtype='int64') - 1970).view('datetime64[Y]').astype('datetime64[D]').view('int64') + 3
+    return january_4 - weekday(january_4)
+
+
+def year_and_month(months):
+    """Год и номер месяца (1..12) по номеру месяца от 1970-01"""
+    months = np.asarray(months, dtype='int64')
+    return (months // 12 + 1970).astype('int32'), (months % 12 + 1).astype('int8')
+
+
+def minute_of_day(time_ns):
+    """Минута суток 0..1439 (int64 нс)"""
+    return (np.asarray(time_ns, dtype='int64') % NS_PER_DAY) // NS_PER_MINUTE
+
+
+# ========================================
+# Подписи итоговых строк
+# ========================================
+def day_labels(days):
+    """Даты (datetime.date) для номеров дней"""
+    return np.asarray(days, dtype='int64').view('datetime64[D]').astype(object)
+
+
+def month_labels(months):
+    """Подписи месяцев вида 2024-05"""
+    return np.datetime_as_string(np.asarray(months, dtype='int64').view('datetime64[M]'), unit='M').astype(object)
+
+
+def bucket_labels(codes, unit):
+    """Подписи интервалов: время начала часа, дата дня или понедельника недели, 2024-05, 2024Q2"""
+    codes = np.asarray(codes, dtype='int64')
+    if unit == 'hour':
+        return bucket_start(codes, unit)
+    if unit == 'day':
+        return day_labels(codes)
+    if unit == 'week':
+        return day_labels(codes * 7 - EPOCH_WEEKDAY)
+    if unit == 'month':
+        return month_labels(codes)
+    if unit == 'quarter':
+        return np.array([f"{1970 + code // 4}Q{code % 4 + 1}" for code in codes], dtype=object)
+    raise ValueError(f"Неизвестный интервал: {unit} (допустимы {', '.join(BUCKET_UNITS)})")
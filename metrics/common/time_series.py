@@ -0,0 +1,92 @@
+# metrics/common/time_series.py
+import numpy as np
+import pandas as pd
+
+# ========================================
+# Конфигурация
+# ========================================
+# Окна скользящих сумм (дни)
+ROLLING_WINDOWS = (7, 28)
+
+# Окно базовой линии для z-оценки аномалий (предыдущие дни, без текущего)
+ZSCORE_WINDOW = 28
+
+# |z| от этого значения считается аномалией
+ANOMALY_Z = 3.0
+
+
+# ========================================
+# Непрерывный дневной ряд
+# ========================================
+def dense_daily(days, values, first_day=None, last_day=None):
+    """Ряд по всем дням от first_day до last_day: пропущенные дни заполняются нулями
+
+    days - номера дней от начала эпохи (int64), могут идти в любом порядке.
+    """
+    days = np.asarray(days, dtype='int64')
+    first_day = days.min() if first_day is None else first_day
+    last_day = days.max() if last_day is None else last_day
+
+    dense = np.zeros(last_day - first_day + 1, dtype='float64')
+    np.add.at(dense, days - first_day, np.asarray(values, dtype='float64'))
+    return np.arange(first_day, last_day + 1), dense
+
+
+# ========================================
+# Скользящие окна за один проход (через накопленные суммы)
+# ========================================
+def _window_sums(values, window):
+    """Суммы последних window значений, включая текущее; неполные окна - NaN"""
+    cumulative = np.concatenate([[0.0], np.cumsum(values)])
+    sums = np.full(len(values), np.nan)
+    if len(values) >= window:
+        sums[window - 1:] = cumulative[window:] - cumulative[:-window]
+    return sums
+
+
+def rolling_sum(values, window):
+    return _window_sums(np.asarray(values, dtype='float64'), window)
+
+
+def growth_pct(values, lag):
+    """Рост к значению lag дней назад (%); NaN, если базы нет или она нулевая"""
+    values = np.asarray(values, dtype='float64')
+    growth = np.full(len(values), np.nan)
+    if len(values) > lag:
+        base = values[:-lag]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth[lag:] = np.where(base > 0, (values[lag:] / base - 1) * 100, np.nan)
+    return growth
+
+
+def rolling_zscore(values, window=ZSCORE_WINDOW):
+    """Отклонение дня от среднего предыдущих window дней в стандартных отклонениях"""
+    values = np.asarray(values, dtype='float64')
+    sums = _window_sums(values, window)
+    squares = _window_sums(values ** 2, window)
+
+    # Базовая линия - окно, закончившееся накануне
+    mean = np.r_[np.nan, sums[:-1]] / window
+    variance = np.r_[np.nan, squares[:-1]] / window - mean ** 2
+    std = np.sqrt(np.maximum(variance * window / (window - 1), 0))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(std > 0, (values - mean) / std, np.nan)
+
+
+def daily_metrics(values, name, windows=ROLLING_WINDOWS, zscore_window=ZSCORE_WINDOW):
+    """Колонки метрик непрерывного дневного ряда: скользящие суммы, рост неделя к неделе,
+    накопленный итог и z-оценка аномалий"""
+    values = np.asarray(values, dtype='float64')
+    metrics = {name: values.astype('int64')}
+    for window in windows:
+        metrics[f'{name}_{window}d'] = rolling_sum(values, window)
+
+    # Рост неделя к неделе - по 7-дневным суммам, чтобы не зависеть от дня недели
+    metrics[f'{name}_wow_pct'] = growth_pct(rolling_sum(values, 7), 7)
+    metrics[f'{name}_cumulative'] = np.cumsum(values).astype('int64')
+
+    zscore = rolling_zscore(values, zscore_window)
+    metrics[f'{name}_zscore'] = zscore
+    metrics[f'{name}_anomaly'] = np.abs(np.nan_to_num(zscore)) >= ANOMALY_Z
+    return pd.DataFrame(metrics)
@@ -0,0 +1,67 @@
+# metrics/common/timezones.py
+import numpy as np
+
+# ========================================
+# Конфигурация
+# ========================================
+# Смещение от UTC (часы) по коду региона. Переход на летнее время в РФ отменен в 2014 году,
+# поэтому смещение постоянно. Для регионов с несколькими поясами - пояс административного центра.
+REGION_UTC_OFFSETS = {
+    1: 3, 2: 5, 3: 8, 4: 7, 5: 3, 6: 3, 7: 3, 8: 3, 9: 3, 10: 3,
+    11: 3, 12: 3, 13: 3, 14: 9, 15: 3, 16: 3, 17: 7, 18: 4, 19: 7, 20: 3,
+    21: 3, 22: 7, 23: 3, 24: 7, 25: 10, 26: 3, 27: 10, 28: 9, 29: 3, 30: 4,
+    31: 3, 32: 3, 33: 3, 34: 3, 35: 3, 36: 3, 37: 3, 38: 8, 39: 2, 40: 3,
+    41: 12, 42: 7, 43: 3, 44: 3, 45: 5, 46: 3, 47: 3, 48: 3, 49: 11, 50: 3,
+    51: 3, 52: 3, 53: 3, 54: 7, 55: 6, 56: 5, 57: 3, 58: 3, 59: 5, 60: 3,
+    61: 3, 62: 3, 63: 4, 64: 4, 65: 11, 66: 5, 67: 3, 68: 3, 69: 3, 70: 7,
+    71: 3, 72: 5, 73: 4, 74: 5, 75: 9, 76: 3, 77: 3, 78: 3, 79: 10, 82: 3,
+    83: 3, 86: 5, 87: 12, 89: 5, 92: 3, 101: 9
+}
+
+# Неопознанный (0) и неизвестные регионы считаем по московскому времени
+DEFAULT_UTC_OFFSET = 3
+MOSCOW_UTC_OFFSET = 3
+
+NS_PER_HOUR = 3600 * 10 ** 9
+NS_PER_DAY = 24 * NS_PER_HOUR
+HOURS_PER_WEEK = 7 * 24
+
+
+# ========================================
+# Смещения и местное время
+# ========================================
+def utc_offset_lookup(offsets=REGION_UTC_OFFSETS, default=DEFAULT_UTC_OFFSET):
+    """Массив смещений, индекс которого - код региона (int8, 256 значений)"""
+    lookup = np.full(256, default, dtype='int8')
+    for region, offset in offsets.items():
+        lookup[region] = offset
+    return lookup
+
+
+def region_utc_offsets(regions, lookup=None):
+    """Смещение от UTC (часы) для каждого кода региона; коды вне таблицы - смещение по умолчанию"""
+    lookup = utc_offset_lookup() if lookup is None else lookup
+    regions = np.asarray(regions, dtype='int64')
+    known = (regions >= 0) & (regions < len(lookup))
+    return np.where(known, lookup[np.clip(regions, 0, len(lookup) - 1)], DEFAULT_UTC_OFFSET).astype('int8')
+
+
+def local_time_ns(click_ns, regions, lookup=None):
+    """Местное время (int64 нс) - UTC плюс смещение региона, без преобразования часовых поясов по строкам"""
+    return click_ns + region_utc_offsets(regions, lookup).astype('int64') * NS_PER_HOUR
+
+
+def hour_of_day(time_ns):
+    return (time_ns // NS_PER_HOUR) % 24
+
+
+def hour_of_week(time_ns):
+    """Час недели 0..167, начиная с понедельника 00:00 (1970-01-01 - четверг)"""
+    weekday = (time_ns // NS_PER_DAY + 3) % 7
+    return weekday * 24 + hour_of_day(time_ns)
+
+
+def timezone_label(offset):
+    """Подпись пояса: UTC+7 (МСК+4)"""
+    msk = offset - MOSCOW_UTC_OFFSET
+    return f"UTC{offset:+d} (МСК{msk:+d})" if msk else f"UTC{offset:+d} (МСК)"
@@ -0,0 +1,59 @@
+# metrics/common/user_partitions.py
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from metrics.common.distinct import hash_values
+
+# ========================================
+# Конфигурация
+# ========================================
+# Число партиций по хэшу uid по умолчанию
+USER_PARTITIONS = 16
+
+
+# ========================================
+# Партиционирование по пользователю
+# ========================================
+def user_partition(uids, n_partitions=USER_PARTITIONS):
+    """Номер партиции по хэшу uid: все клики пользователя попадают в одну партицию"""
+    return (hash_values(uids) % np.uint64(n_partitions)).astype('int32')
+
+
+def spill_user_partitions(batches, spill_dir, n_partitions=USER_PARTITIONS):
+    """Раскладывает пакеты по партициям хэша uid в файлы spill_dir (внешняя сортировка)
+
+    Пакеты без uid отбрасываются. Возвращает список файлов каждой партиции.
+    """
+    parts = [[] for _ in range(n_partitions)]
+
+    for batch_number, batch in enumerate(batches):
+        batch = batch[batch['uid'].notna()]
+        partitions = user_partition(batch['uid'].to_numpy(), n_partitions)
+
+        # Один проход сортировки вместо n_partitions фильтров пакета
+        order = np.argsort(partitions, kind='stable')
+        bounds = np.searchsorted(partitions[order], np.arange(n_partitions + 1))
+        for partition in range(n_partitions):
+            rows = order[bounds[partition]:bounds[partition + 1]]
+            if not len(rows):
+                continue
+            path = Path(spill_dir) / f'part_{partition:03d}_{batch_number:05d}.parquet'
+            batch.iloc[rows].to_parquet(path, engine='pyarrow', index=False)
+            parts[partition].append(path)
+
+    return parts
+
+
+def iter_user_partitions(batches, n_partitions=USER_PARTITIONS):
+    """DataFrame на каждую непустую партицию хэша uid
+
+    Все клики пользователя оказываются в одной партиции, поэтому пользователей можно
+    обрабатывать по партициям независимо: в памяти одновременно только одна из них.
+    """
+    with tempfile.TemporaryDirectory(prefix='user_partitions_') as spill_dir:
+        for files in spill_user_partitions(batches, spill_dir, n_partitions):
+            if files:
+                yield pd.concat([pd.read_parquet(path) for path in files], ignore_index=True)
@@ -0,0 +1,265 @@
+import pandas as pd
+import numpy as np
+import sys
+from time import time
+import matplotlib.pyplot as plt
+import seaborn as sns
+from tabulate import tabulate
+from pathlib import Path
+import argparse
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from metrics.common.aggregations import count_by_key
+from metrics.common.categories import as_categorical, global_codes, new_dictionary, sorted_dictionary
+from metrics.common.distinct import build_hll, hll_estimate, hll_union, merge_hll
+from metrics.common.parquet_stream import iter_parquet_batches, parquet_num_rows
+from metrics.common.timezones import hour_of_day, local_time_ns
+
+# Настройка стиля графиков
+plt.style.use('seaborn-v0_8')
+sns.set_palette("husl")
+
+# ========================================
+# Конфигурация
+# ========================================
+PROJECT_ROOT = Path(__file__).parent.parent.parent  # Поднимаемся на уровень выше metrics/
+(PROJECT_ROOT / 'processed_data').mkdir(parents=True, exist_ok=True)
+CLICKS_FILE = PROJECT_ROOT / 'processed_data' / 'clicks_processed.parquet'
+PLOTS_DIR = PROJECT_ROOT / 'plots'
+OUTPUT_FILE = PROJECT_ROOT / 'processed_data' / 'device_activity'
+
+# Срезы устройства клика (колонки category в clicks_processed)
+DIMENSIONS = ('OS', 'device', 'browser')
+
+# Из кликов читаются только эти колонки, пакетами
+CLICK_COLUMNS = ['uid', 'region', 'click_time', *DIMENSIONS]
+
+# Ячейка куба упаковывается в один int64: код каждого среза (+1, 0 - пропуск) занимает
+# CODE_BITS бит, последним идет местный час клика
+CODE_BITS = 15
+HOURS = 24
+
+
+# ========================================
+# Загрузка данных
+# ========================================
+def load_data(click_files=(CLICKS_FILE,)):
+    print("Загрузка данных для анализа устройств...")
+
+    try:
+        # Клики не загружаются целиком: пакеты читаются партиция за партицией
+        clicks = (batch for path in click_files for batch in iter_parquet_batches(path, CLICK_COLUMNS))
+        print(f"Кликов: {sum(parquet_num_rows(path) for path in click_files):,}")
+        return clicks
+
+    except Exception as e:
+        print(f"Ошибка загрузки данных: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+# ========================================
+# Упаковка ячеек OS x устройство x браузер x час
+# ========================================
+def pack_cells(codes, hours):
+    """Ключ ячейки по кодам срезов (в порядке DIMENSIONS) и часу"""
+    key = np.zeros(len(hours), dtype='int64')
+    for dimension_codes in codes:
+        key = (key << CODE_BITS) | (np.asarray(dimension_codes, dtype='int64') + 1)
+    return key * HOURS + hours
+
+
+def unpack_cells(keys):
+    """Коды срезов (-1 - пропуск) и час по ключам ячеек"""
+    keys = np.asarray(keys, dtype='int64')
+    hours = (keys % HOURS).astype('int8')
+    keys = keys // HOURS
+
+    codes = []
+    for _ in DIMENSIONS:
+        codes.append((keys & ((1 << CODE_BITS) - 1)).astype('int32') - 1)
+        keys = keys >> CODE_BITS
+    return codes[::-1], hours
+
+
+# ========================================
+# Клики и уникальные пользователи по ячейкам
+# ========================================
+def analyze_devices(clicks):
+    """Один проход по пакетам, все группировки - по целочисленным кодам категорий
+
+    Коды пакета переводятся в общий словарь каждого среза; счетчики ячеек и скетч
+    HyperLogLog уникальных пользователей пакета сразу сворачиваются в общее состояние,
+    поэтому память растет с числом ячеек, а не кликов.
+    Возвращает куб ячеек и итоги по каждому срезу.
+    """
+    print("\nРасчет активности по OS, устройствам, браузерам и часам...")
+    start_time = time()
+
+    dictionaries = {dimension: new_dictionary() for dimension in DIMENSIONS}
+    cells = pd.Series(dtype='int64', name='clicks')
+    sketch = merge_hll([])
+    for batch in clicks:
+        click_time = batch['click_time'].to_numpy('datetime64[ns]')
+        valid = ~np.isnat(click_time)
+        batch = batch[valid]
+        hours = hour_of_day(local_time_ns(click_time[valid].view('int64'), batch['region'].to_numpy()))
+
+        codes = []
+        for dimension in DIMENSIONS:
+            dimension_codes, dictionaries[dimension] = global_codes(batch[dimension], dictionaries[dimension])
+            codes.append(dimension_codes)
+            if len(dictionaries[dimension]) >= (1 << CODE_BITS) - 1:
+                raise ValueError(f"Слишком много значений {dimension}: {len(dictionaries[dimension]):,}")
+
+        keys = pack_cells(codes, hours)
+        batch_cells, cell_counts = np.unique(keys, return_counts=True)
+        cells = cells.add(pd.Series(cell_counts, index=batch_cells), fill_value=0).astype('int64')
+
+        has_uid = batch['uid'].notna().to_numpy()
+        sketch = merge_hll([sketch, build_hll(keys[has_uid], batch['uid'].to_numpy()[has_uid])])
+
+    unique_users = hll_estimate(sketch).reindex(cells.index, fill_value=0)
+
+    # Куб: словари отсортированы, категории сохраняются в parquet вместе с колонкой
+    codes, hours = unpack_cells(cells.index.to_numpy())
+    cube = pd.DataFrame()
+    for dimension, dimension_codes in zip(DIMENSIONS, codes):
+        dimension_codes, dictionary = sorted_dictionary(dimension_codes, dictionaries[dimension])
+        cube[dimension] = as_categorical(dimension_codes, dictionary)
+    cube['hour'] = hours
+    cube['clicks'] = cells.to_numpy()
+    cube['unique_users'] = unique_users.to_numpy().astype('int64')
+
+    summary = summarize_dimensions(cube, cells.index.to_numpy(), sketch)
+
+    print(f"Расчет завершен за {time() - start_time:.1f} сек")
+    print(f"Ячеек: {len(cube):,}; " + ", ".join(f"{dimension}: {len(cube[dimension].cat.categories)}"
+                                                 for dimension in DIMENSIONS))
+    return cube, summary
+
+
+def summarize_dimensions(cube, keys, sketch):
+    """Клики и уникальные пользователи по каждому значению каждого среза
+
+    Клики - сумма по кодам ячеек, пользователи - объединение скетчей ячеек значения
+    (сумма уникальных по ячейкам посчитала бы пользователя несколько раз).
+    """
+    parts = []
+    for dimension in DIMENSIONS:
+        column = cube[dimension]
+        categories = column.cat.categories
+        codes = column.cat.codes.to_numpy()
+        present = codes >= 0
+        clicks = count_by_key(codes[present], len(categories), cube['clicks'].to_numpy()[present]).astype('int64')
+
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(categories) + 1))
+        users = [hll_union(sketch, keys[order[bounds[code]:bounds[code + 1]]]) for code in range(len(categories))]
+
+        parts.append(pd.DataFrame({
+            'dimension': dimension,
+            'value': np.asarray(categories, dtype=object),
+            'clicks': clicks,
+            'unique_users': np.asarray(users, dtype='int64')
+        }))
+
+    summary = pd.concat(parts, ignore_index=True)
+    summary['dimension'] = pd.Categorical(summary['dimension'], categories=list(DIMENSIONS))
+    summary['share'] = summary['clicks'] / summary.groupby('dimension', observed=True)['clicks'].transform('sum') * 100
+    return summary
+
+
+# ========================================
+# Визуализация данных
+# ========================================
+def visualize_devices(cube, summary):
+    import os
+    if not os.path.exists(PLOTS_DIR):
+        os.makedirs(PLOTS_DIR)
+
+    print("\nСоздание визуализаций...")
+
+    fig, axes = plt.subplots(1, len(DIMENSIONS), figsize=(18, 6))
+    for ax, dimension in zip(axes, DIMENSIONS):
+        part = summary[summary['dimension'] == dimension].nlargest(10, 'clicks')
+        ax.barh(part['value'].astype(str), part['clicks'], color='skyblue')
+        ax.invert_yaxis()
+        ax.set_title(f'Клики по {dimension}')
+        ax.set_xlabel('Кликов')
+    fig.tight_layout()
+    fig.savefig(f'{PLOTS_DIR}/device_breakdown.png')
+    plt.close(fig)
+
+    # Устройство x местный час: доля кликов устройства по часам
+    codes = cube['device'].cat.codes.to_numpy()
+    devices = cube['device'].cat.categories
+    present = codes >= 0
+    matrix = count_by_key(codes[present].astype('int64') * HOURS + cube['hour'].to_numpy()[present],
+                          len(devices) * HOURS, cube['clicks'].to_numpy()[present]).reshape(len(devices), HOURS)
+    shares = matrix / np.maximum(matrix.sum(axis=1, keepdims=True), 1) * 100
+
+    fig, ax = plt.subplots(figsize=(16, max(4, len(devices) * 0.6)))
+    sns.heatmap(pd.DataFrame(shares, index=devices, columns=range(HOURS)), cmap='YlGnBu', ax=ax)
+    ax.set_title('Доля кликов устройства по местным часам, %')
+    ax.set_xlabel('Час (местное время)')
+    ax.set_ylabel('Устройство')
+    fig.tight_layout()
+    fig.savefig(f'{PLOTS_DIR}/device_by_hour.png')
+    plt.close(fig)
+
+    print(f"Графики сохранены в папку {PLOTS_DIR}")
+
+
+# ========================================
+# Сохранение результатов
+# ========================================
+def save_results(cube, summary):
+    print("\nСохранение результатов...")
+
+    try:
+        cube.to_parquet(f"{OUTPUT_FILE}.parquet", engine='pyarrow')
+        summary.to_parquet(f"{OUTPUT_FILE}_summary.parquet", engine='pyarrow')
+        print(f"Результаты сохранены в {OUTPUT_FILE}.parquet и {OUTPUT_FILE}_summary.parquet")
+    except Exception as e:
+        print(f"Ошибка при сохранении: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+# ========================================
+# Вывод красивых таблиц
+# ========================================
+def print_tables(summary):
+    # Значения словаря без кликов (например, отфильтрованные боты) не показываются
+    summary = summary[summary['clicks'] > 0]
+    for dimension in DIMENSIONS:
+        part = summary[summary['dimension'] == dimension].nlargest(10, 'clicks')
+        part = part[['value', 'clicks', 'unique_users', 'share']].round(2).astype(object)
+        print(f"\nКлики и уникальные пользователи по {dimension}:")
+        print(tabulate(part, headers='keys', tablefmt='pretty', showindex=False))
+
+
+# ========================================
+# Главная функция
+# ========================================
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Клики и уникальные пользователи по OS, устройствам, браузерам и часам')
+    parser.add_argument('--clicks', nargs='+', type=Path, default=[CLICKS_FILE],
+                        help='Файлы кликов (партиции), обрабатываются по очереди')
+    args = parser.parse_args()
+
+    # Загрузка данных
+    clicks = load_data(args.clicks)
+
+    # Расчет по кодам категорий
+    cube, summary = analyze_devices(clicks)
+
+    # Визуализация данных
+    visualize_devices(cube, summary)
+
+    # Вывод таблиц
+    print_tables(summary)
+
+    # Сохранение результатов
+    save_results(cube, summary)
+
+    print("\nГотово! Анализ устройств завершен.")
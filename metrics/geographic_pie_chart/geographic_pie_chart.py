@@ -2,6 +2,10 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from metrics.common.aggregations import aggregate_by_key
 
 # Настройки
 plt.style.use('seaborn-v0_8')
@@ -112,9 +116,7 @@ def load_and_prepare_pie_data(top_n=5):
     clicks = pd.read_parquet(CLICKS_FILE)
 
     # Группируем по регионам и считаем уникальных клиентов
-    region_stats = clicks.groupby('region').agg(
-        clients_count=('uid', 'nunique')
-    ).reset_index()
+    region_stats = aggregate_by_key(clicks['region'], clicks['uid'], key_name='region', distinct_name='clients_count')
 
     # Добавляем названия регионов
     region_stats['region_name'] = region_stats['region'].map(REGION_NAMES)
@@ -6,6 +6,10 @@ import numpy as np
 from pathlib import Path
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from metrics.common.aggregations import aggregate_by_key
 
 # Настройки
 plt.style.use('seaborn-v0_8')
@@ -119,9 +123,7 @@ def load_and_prepare_data():
     print("Доступные столбцы в clicks:", clicks.columns.tolist())
 
     # Группируем по регионам (используем столбец 'region' вместо 'region_id')
-    region_stats = clicks.groupby('region').agg(
-        clients_count=('uid', 'nunique')
-    ).reset_index()
+    region_stats = aggregate_by_key(clicks['region'], clicks['uid'], key_name='region', distinct_name='clients_count')
 
     # Добавляем координаты
     region_stats['latitude'] = region_stats['region'].map(lambda x: REGION_COORDINATES.get(x, (None, None))[0])
@@ -0,0 +1,224 @@
+import pandas as pd
+import numpy as np
+import sys
+from time import time
+import matplotlib.pyplot as plt
+import seaborn as sns
+from tabulate import tabulate
+from pathlib import Path
+import argparse
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from metrics.common.categories import global_codes, new_dictionary
+from metrics.common.histograms import count_matrix
+from metrics.common.languages import normalize_languages
+from metrics.common.parquet_stream import iter_parquet_batches, parquet_num_rows
+from metrics.common.send_time import best_windows
+from metrics.common.timezones import HOURS_PER_WEEK, hour_of_week, local_time_ns
+
+# Настройка стиля графиков
+plt.style.use('seaborn-v0_8')
+sns.set_palette("husl")
+
+# ========================================
+# Конфигурация
+# ========================================
+PROJECT_ROOT = Path(__file__).parent.parent.parent  # Поднимаемся на уровень выше metrics/
+(PROJECT_ROOT / 'processed_data').mkdir(parents=True, exist_ok=True)
+CLICKS_FILE = PROJECT_ROOT / 'processed_data' / 'clicks_processed.parquet'
+PLOTS_DIR = PROJECT_ROOT / 'plots'
+MATRIX_FILE = PROJECT_ROOT / 'processed_data' / 'language_activity.npz'
+OUTPUT_FILE = PROJECT_ROOT / 'processed_data' / 'language_send_windows.parquet'
+
+# Из кликов читаются только эти колонки, пакетами
+CLICK_COLUMNS = ['language', 'region', 'click_time']
+
+# Коды регионов - int8, матрица язык x регион хранит все 256 значений
+REGION_SLOTS = 256
+
+# Окна получения для планирования рассылок на каждом языке
+SEND_WINDOW_HOURS = 2
+SEND_WINDOWS_TOP = 3
+
+
+# ========================================
+# Загрузка данных
+# ========================================
+def load_data(click_files=(CLICKS_FILE,)):
+    print("Загрузка данных для анализа языковых сегментов...")
+
+    try:
+        # Клики не загружаются целиком: пакеты читаются партиция за партицией
+        clicks = (batch for path in click_files for batch in iter_parquet_batches(path, CLICK_COLUMNS))
+        print(f"Кликов: {sum(parquet_num_rows(path) for path in click_files):,}")
+        return clicks
+
+    except Exception as e:
+        print(f"Ошибка загрузки данных: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+# ========================================
+# Матрицы язык x час недели и язык x регион
+# ========================================
+def grow_rows(matrix, n_rows):
+    """Матрица с добавленными нулевыми строками для новых значений словаря"""
+    return np.pad(matrix, ((0, n_rows - len(matrix)), (0, 0))) if n_rows > len(matrix) else matrix
+
+
+def analyze_languages(clicks):
+    """Один проход по пакетам: клики по языку x местный час недели и языку x регион
+
+    Язык нормализуется и переводится в код общего словаря на уровне категорий пакета,
+    дальше считаются только целочисленные матрицы (count_matrix).
+    """
+    print("\nРасчет активности по языкам...")
+    start_time = time()
+
+    dictionary = new_dictionary()
+    language_how = np.zeros((0, HOURS_PER_WEEK), dtype='int64')
+    language_region = np.zeros((0, REGION_SLOTS), dtype='int64')
+
+    for batch in clicks:
+        click_time = batch['click_time'].to_numpy('datetime64[ns]')
+        valid = ~np.isnat(click_time)
+        batch = batch[valid]
+        regions = batch['region'].to_numpy()
+
+        # Уже нормализованные при загрузке языки не меняются; старые файлы (строки) нормализуются здесь
+        codes, dictionary = global_codes(normalize_languages(batch['language']), dictionary)
+        how = hour_of_week(local_time_ns(click_time[valid].view('int64'), regions))
+
+        language_how = grow_rows(language_how, len(dictionary))
+        language_region = grow_rows(language_region, len(dictionary))
+        language_how += count_matrix(codes, how, len(dictionary), HOURS_PER_WEEK)
+        language_region += count_matrix(codes, np.asarray(regions, dtype='int64'), len(dictionary), REGION_SLOTS)
+
+    # Строки по алфавиту языков, из регионов - только встречавшиеся
+    order = np.argsort(np.asarray(dictionary, dtype=str), kind='stable')
+    region_codes = np.flatnonzero(language_region.sum(axis=0))
+    matrix = {
+        'languages': np.asarray(dictionary[order], dtype=str),
+        'region_codes': region_codes.astype('int16'),
+        'language_how': language_how[order].astype('int32'),
+        'language_region': language_region[order][:, region_codes].astype('int32')
+    }
+
+    print(f"Расчет завершен за {time() - start_time:.1f} сек")
+    print(f"Языков: {len(matrix['languages'])} ({', '.join(matrix['languages'])}), "
+          f"регионов: {len(region_codes)}")
+    return matrix
+
+
+def language_send_windows(matrix, top_n=SEND_WINDOWS_TOP, window_hours=SEND_WINDOW_HOURS):
+    """Лучшие окна получения (местное время) для каждого языка"""
+    prior = matrix['language_how'].sum(axis=0)
+    windows = []
+    for language, counts in zip(matrix['languages'], matrix['language_how']):
+        if counts.sum():
+            windows.append(best_windows(counts, prior, top_n, window_hours).assign(language=language))
+
+    windows = pd.concat(windows, ignore_index=True)
+    windows['language'] = pd.Categorical(windows['language'], categories=matrix['languages'])
+    return windows[['language', *windows.columns[:-1]]]
+
+
+# ========================================
+# Визуализация данных
+# ========================================
+def visualize_languages(matrix):
+    import os
+    if not os.path.exists(PLOTS_DIR):
+        os.makedirs(PLOTS_DIR)
+
+    print("\nСоздание визуализаций...")
+
+    languages = matrix['languages']
+    hours = matrix['language_how'].reshape(len(languages), 7, 24).sum(axis=1)
+    shares = hours / np.maximum(hours.sum(axis=1, keepdims=True), 1) * 100
+
+    fig, axes = plt.subplots(1, 2, figsize=(18, max(5, len(languages) * 0.6)))
+    sns.heatmap(pd.DataFrame(shares, index=languages, columns=range(24)), cmap='YlGnBu', ax=axes[0])
+    axes[0].set_title('Доля кликов языка по местным часам, %')
+    axes[0].set_xlabel('Час (местное время)')
+    axes[0].set_ylabel('Язык')
+
+    region_share = matrix['language_region'] / np.maximum(matrix['language_region'].sum(axis=0, keepdims=True), 1) * 100
+    sns.heatmap(pd.DataFrame(region_share, index=languages, columns=matrix['region_codes']), cmap='YlOrRd', ax=axes[1])
+    axes[1].set_title('Доля языка в кликах региона, %')
+    axes[1].set_xlabel('Код региона')
+    axes[1].set_ylabel('')
+
+    fig.tight_layout()
+    fig.savefig(f'{PLOTS_DIR}/language_activity.png')
+    plt.close(fig)
+
+    print(f"Графики сохранены в папку {PLOTS_DIR}")
+
+
+# ========================================
+# Сохранение результатов
+# ========================================
+def save_results(matrix, windows):
+    print("\nСохранение результатов...")
+
+    try:
+        np.savez_compressed(MATRIX_FILE, **matrix)
+        windows.to_parquet(OUTPUT_FILE, engine='pyarrow')
+        print(f"Результаты сохранены в {MATRIX_FILE} и {OUTPUT_FILE}")
+    except Exception as e:
+        print(f"Ошибка при сохранении: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+# ========================================
+# Вывод красивых таблиц
+# ========================================
+def print_tables(matrix, windows):
+    clicks = matrix['language_how'].sum(axis=1)
+    summary = pd.DataFrame({
+        'language': matrix['languages'],
+        'clicks': clicks,
+        'share': (clicks / clicks.sum() * 100).round(2),
+        'regions': (matrix['language_region'] > 0).sum(axis=1)
+    }).sort_values('clicks', ascending=False)
+    print("\nКлики по языкам:")
+    print(tabulate(summary.astype(object), headers='keys', tablefmt='pretty', showindex=False))
+
+    rows = [[row.language, row.rank, f"{row.weekday_name} {row.start_hour:02d}:00-{row.end_hour:02d}:00",
+             f"{row.share:.2f}%", f"{row.lift:.2f}"]
+            for row in windows.itertuples()]
+    print("\nЛучшее время получения по языкам (местное время):")
+    print(tabulate(rows, headers=['Язык', '#', 'Окно', 'Доля (сглаж.)', 'Лифт'], tablefmt='pretty'))
+
+
+# ========================================
+# Главная функция
+# ========================================
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Активность языковых сегментов по часам и регионам')
+    parser.add_argument('--clicks', nargs='+', type=Path, default=[CLICKS_FILE],
+                        help='Файлы кликов (партиции), обрабатываются по очереди')
+    parser.add_argument('--window', type=int, default=SEND_WINDOW_HOURS,
+                        help='Длина окна получения (часы)')
+    parser.add_argument('--top', type=int, default=SEND_WINDOWS_TOP,
+                        help='Число окон на язык')
+    args = parser.parse_args()
+
+    # Загрузка данных
+    clicks = load_data(args.clicks)
+
+    # Расчет матриц
+    matrix = analyze_languages(clicks)
+    windows = language_send_windows(matrix, args.top, args.window)
+
+    # Визуализация данных
+    visualize_languages(matrix)
+
+    # Вывод таблиц
+    print_tables(matrix, windows)
+
+    # Сохранение результатов
+    save_results(matrix, windows)
+
+    print("\nГотово! Анализ языковых сегментов завершен.")
@@ -0,0 +1,238 @@
+import pandas as pd
+import numpy as np
+import sys
+from time import time
+from tabulate import tabulate
+from pathlib import Path
+import argparse
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from metrics.common.distinct import build_hll, hll_estimate, merge_hll
+from metrics.common.histograms import count_pairs
+from metrics.common.joins import NAT_INT64, apply_key_lookup, build_key_lookup
+from metrics.common.parquet_stream import iter_parquet_batches, parquet_num_rows
+from metrics.common.quantiles import build_sketch, merge_sketches, sketch_quantiles
+from metrics.common.sorted_index import load_sorted_index, lookup_rows, write_sorted_table
+
+# ========================================
+# Конфигурация
+# ========================================
+PROJECT_ROOT = Path(__file__).parent.parent.parent  # Поднимаемся на уровень выше metrics/
+(PROJECT_ROOT / 'processed_data').mkdir(parents=True, exist_ok=True)
+CLICKS_FILE = PROJECT_ROOT / 'processed_data' / 'clicks_processed.parquet'
+CAMPAIGN_FILE = PROJECT_ROOT / 'processed_data' / 'campaign_processed.parquet'
+
+# Итоги по клиентам (одна строка на member_id) и по парам клиент x кампания,
+# обе таблицы отсортированы по member_id, рядом - индексы ключей для поиска
+ROLLUPS_FILE = PROJECT_ROOT / 'processed_data' / 'member_rollups.parquet'
+ROLLUPS_INDEX_FILE = PROJECT_ROOT / 'processed_data' / 'member_rollups_index.npz'
+CAMPAIGNS_FILE = PROJECT_ROOT / 'processed_data' / 'member_campaigns.parquet'
+CAMPAIGNS_INDEX_FILE = PROJECT_ROOT / 'processed_data' / 'member_campaigns_index.npz'
+
+# Из кликов читаются только эти колонки, пакетами
+CLICK_COLUMNS = ['uid', 'member_id', 'campaign_id', 'click_time']
+
+# Процентили времени реакции помимо медианы
+PERCENTILES = {'p90': 0.9}
+
+
+# ========================================
+# Загрузка данных
+# ========================================
+def load_data(click_files=(CLICKS_FILE,)):
+    print("Загрузка данных для итогов по клиентам...")
+    start_time = time()
+
+    try:
+        # Клики не загружаются целиком: пакеты читаются партиция за партицией
+        clicks = (batch for path in click_files for batch in iter_parquet_batches(path, CLICK_COLUMNS))
+        campaigns = pd.read_parquet(CAMPAIGN_FILE, columns=['id', 'created_at'])
+
+        # Преобразуем created_at из Unix timestamp в наносекундах
+        campaigns['created_at'] = pd.to_datetime(campaigns['created_at'].astype('int64') // 10 ** 9, unit='s')
+
+        print(f"Данные загружены за {time() - start_time:.1f} сек")
+        print(f"Кликов: {sum(parquet_num_rows(path) for path in click_files):,}")
+        print(f"Кампаний: {len(campaigns):,}")
+
+        return clicks, campaigns
+
+    except Exception as e:
+        print(f"Ошибка загрузки данных: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+# ========================================
+# Итоги по клиентам
+# ========================================
+def fold_state(state, part, agg):
+    """Итоги пакета, свернутые в накопленное состояние по индексу (None - первый пакет)"""
+    if state is None:
+        return part
+    return pd.concat([state, part]).groupby(level=list(range(part.index.nlevels)), sort=True).agg(agg)
+
+
+def analyze_members(clicks, campaigns):
+    """Один проход по кликам: клики, уникальные пользователи, кампании и время реакции по member_id
+
+    Счетчики пар клиент x кампания, скетчи HyperLogLog и квантилей и агрегаты по клиентам
+    пакета сразу сворачиваются в накопленное состояние, поэтому память растет с числом
+    клиентов и пар, а не кликов. Возвращает итоги по клиентам и таблицу клиент x кампания.
+    """
+    print("\nРасчет итогов по клиентам...")
+    start_time = time()
+
+    created_at = build_key_lookup(campaigns['id'].to_numpy(),
+                                  campaigns['created_at'].to_numpy('datetime64[ns]').view('int64'),
+                                  fill=NAT_INT64)
+
+    pairs, moments = None, None
+    user_sketch, response_sketch = merge_hll([]), merge_sketches([])
+    for batch in clicks:
+        batch = batch[batch['member_id'].notna() & batch['campaign_id'].notna()]
+        members = batch['member_id'].to_numpy().astype('int64')
+        campaign_ids = batch['campaign_id'].to_numpy().astype('int64')
+        click_time = batch['click_time'].to_numpy('datetime64[ns]').view('int64')
+
+        groups, codes, counts = count_pairs(members, campaign_ids)
+        batch_pairs = pd.DataFrame({'clicks': counts},
+                                   index=pd.MultiIndex.from_arrays([groups, codes],
+                                                                   names=['member_id', 'campaign_id']))
+        pairs = fold_state(pairs, batch_pairs, {'clicks': 'sum'})
+
+        has_uid = batch['uid'].notna().to_numpy()
+        user_sketch = merge_hll([user_sketch, build_hll(members[has_uid], batch['uid'].to_numpy()[has_uid])])
+
+        # Время реакции - от создания кампании до клика; клики до создания не учитываются
+        created = apply_key_lookup(created_at, campaign_ids)
+        response_ns = click_time - created
+        valid = (created != NAT_INT64) & (click_time != NAT_INT64) & (response_ns >= 0)
+        response = pd.DataFrame({'member_id': members[valid], 'response_time': response_ns[valid] / 10 ** 9})
+        response_sketch = merge_sketches([response_sketch, build_sketch(response['member_id'], response['response_time'])])
+
+        timed = click_time != NAT_INT64
+        batch_moments = (pd.DataFrame({'member_id': members[timed], 'click_time': click_time[timed]})
+                         .groupby('member_id')['click_time'].agg(['min', 'max'])
+                         .join(response.groupby('member_id')['response_time'].agg(['size', 'sum']), how='outer'))
+        moments = fold_state(moments, batch_moments, {'min': 'min', 'max': 'max', 'size': 'sum', 'sum': 'sum'})
+
+    member_campaigns = pairs.reset_index()
+    member_campaigns['share'] = member_campaigns['clicks'] / member_campaigns.groupby('member_id')['clicks'].transform('sum') * 100
+
+    by_member = member_campaigns.groupby('member_id')
+    rollups = pd.DataFrame({
+        'clicks': by_member['clicks'].sum(),
+        'campaigns': by_member['campaign_id'].size()
+    })
+    unique_users = hll_estimate(user_sketch)
+    rollups['unique_users'] = unique_users.reindex(rollups.index, fill_value=0).astype('int64')
+    rollups['first_click'] = moments['min'].reindex(rollups.index).to_numpy().view('datetime64[ns]')
+    rollups['last_click'] = moments['max'].reindex(rollups.index).to_numpy().view('datetime64[ns]')
+    rollups['responded_clicks'] = moments['size'].reindex(rollups.index).fillna(0).astype('int64')
+    rollups['avg_response_seconds'] = moments['sum'].reindex(rollups.index) / rollups['responded_clicks'].replace(0, np.nan)
+
+    quantiles = sketch_quantiles(response_sketch, [0.5, *PERCENTILES.values()])
+    quantiles.index = quantiles.index.astype('int64')
+    quantiles = quantiles.reindex(rollups.index)
+    rollups['median_response_seconds'] = quantiles[0.5]
+    for name, q in PERCENTILES.items():
+        rollups[f'{name}_response_seconds'] = quantiles[q]
+
+    rollups = rollups.reset_index()
+
+    print(f"Расчет завершен за {time() - start_time:.1f} сек")
+    print(f"Клиентов: {len(rollups):,}, пар клиент x кампания: {len(member_campaigns):,}")
+    return rollups, member_campaigns
+
+
+# ========================================
+# Поиск по клиенту (только по сохраненным итогам и индексам)
+# ========================================
+def lookup_member(member_id, rollups_index=None, campaigns_index=None):
+    """Итоги клиента и его кампании: двоичный поиск по индексу и чтение только нужных групп строк
+
+    Возвращает (Series итогов, DataFrame кампаний) или None, если клиента нет.
+    """
+    rollups_index = load_sorted_index(ROLLUPS_INDEX_FILE) if rollups_index is None else rollups_index
+    campaigns_index = load_sorted_index(CAMPAIGNS_INDEX_FILE) if campaigns_index is None else campaigns_index
+
+    rollup = lookup_rows(rollups_index, ROLLUPS_FILE, member_id)
+    if rollup is None:
+        return None
+    return rollup.iloc[0], lookup_rows(campaigns_index, CAMPAIGNS_FILE, member_id)
+
+
+def print_member(member_id):
+    if not ROLLUPS_INDEX_FILE.exists() or not CAMPAIGNS_INDEX_FILE.exists():
+        print("Итоги по клиентам не найдены: сначала запустите расчет", file=sys.stderr)
+        sys.exit(1)
+
+    found = lookup_member(member_id)
+    if found is None:
+        print(f"Клиент {member_id} не найден", file=sys.stderr)
+        sys.exit(1)
+
+    rollup, member_campaigns = found
+    print(f"\nКлиент {member_id}:")
+    print(tabulate([[name, value] for name, value in rollup.items()], tablefmt='pretty'))
+    print("\nКампании клиента:")
+    print(tabulate(member_campaigns.sort_values('clicks', ascending=False).round(2).astype(object),
+                   headers='keys', tablefmt='pretty', showindex=False))
+
+
+# ========================================
+# Сохранение результатов
+# ========================================
+def save_results(rollups, member_campaigns):
+    print("\nСохранение результатов...")
+
+    try:
+        write_sorted_table(rollups, 'member_id', ROLLUPS_FILE, ROLLUPS_INDEX_FILE)
+        write_sorted_table(member_campaigns, 'member_id', CAMPAIGNS_FILE, CAMPAIGNS_INDEX_FILE)
+        print(f"Итоги по клиентам сохранены в {ROLLUPS_FILE} (индекс {ROLLUPS_INDEX_FILE})")
+        print(f"Кампании клиентов сохранены в {CAMPAIGNS_FILE} (индекс {CAMPAIGNS_INDEX_FILE})")
+    except Exception as e:
+        print(f"Ошибка при сохранении: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+# ========================================
+# Вывод красивых таблиц
+# ========================================
+def print_tables(rollups):
+    top = rollups.nlargest(10, 'clicks')[
+        ['member_id', 'clicks', 'unique_users', 'campaigns', 'median_response_seconds']
+    ].round(1).astype(object)
+    print("\nТоп-10 клиентов по числу кликов:")
+    print(tabulate(top, headers='keys', tablefmt='pretty', showindex=False))
+
+
+# ========================================
+# Главная функция
+# ========================================
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Итоги по клиентам (member_id) и поиск по клиенту')
+    parser.add_argument('--clicks', nargs='+', type=Path, default=[CLICKS_FILE],
+                        help='Файлы кликов (партиции), обрабатываются по очереди')
+    parser.add_argument('--member', type=int,
+                        help='Показать итоги клиента по сохраненным таблицам, клики не читаются')
+    args = parser.parse_args()
+
+    # Запрос по сохраненным итогам
+    if args.member is not None:
+        print_member(args.member)
+        sys.exit(0)
+
+    # Загрузка данных
+    clicks, campaigns = load_data(args.clicks)
+
+    # Расчет итогов
+    rollups, member_campaigns = analyze_members(clicks, campaigns)
+
+    # Вывод таблиц
+    print_tables(rollups)
+
+    # Сохранение результатов
+    save_results(rollups, member_campaigns)
+
+    print("\nГотово! Итоги по клиентам рассчитаны.")
@@ -1,4 +1,5 @@
 import pandas as pd
+import numpy as np
 from datetime import timedelta
 import sys
 from time import time
@@ -6,6 +7,13 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from tabulate import tabulate
 from pathlib import Path
+import argparse
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from metrics.common.histograms import grouped_histogram, log_bin_edges, merge_histograms, total_histogram
+from metrics.common.joins import NAT_INT64, apply_key_lookup, build_key_lookup
+from metrics.common.parquet_stream import iter_parquet_batches, parquet_num_rows
+from metrics.common.quantiles import build_sketch, merge_sketches, sketch_quantiles, sketch_totals
 
 # Настройка стиля графиков
 plt.style.use('seaborn-v0_8')
@@ -21,24 +29,45 @@ CAMPAIGN_FILE = PROJECT_ROOT / 'processed_data' / 'campaign_processed.parquet'
 PLOTS_DIR = PROJECT_ROOT / 'plots'
 OUTPUT_FILE = PROJECT_ROOT / 'processed_data' / 'response_time_analysis'
 
+# Скетч квантилей и агрегаты по кампаниям для объединения с последующими запусками
+SKETCH_FILE = f"{OUTPUT_FILE}_sketch.parquet"
+MOMENTS_FILE = f"{OUTPUT_FILE}_sketch_moments.parquet"
+
+# Компактные артефакты для дашборда: гистограммы и таблица процентилей
+HISTOGRAM_FILE = f"{OUTPUT_FILE}_histogram.parquet"
+CAMPAIGN_HISTOGRAM_FILE = f"{OUTPUT_FILE}_campaign_histogram.parquet"
+PERCENTILES_FILE = f"{OUTPUT_FILE}_percentiles.parquet"
+
+# Из кликов читаются только эти колонки, пакетами
+CLICK_COLUMNS = ['campaign_id', 'uid', 'click_time']
+
+# Процентили времени реакции помимо медианы
+PERCENTILES = {'p90': 0.9, 'p99': 0.99}
+
+# Процентили общей таблицы распределения
+PERCENTILE_TABLE = (50, 75, 90, 95, 99)
+
+# Логарифмические корзины гистограммы: [0, 1 сек), далее до 30 дней (10 корзин на порядок)
+HISTOGRAM_EDGES = log_bin_edges(30 * 24 * 3600)
+
 
 # ========================================
 # Загрузка данных
 # ========================================
-def load_data():
+def load_data(click_files=(CLICKS_FILE,)):
     print("Загрузка данных для анализа скорости реакции...")
     start_time = time()
 
     try:
-        # Загружаем обработанные данные
-        clicks = pd.read_parquet(CLICKS_FILE)
+        # Клики не загружаются целиком: calculate_response_time читает их пакетами, партиция за партицией
+        clicks = (batch for path in click_files for batch in iter_parquet_batches(path, CLICK_COLUMNS))
         campaigns = pd.read_parquet(CAMPAIGN_FILE)
 
         # Преобразуем created_at из Unix timestamp в наносекундах
         campaigns['created_at'] = pd.to_datetime(campaigns['created_at'].astype('int64') // 10 ** 9, unit='s')
 
         print(f"Данные загружены за {time() - start_time:.1f} сек")
-        print(f"Кликов: {len(clicks):,}")
+        print(f"Кликов: {sum(parquet_num_rows(path) for path in click_files):,}")
         print(f"Кампаний: {len(campaigns):,}")
 
         return clicks, campaigns
@@ -48,28 +77,54 @@ def load_data():
         sys.exit(1)
 
 
+def load_sketch_state():
+    """Скетч, агрегаты и гистограмма предыдущего запуска (для инкрементального режима)"""
+    if not all(Path(path).exists() for path in (SKETCH_FILE, MOMENTS_FILE, CAMPAIGN_HISTOGRAM_FILE)):
+        print("Скетч предыдущего запуска не найден, расчет начнется с нуля")
+        return None
+
+    histogram = pd.read_parquet(CAMPAIGN_HISTOGRAM_FILE)
+    return {
+        'sketch': pd.read_parquet(SKETCH_FILE),
+        'moments': pd.read_parquet(MOMENTS_FILE),
+        'histogram': histogram.rename(columns={'campaign_id': 'group', 'clicks': 'count'})
+    }
+
+
 # ========================================
 # Расчет скорости реакции клиентов
 # ========================================
-def calculate_response_time(clicks, campaigns):
-    print("\nРасчет скорости реакции клиентов...")
-    start_time = time()
+def iter_response_times(clicks, created_at):
+    """Время реакции по пакетам кликов: DataFrame (campaign_id, has_uid, response_time) на пакет"""
+    for batch in clicks:
+        campaign_id = batch['campaign_id'].to_numpy()
+        click_time = batch['click_time'].to_numpy('datetime64[ns]').view('int64')
+        created = apply_key_lookup(created_at, campaign_id)
+
+        # Вычисляем время реакции (разница между кликом и созданием кампании)
+        response_ns = click_time - created
 
-    # Объединяем клики с информацией о кампаниях
-    merged = pd.merge(clicks, campaigns, left_on='campaign_id', right_on='id', how='left')
+        # Фильтруем клики без кампании или времени и клики до создания кампании
+        valid = (created != NAT_INT64) & (click_time != NAT_INT64) & (response_ns >= 0)
 
-    # Вычисляем время реакции (разница между кликом и созданием кампании)
-    merged['response_time'] = (merged['click_time'] - merged['created_at']).dt.total_seconds()
+        yield pd.DataFrame({
+            'campaign_id': campaign_id[valid],
+            'has_uid': batch['uid'].notna().to_numpy()[valid],
+            'response_time': response_ns[valid] / 10 ** 9
+        })
 
-    # Фильтруем некорректные значения (если клик был до создания кампании)
-    merged = merged[merged['response_time'] >= 0]
+
+def exact_response_stats(parts):
+    """Точные статистики: все значения времени реакции собираются в памяти"""
+    merged = pd.concat(parts, ignore_index=True)
 
     # Добавляем время реакции в часах
     merged['response_time_hours'] = merged['response_time'] / 3600
 
     # Группируем по кампаниям для анализа
-    campaign_response = merged.groupby('campaign_id').agg(
-        total_clicks=('uid', 'count'),
+    grouped = merged.groupby('campaign_id')
+    campaign_response = grouped.agg(
+        total_clicks=('has_uid', 'sum'),
         avg_response_time_seconds=('response_time', 'mean'),
         median_response_time_seconds=('response_time', 'median'),
         min_response_time_seconds=('response_time', 'min'),
@@ -78,12 +133,9 @@ def calculate_response_time(clicks, campaigns):
         median_response_time_hours=('response_time_hours', 'median')
     ).reset_index()
 
-    # Добавляем информацию о кампании
-    campaign_response = pd.merge(campaign_response,
-                                 campaigns[['id', 'created_at']],
-                                 left_on='campaign_id',
-                                 right_on='id',
-                                 how='left')
+    for name, q in PERCENTILES.items():
+        campaign_response[f'{name}_response_time_seconds'] = grouped['response_time'].quantile(q).to_numpy()
+        campaign_response[f'{name}_response_time_hours'] = grouped['response_time_hours'].quantile(q).to_numpy()
 
     # Общая статистика по всем кликам
     overall_stats = {
@@ -95,13 +147,158 @@ def calculate_response_time(clicks, campaigns):
         'avg_response_time_hours': merged['response_time_hours'].mean(),
         'median_response_time_hours': merged['response_time_hours'].median()
     }
+    for name, q in PERCENTILES.items():
+        overall_stats[f'{name}_response_time_seconds'] = merged['response_time'].quantile(q)
+        overall_stats[f'{name}_response_time_hours'] = merged['response_time_hours'].quantile(q)
+
+    distributions = {
+        'histogram': grouped_histogram(merged['campaign_id'], merged['response_time'], HISTOGRAM_EDGES),
+        'percentiles': merged['response_time'].quantile([p / 100 for p in PERCENTILE_TABLE]).to_numpy()
+    }
+
+    return campaign_response, overall_stats, distributions
+
+
+def sketch_response_stats(parts, previous_state=None):
+    """Приближенные квантили за один проход: на пакет хранится только скетч и агрегаты по кампаниям
+
+    Скетчи и агрегаты складываются, поэтому партиции и запуски можно объединять в любом порядке.
+    """
+    sketches, moments, histograms = [], [], []
+    for part in parts:
+        sketches.append(build_sketch(part['campaign_id'], part['response_time']))
+        histograms.append(grouped_histogram(part['campaign_id'], part['response_time'], HISTOGRAM_EDGES))
+        moments.append(part.groupby('campaign_id').agg(
+            total_clicks=('has_uid', 'sum'),
+            count=('response_time', 'size'),
+            sum_seconds=('response_time', 'sum'),
+            min_seconds=('response_time', 'min'),
+            max_seconds=('response_time', 'max')
+        ))
+
+    if previous_state is not None:
+        sketches.append(previous_state['sketch'])
+        moments.append(previous_state['moments'].set_index('campaign_id'))
+        histograms.append(previous_state['histogram'])
+
+    sketch = merge_sketches(sketches)
+    histogram = merge_histograms(histograms)
+    moments = pd.concat(moments).groupby(level=0).agg({
+        'total_clicks': 'sum',
+        'count': 'sum',
+        'sum_seconds': 'sum',
+        'min_seconds': 'min',
+        'max_seconds': 'max'
+    })
+
+    quantile_levels = [0.5, *PERCENTILES.values()]
+    quantiles = sketch_quantiles(sketch, quantile_levels)
+    quantiles.index = quantiles.index.astype(moments.index.dtype)
+    quantiles = quantiles.reindex(moments.index)
+
+    avg_seconds = moments['sum_seconds'] / moments['count']
+    campaign_response = pd.DataFrame({
+        'total_clicks': moments['total_clicks'],
+        'avg_response_time_seconds': avg_seconds,
+        'median_response_time_seconds': quantiles[0.5],
+        'min_response_time_seconds': moments['min_seconds'],
+        'max_response_time_seconds': moments['max_seconds'],
+        'avg_response_time_hours': avg_seconds / 3600,
+        'median_response_time_hours': quantiles[0.5] / 3600
+    })
+    for name, q in PERCENTILES.items():
+        campaign_response[f'{name}_response_time_seconds'] = quantiles[q]
+        campaign_response[f'{name}_response_time_hours'] = quantiles[q] / 3600
+    campaign_response = campaign_response.rename_axis('campaign_id').reset_index()
+
+    # Общая статистика: квантили по скетчу всех кампаний сразу
+    total_quantiles = sketch_quantiles(sketch_totals(sketch), quantile_levels).iloc[0]
+    total_count = int(moments['count'].sum())
+    overall_stats = {
+        'total_clicks': total_count,
+        'avg_response_time_seconds': moments['sum_seconds'].sum() / total_count,
+        'median_response_time_seconds': total_quantiles[0.5],
+        'min_response_time_seconds': moments['min_seconds'].min(),
+        'max_response_time_seconds': moments['max_seconds'].max(),
+        'avg_response_time_hours': moments['sum_seconds'].sum() / total_count / 3600,
+        'median_response_time_hours': total_quantiles[0.5] / 3600
+    }
+    for name, q in PERCENTILES.items():
+        overall_stats[f'{name}_response_time_seconds'] = total_quantiles[q]
+        overall_stats[f'{name}_response_time_hours'] = total_quantiles[q] / 3600
+
+    total_sketch = sketch_totals(sketch)
+    distributions = {
+        'histogram': histogram,
+        'percentiles': sketch_quantiles(total_sketch, [p / 100 for p in PERCENTILE_TABLE]).iloc[0].to_numpy()
+    }
+
+    state = {'sketch': sketch, 'moments': moments.reset_index()}
+    return campaign_response, overall_stats, distributions, state
+
+
+def calculate_response_time(clicks, campaigns, mode='exact', previous_state=None):
+    """clicks - пакеты DataFrame с колонками CLICK_COLUMNS (или один DataFrame)
+
+    mode='exact' - точные медиана и процентили; mode='sketch' - по скетчу квантилей,
+    который возвращается последним значением (в точном режиме - None).
+    Третье значение - гистограммы и таблица процентилей для дашборда.
+    """
+    print(f"\nРасчет скорости реакции клиентов (режим: {mode})...")
+    start_time = time()
+
+    if isinstance(clicks, pd.DataFrame):
+        clicks = [clicks]
+
+    # Время создания кампании по ее id (int64 наносекунды, без pd.merge)
+    created_at = build_key_lookup(campaigns['id'].to_numpy(),
+                                  campaigns['created_at'].to_numpy('datetime64[ns]').view('int64'),
+                                  fill=NAT_INT64)
+
+    parts = iter_response_times(clicks, created_at)
+    if mode == 'sketch':
+        campaign_response, overall_stats, distributions, state = sketch_response_stats(parts, previous_state)
+    else:
+        campaign_response, overall_stats, distributions = exact_response_stats(parts)
+        state = None
+
+    # Добавляем информацию о кампании
+    campaign_ids = campaign_response['campaign_id'].to_numpy()
+    campaign_response['id'] = campaign_ids.astype(campaigns['id'].dtype)
+    campaign_response['created_at'] = pd.Series(
+        apply_key_lookup(created_at, campaign_ids).view('datetime64[ns]')
+    ).astype(campaigns['created_at'].dtype)
 
     print(f"Анализ завершен за {time() - start_time:.1f} сек")
-    print(f"Проанализировано {len(merged)} кликов")
+    print(f"Проанализировано {overall_stats['total_clicks']} кликов")
     print(f"Среднее время реакции: {overall_stats['avg_response_time_hours']:.2f} часов")
     print(f"Медианное время реакции: {overall_stats['median_response_time_hours']:.2f} часов")
 
-    return campaign_response, overall_stats
+    return campaign_response, overall_stats, distributions, state
+
+
+def build_distribution_tables(distributions):
+    """Артефакты для дашборда: общая гистограмма, гистограммы кампаний и таблица процентилей"""
+    campaign_histogram = distributions['histogram']
+    histogram = total_histogram(campaign_histogram, HISTOGRAM_EDGES).rename(columns={
+        'bin_left': 'bin_left_seconds',
+        'bin_right': 'bin_right_seconds',
+        'count': 'clicks'
+    })
+
+    campaign_histogram = pd.DataFrame({
+        'campaign_id': campaign_histogram['group'].astype('int32'),
+        'bin': campaign_histogram['bin'],
+        'clicks': campaign_histogram['count']
+    })
+
+    percentiles = pd.DataFrame({
+        'percentile': np.array(PERCENTILE_TABLE, dtype='int8'),
+        'response_time_seconds': distributions['percentiles']
+    })
+    percentiles['response_time_hours'] = percentiles['response_time_seconds'] / 3600
+
+    return histogram, campaign_histogram, percentiles
 
 
 # ========================================
@@ -143,13 +340,26 @@ def visualize_response_data(campaign_response, overall_stats):
 # ========================================
 # Сохранение результатов
 # ========================================
-def save_response_results(campaign_response, overall_stats):
+def save_response_results(campaign_response, overall_stats, distributions, state=None):
     print("\nСохранение результатов анализа скорости реакции...")
 
     try:
         # Сохраняем статистику по кампаниям
         campaign_response.to_parquet(f"{OUTPUT_FILE}_campaign_stats.parquet", engine='pyarrow')
 
+        # Гистограммы и процентили для дашборда (гистограмма кампаний нужна и для --incremental)
+        histogram, campaign_histogram, percentiles = build_distribution_tables(distributions)
+        histogram.to_parquet(HISTOGRAM_FILE, engine='pyarrow')
+        campaign_histogram.to_parquet(CAMPAIGN_HISTOGRAM_FILE, engine='pyarrow')
+        percentiles.to_parquet(PERCENTILES_FILE, engine='pyarrow')
+        print(f"Гистограммы и процентили сохранены в {HISTOGRAM_FILE}, {CAMPAIGN_HISTOGRAM_FILE}, {PERCENTILES_FILE}")
+
+        # Скетч сохраняется, чтобы следующий запуск мог добавить к нему новые клики
+        if state is not None:
+            state['sketch'].to_parquet(SKETCH_FILE, engine='pyarrow')
+            state['moments'].to_parquet(MOMENTS_FILE, engine='pyarrow')
+            print(f"Скетч квантилей сохранен в {SKETCH_FILE}")
+
         # Сохраняем общую статистику в JSON
         import json
         with open(f"{OUTPUT_FILE}_overall_stats.json", 'w') as f:
@@ -173,6 +383,8 @@ def print_response_tables(campaign_response, overall_stats):
         ["Общее количество кликов", f"{overall_stats['total_clicks']:,}"],
         ["Среднее время реакции", f"{overall_stats['avg_response_time_hours']:.2f} часов"],
         ["Медианное время реакции", f"{overall_stats['median_response_time_hours']:.2f} часов"],
+        ["90-й процентиль", f"{overall_stats['p90_response_time_hours']:.2f} часов"],
+        ["99-й процентиль", f"{overall_stats['p99_response_time_hours']:.2f} часов"],
         ["Минимальное время реакции", f"{overall_stats['min_response_time_seconds']:.0f} секунд"],
         ["Максимальное время реакции", f"{overall_stats['max_response_time_seconds']:.0f} секунд"]
     ]
@@ -189,11 +401,25 @@ def print_response_tables(campaign_response, overall_stats):
 # Главная функция
 # ========================================
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Анализ скорости реакции клиентов')
+    parser.add_argument('--mode', choices=['exact', 'sketch'], default='exact',
+                        help='exact - точные квантили, sketch - скетч квантилей за один проход')
+    parser.add_argument('--clicks', nargs='+', type=Path, default=[CLICKS_FILE],
+                        help='Файлы кликов (партиции), обрабатываются по очереди')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Добавить клики к скетчу предыдущего запуска (только с --mode sketch)')
+    args = parser.parse_args()
+
+    if args.incremental and args.mode != 'sketch':
+        parser.error('--incremental работает только с --mode sketch')
+
     # Загрузка данных
-    clicks, campaigns = load_data()
+    clicks, campaigns = load_data(args.clicks)
+    previous_state = load_sketch_state() if args.incremental else None
 
     # Расчет скорости реакции
-    campaign_response, overall_stats = calculate_response_time(clicks, campaigns)
+    campaign_response, overall_stats, distributions, state = calculate_response_time(
+        clicks, campaigns, mode=args.mode, previous_state=previous_state)
 
     # Визуализация данных
     visualize_response_data(campaign_response, overall_stats)
@@ -202,6 +428,6 @@ if __name__ == '__main__':
     print_response_tables(campaign_response, overall_stats)
 
     # Сохранение результатов
-    save_response_results(campaign_response, overall_stats)
+    save_response_results(campaign_response, overall_stats, distributions, state)
 
     print("\nГотово! Анализ скорости реакции завершен.")
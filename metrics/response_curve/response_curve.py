@@ -0,0 +1,284 @@
+import pandas as pd
+import numpy as np
+import sys
+from time import time
+import matplotlib.pyplot as plt
+import seaborn as sns
+from tabulate import tabulate
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from metrics.common.histograms import bin_index, count_matrix, log_bin_edges
+from metrics.common.joins import NAT_INT64, apply_key_lookup, build_key_lookup
+from metrics.common.parquet_stream import iter_parquet_batches, parquet_num_rows
+
+# Настройка стиля графиков
+plt.style.use('seaborn-v0_8')
+sns.set_palette("husl")
+
+# ========================================
+# Конфигурация
+# ========================================
+PROJECT_ROOT = Path(__file__).parent.parent.parent  # Поднимаемся на уровень выше metrics/
+(PROJECT_ROOT / 'processed_data').mkdir(parents=True, exist_ok=True)
+CLICKS_FILE = PROJECT_ROOT / 'processed_data' / 'clicks_processed.parquet'
+CAMPAIGN_FILE = PROJECT_ROOT / 'processed_data' / 'campaign_processed.parquet'
+PLOTS_DIR = PROJECT_ROOT / 'plots'
+OUTPUT_FILE = PROJECT_ROOT / 'processed_data' / 'response_curve'
+
+# Из кликов читаются только эти колонки, пакетами
+CLICK_COLUMNS = ['campaign_id', 'click_time']
+
+# Корзины по минутам с момента создания кампании: [0, 1 мин), далее логарифмически до 30 дней.
+# Более поздние клики в корзины не попадают (bin_index сложил бы их в последнюю корзину
+# и исказил хвост кривой) и считаются отдельно как late_clicks
+CURVE_EDGES_MINUTES = log_bin_edges(30 * 24 * 60, bins_per_decade=8)
+
+# Минимум непустых корзин для подгонки модели затухания
+MIN_FIT_BINS = 3
+
+
+# ========================================
+# Загрузка данных
+# ========================================
+def load_data():
+    print("Загрузка данных для построения кривых отклика...")
+    start_time = time()
+
+    try:
+        # Клики читаются пакетами внутри bin_response_curves
+        clicks = iter_parquet_batches(CLICKS_FILE, CLICK_COLUMNS)
+        campaigns = pd.read_parquet(CAMPAIGN_FILE)
+
+        # Преобразуем created_at из Unix timestamp в наносекундах
+        campaigns['created_at'] = pd.to_datetime(campaigns['created_at'].astype('int64') // 10 ** 9, unit='s')
+
+        print(f"Данные загружены за {time() - start_time:.1f} сек")
+        print(f"Кликов: {parquet_num_rows(CLICKS_FILE):,}")
+        print(f"Кампаний: {len(campaigns):,}")
+
+        return clicks, campaigns
+
+    except Exception as e:
+        print(f"Ошибка загрузки данных: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+# ========================================
+# Кривые отклика: клики по корзинам времени с запуска
+# ========================================
+def bin_response_curves(clicks, campaigns):
+    """Матрица кампания x корзина: число кликов по минутам с создания кампании
+
+    Возвращает id кампаний, матрицу и число кликов каждой кампании после последней границы.
+    """
+    print("\nРаспределение кликов по времени с запуска кампании...")
+    start_time = time()
+
+    campaign_ids = np.sort(campaigns['id'].unique())
+    created_at = build_key_lookup(campaigns['id'].to_numpy(),
+                                  campaigns['created_at'].to_numpy('datetime64[ns]').view('int64'),
+                                  fill=NAT_INT64)
+    # Строка матрицы по id кампании
+    row_of_campaign = build_key_lookup(campaign_ids, np.arange(len(campaign_ids)), fill=-1)
+
+    n_bins = len(CURVE_EDGES_MINUTES) - 1
+    counts = np.zeros((len(campaign_ids), n_bins), dtype='int64')
+    late = np.zeros(len(campaign_ids), dtype='int64')
+
+    for batch in clicks:
+        campaign_id = batch['campaign_id'].to_numpy()
+        click_time = batch['click_time'].to_numpy('datetime64[ns]').view('int64')
+        created = apply_key_lookup(created_at, campaign_id)
+
+        # Целые минуты с момента создания; клики до создания кампании не учитываются
+        minutes = (click_time - created) // (60 * 10 ** 9)
+        valid = (created != NAT_INT64) & (click_time != NAT_INT64) & (minutes >= 0)
+        in_window = valid & (minutes < CURVE_EDGES_MINUTES[-1])
+
+        counts += count_matrix(apply_key_lookup(row_of_campaign, campaign_id[in_window]),
+                               bin_index(minutes[in_window], CURVE_EDGES_MINUTES),
+                               len(campaign_ids), n_bins)
+        late += np.bincount(apply_key_lookup(row_of_campaign, campaign_id[valid & ~in_window]),
+                            minlength=len(campaign_ids))
+
+    print(f"Распределение построено за {time() - start_time:.1f} сек")
+    print(f"Кликов позже {CURVE_EDGES_MINUTES[-1] / (24 * 60):.0f} дней после запуска (вне кривой): {late.sum():,}")
+    return campaign_ids, counts, late
+
+
+# ========================================
+# Модель затухания
+# ========================================
+def fit_decay(counts, edges=CURVE_EDGES_MINUTES):
+    """Подгонка rate(t) = A * exp(-t / tau) для всех кампаний сразу
+
+    Взвешенный МНК по логарифму интенсивности (клики в минуту) в непустых корзинах,
+    вес корзины - число кликов. Решается в замкнутом виде по строкам матрицы.
+    """
+    widths = np.diff(edges)
+    # Середина корзины на логарифмической шкале (для первой корзины - середина отрезка)
+    centers = np.where(edges[:-1] > 0, np.sqrt(edges[:-1] * edges[1:]), edges[1:] / 2)
+
+    w = counts.astype('float64')
+    with np.errstate(divide='ignore'):
+        y = np.where(counts > 0, np.log(counts / widths), 0.0)
+    x = np.broadcast_to(centers, counts.shape)
+
+    sw = w.sum(axis=1)
+    sx, sy = (w * x).sum(axis=1), (w * y).sum(axis=1)
+    sxx, sxy = (w * x * x).sum(axis=1), (w * x * y).sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (sw * sxy - sx * sy) / (sw * sxx - sx * sx)
+        intercept = (sy - slope * sx) / sw
+
+        # Качество подгонки (взвешенный R^2 в логарифмической шкале)
+        residual = y - (intercept[:, None] + slope[:, None] * x)
+        mean_y = sy / sw
+        ss_res = (w * residual ** 2).sum(axis=1)
+        ss_tot = (w * (y - mean_y[:, None]) ** 2).sum(axis=1)
+        r2 = 1 - ss_res / ss_tot
+
+        tau = np.where(slope < 0, -1 / slope, np.nan)
+
+    # Модель определена, если есть несколько непустых корзин и клики действительно затухают
+    fitted = ((counts > 0).sum(axis=1) >= MIN_FIT_BINS) & (slope < 0)
+
+    return pd.DataFrame({
+        'initial_rate_per_minute': np.where(fitted, np.exp(intercept), np.nan),
+        'decay_tau_minutes': np.where(fitted, tau, np.nan),
+        'half_life_minutes': np.where(fitted, tau * np.log(2), np.nan),
+        'fit_r2': np.where(fitted, r2, np.nan)
+    })
+
+
+def time_to_share(counts, share, edges=CURVE_EDGES_MINUTES):
+    """Минуты с запуска, за которые кампания набирает долю share кликов (по границам корзин)"""
+    cumulative = counts.cumsum(axis=1)
+    totals = cumulative[:, -1:]
+    reached = cumulative >= share * totals
+    first = reached.argmax(axis=1)
+
+    # Линейная интерполяция внутри корзины, в которой достигается доля
+    rows = np.arange(len(counts))
+    before = np.where(first > 0, cumulative[rows, first - 1], 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = (share * totals[:, 0] - before) / counts[rows, first]
+    minutes = edges[first] + np.clip(fraction, 0, 1) * (edges[first + 1] - edges[first])
+    return np.where(totals[:, 0] > 0, minutes, np.nan)
+
+
+def analyze_response_curves(campaign_ids, counts, late):
+    """Параметры кривых по кампаниям; доли и t50/t90 - от кликов внутри окна кривой (total_clicks)"""
+    print("\nПодгонка модели затухания откликов...")
+    start_time = time()
+
+    curve_stats = fit_decay(counts)
+    curve_stats.insert(0, 'campaign_id', campaign_ids)
+    curve_stats.insert(1, 'total_clicks', counts.sum(axis=1))
+    curve_stats.insert(2, 'late_clicks', late)
+    curve_stats['first_hour_share'] = np.divide(
+        counts[:, CURVE_EDGES_MINUTES[1:] <= 60].sum(axis=1), curve_stats['total_clicks'],
+        out=np.full(len(counts), np.nan), where=curve_stats['total_clicks'].to_numpy() > 0)
+    curve_stats['t50_minutes'] = time_to_share(counts, 0.5)
+    curve_stats['t90_minutes'] = time_to_share(counts, 0.9)
+
+    # Кампании без кликов в модели не нужны
+    curve_stats = curve_stats[curve_stats['total_clicks'] > 0].reset_index(drop=True)
+
+    fitted = curve_stats['half_life_minutes'].notna()
+    print(f"Модель подогнана за {time() - start_time:.1f} сек")
+    print(f"Кампаний с кривой: {len(curve_stats):,}, с подогнанной моделью: {fitted.sum():,}")
+
+    return curve_stats
+
+
+# ========================================
+# Визуализация данных
+# ========================================
+def visualize_curves(curve_stats, counts):
+    import os
+    if not os.path.exists(PLOTS_DIR):
+        os.makedirs(PLOTS_DIR)
+
+    print("\nСоздание визуализаций кривых отклика...")
+
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 5))
+
+    # 1. Общая кривая отклика (клики в минуту по всем кампаниям)
+    widths = np.diff(CURVE_EDGES_MINUTES)
+    rate = counts.sum(axis=0) / widths
+    ax1.step(np.maximum(CURVE_EDGES_MINUTES[:-1], 0.5) / 60, rate, where='post')
+    ax1.set_xscale('log')
+    ax1.set_yscale('log')
+    ax1.set_title('Интенсивность кликов после запуска кампании')
+    ax1.set_xlabel('Часы с момента создания кампании')
+    ax1.set_ylabel('Кликов в минуту (все кампании)')
+
+    # 2. Распределение периода полураспада
+    half_life_hours = curve_stats['half_life_minutes'].dropna() / 60
+    sns.histplot(half_life_hours, bins=40, log_scale=True, ax=ax2)
+    ax2.set_title('Период полураспада откликов по кампаниям')
+    ax2.set_xlabel('Период полураспада (часы)')
+    ax2.set_ylabel('Количество кампаний')
+
+    plt.tight_layout()
+    plt.savefig(f'{PLOTS_DIR}/response_curve_decay.png')
+    plt.close()
+
+    print(f"Графики сохранены в папку {PLOTS_DIR}")
+
+
+# ========================================
+# Сохранение результатов
+# ========================================
+def save_results(curve_stats):
+    print("\nСохранение параметров кривых отклика...")
+
+    try:
+        curve_stats.to_parquet(f"{OUTPUT_FILE}_campaign_params.parquet", engine='pyarrow')
+        print(f"Результаты сохранены в {OUTPUT_FILE}_campaign_params.parquet")
+    except Exception as e:
+        print(f"Ошибка при сохранении: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+# ========================================
+# Вывод красивых таблиц
+# ========================================
+def print_tables(curve_stats):
+    print("\nСводная статистика по кривым отклика:")
+    summary = curve_stats[['half_life_minutes', 'fit_r2', 'first_hour_share', 't50_minutes', 't90_minutes']]
+    print(tabulate(summary.describe().transpose(), headers='keys', tablefmt='pretty', floatfmt=".2f"))
+
+    # Кампании с самым быстрым затуханием
+    top10_fastest = curve_stats.nsmallest(10, 'half_life_minutes')[
+        ['campaign_id', 'total_clicks', 'half_life_minutes', 't50_minutes']]
+    print("\nТоп-10 кампаний с самым быстрым затуханием откликов:")
+    print(tabulate(top10_fastest, headers='keys', tablefmt='pretty', showindex=False, floatfmt=".1f"))
+
+
+# ========================================
+# Главная функция
+# ========================================
+if __name__ == '__main__':
+    # Загрузка данных
+    clicks, campaigns = load_data()
+
+    # Клики по корзинам времени с запуска
+    campaign_ids, counts, late = bin_response_curves(clicks, campaigns)
+
+    # Подгонка модели затухания
+    curve_stats = analyze_response_curves(campaign_ids, counts, late)
+
+    # Визуализация данных
+    visualize_curves(curve_stats, counts)
+
+    # Вывод таблиц
+    print_tables(curve_stats)
+
+    # Сохранение результатов
+    save_results(curve_stats)
+
+    print("\nГотово! Анализ кривых отклика завершен.")
@@ -0,0 +1,230 @@
+import pandas as pd
+import numpy as np
+import sys
+from time import time
+import matplotlib.pyplot as plt
+import seaborn as sns
+from tabulate import tabulate
+from pathlib import Path
+import argparse
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from metrics.common.distinct import hash_values
+from metrics.common.histograms import count_matrix
+from metrics.common.parquet_stream import iter_parquet_batches, parquet_num_rows
+from metrics.common.time_buckets import bucket_labels, bucket_start, time_bucket
+
+# Настройка стиля графиков
+plt.style.use('seaborn-v0_8')
+sns.set_palette("husl")
+
+# ========================================
+# Конфигурация
+# ========================================
+PROJECT_ROOT = Path(__file__).parent.parent.parent  # Поднимаемся на уровень выше metrics/
+(PROJECT_ROOT / 'processed_data').mkdir(parents=True, exist_ok=True)
+CLICKS_FILE = PROJECT_ROOT / 'processed_data' / 'clicks_processed.parquet'
+PLOTS_DIR = PROJECT_ROOT / 'plots'
+OUTPUT_FILE = PROJECT_ROOT / 'processed_data' / 'retention'
+
+# Из кликов читаются только эти колонки, пакетами
+CLICK_COLUMNS = ['uid', 'click_time']
+
+# Детализации когорт по умолчанию (недельные когорты читает дашборд)
+COHORT_UNITS = ('week', 'month')
+AVAILABLE_UNITS = ('day', 'week', 'month')
+
+# Сколько периодов после первого клика показывать на графиках и в таблицах
+PLOT_PERIODS = 12
+
+
+# ========================================
+# Загрузка данных
+# ========================================
+def load_data(click_files=(CLICKS_FILE,)):
+    print("Загрузка данных для анализа удержания...")
+
+    try:
+        # Клики не загружаются целиком: пакеты читаются партиция за партицией
+        clicks = (batch for path in click_files for batch in iter_parquet_batches(path, CLICK_COLUMNS))
+        print(f"Кликов: {sum(parquet_num_rows(path) for path in click_files):,}")
+        return clicks
+
+    except Exception as e:
+        print(f"Ошибка загрузки данных: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+# ========================================
+# Активность пользователей по периодам
+# ========================================
+def unique_pairs(users, periods):
+    """Уникальные пары (пользователь, период); пользователь - 64-битный хэш uid"""
+    order = np.lexsort((periods, users))
+    users, periods = users[order], periods[order]
+    first = np.r_[True, (users[1:] != users[:-1]) | (periods[1:] != periods[:-1])]
+    return users[first], periods[first]
+
+
+def collect_activity(clicks, units):
+    """Один проход по пакетам: для каждой детализации - пары (хэш uid, номер периода) без повторов
+
+    Внутри пакета пары схлопываются сразу, поэтому в памяти держится не больше пар
+    «пользователь активен в периоде», чем кликов.
+    """
+    users = {unit: [] for unit in units}
+    periods = {unit: [] for unit in units}
+
+    for batch in clicks:
+        batch = batch[batch['uid'].notna()]
+        click_time = batch['click_time'].to_numpy('datetime64[ns]')
+        valid = ~np.isnat(click_time)
+        hashes = hash_values(batch['uid'].to_numpy()[valid])
+        click_ns = click_time[valid].view('int64')
+
+        for unit in units:
+            batch_users, batch_periods = unique_pairs(hashes, time_bucket(click_ns, unit))
+            users[unit].append(batch_users)
+            periods[unit].append(batch_periods)
+
+    return {unit: unique_pairs(np.concatenate(users[unit]), np.concatenate(periods[unit])) for unit in units}
+
+
+# ========================================
+# Матрица удержания
+# ========================================
+def retention_matrix(users, periods):
+    """Когорта (период первого клика) x номер периода после него: активные пользователи
+
+    users, periods - уникальные пары, отсортированные по пользователю и периоду.
+    Пользователи переводятся в плотные номера через searchsorted по отсортированным хэшам.
+    """
+    user_keys = np.unique(users)
+    user_index = np.searchsorted(user_keys, users)
+
+    # Пары отсортированы по пользователю и периоду: первая пара пользователя - его когорта
+    first = np.r_[True, user_index[1:] != user_index[:-1]]
+    cohort_of_user = periods[first]
+    cohort = cohort_of_user[user_index]
+
+    # Столбцов - до последнего периода с активностью: наблюдаемые нули тоже попадают в матрицу
+    first_cohort = int(cohort_of_user.min())
+    n_cohorts = int(cohort_of_user.max()) - first_cohort + 1
+    active = count_matrix(cohort - first_cohort, periods - cohort, n_cohorts, int(periods.max()) - first_cohort + 1)
+    return np.arange(first_cohort, first_cohort + n_cohorts), active
+
+
+def analyze_retention(clicks, units=COHORT_UNITS):
+    """Удержание по когортам для каждой детализации: {детализация: DataFrame в длинном формате}"""
+    print(f"\nАнализ удержания по когортам: {', '.join(units)}...")
+    start_time = time()
+
+    activity = collect_activity(clicks, units)
+
+    result = {}
+    for unit in units:
+        users, periods = activity[unit]
+        cohorts, active = retention_matrix(users, periods)
+        cohort_size = active[:, 0]
+
+        # Конец данных - последний период с любой активностью (не последняя когорта):
+        # ячейки после него не считаются нулевым удержанием - их просто нет
+        last_period = int(periods.max())
+        cohort_index, period = np.nonzero(
+            (np.arange(active.shape[1])[None, :] <= (last_period - cohorts)[:, None]) & (cohort_size[:, None] > 0)
+        )
+        table = pd.DataFrame({
+            'cohort': bucket_labels(cohorts[cohort_index], unit),
+            'cohort_start': bucket_start(cohorts[cohort_index], unit),
+            'period': period.astype('int32'),
+            'cohort_size': cohort_size[cohort_index],
+            'active_users': active[cohort_index, period]
+        })
+        table['retention'] = table['active_users'] / table['cohort_size'] * 100
+        result[unit] = table
+
+        print(f"{unit}: когорт {int((cohort_size > 0).sum())}, пользователей {int(cohort_size.sum()):,}")
+
+    print(f"Анализ завершен за {time() - start_time:.1f} сек")
+    return result
+
+
+# ========================================
+# Визуализация данных
+# ========================================
+def visualize_retention(result):
+    import os
+    if not os.path.exists(PLOTS_DIR):
+        os.makedirs(PLOTS_DIR)
+
+    print("\nСоздание визуализаций...")
+
+    for unit, table in result.items():
+        matrix = table[table['period'] < PLOT_PERIODS].pivot(index='cohort', columns='period', values='retention')
+
+        fig, ax = plt.subplots(figsize=(14, max(6, len(matrix) * 0.3)))
+        sns.heatmap(matrix, cmap='YlGnBu', annot=len(matrix) <= 40, fmt='.0f', linewidths=.5, ax=ax)
+        ax.set_title(f'Удержание пользователей по когортам первого клика ({unit}), %')
+        ax.set_xlabel('Период после первого клика')
+        ax.set_ylabel('Когорта')
+        fig.tight_layout()
+        fig.savefig(f'{PLOTS_DIR}/retention_{unit}.png')
+        plt.close(fig)
+
+    print(f"Графики сохранены в папку {PLOTS_DIR}")
+
+
+# ========================================
+# Сохранение результатов
+# ========================================
+def save_results(result):
+    print("\nСохранение результатов...")
+
+    try:
+        for unit, table in result.items():
+            table.to_parquet(f"{OUTPUT_FILE}_{unit}.parquet", engine='pyarrow')
+            print(f"Результаты сохранены в {OUTPUT_FILE}_{unit}.parquet")
+    except Exception as e:
+        print(f"Ошибка при сохранении: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+# ========================================
+# Вывод красивых таблиц
+# ========================================
+def print_tables(result):
+    for unit, table in result.items():
+        # Среднее удержание по периодам, взвешенное по размеру когорт
+        periods = table[table['period'] < PLOT_PERIODS].groupby('period')[['active_users', 'cohort_size']].sum()
+        periods['retention'] = (periods['active_users'] / periods['cohort_size'] * 100).round(1)
+        print(f"\nСреднее удержание по периодам ({unit}), %:")
+        print(tabulate(periods.reset_index().astype(object), headers='keys', tablefmt='pretty', showindex=False))
+
+
+# ========================================
+# Главная функция
+# ========================================
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Удержание пользователей по когортам первого клика')
+    parser.add_argument('--granularity', nargs='+', choices=AVAILABLE_UNITS, default=list(COHORT_UNITS),
+                        help='Детализации когорт: day, week, month')
+    parser.add_argument('--clicks', nargs='+', type=Path, default=[CLICKS_FILE],
+                        help='Файлы кликов (партиции), обрабатываются по очереди')
+    args = parser.parse_args()
+
+    # Загрузка данных
+    clicks = load_data(args.clicks)
+
+    # Анализ удержания
+    result = analyze_retention(clicks, tuple(dict.fromkeys(args.granularity)))
+
+    # Визуализация данных
+    visualize_retention(result)
+
+    # Вывод таблиц
+    print_tables(result)
+
+    # Сохранение результатов
+    save_results(result)
+
+    print("\nГотово! Анализ удержания завершен.")
@@ -0,0 +1,236 @@
+import pandas as pd
+import numpy as np
+import sys
+from time import time
+import matplotlib.pyplot as plt
+import seaborn as sns
+from tabulate import tabulate
+from pathlib import Path
+import argparse
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from metrics.common.aggregations import count_by_key, distinct_by_key
+from metrics.common.parquet_stream import iter_parquet_batches, parquet_num_rows
+from metrics.common.sessions import SESSION_GAP_MINUTES, session_summary
+from metrics.common.user_partitions import USER_PARTITIONS, iter_user_partitions
+
+# Настройка стиля графиков
+plt.style.use('seaborn-v0_8')
+sns.set_palette("husl")
+
+# ========================================
+# Конфигурация
+# ========================================
+PROJECT_ROOT = Path(__file__).parent.parent.parent  # Поднимаемся на уровень выше metrics/
+(PROJECT_ROOT / 'processed_data').mkdir(parents=True, exist_ok=True)
+CLICKS_FILE = PROJECT_ROOT / 'processed_data' / 'clicks_processed.parquet'
+PLOTS_DIR = PROJECT_ROOT / 'plots'
+SESSIONS_FILE = PROJECT_ROOT / 'processed_data' / 'sessions.parquet'
+OUTPUT_FILE = PROJECT_ROOT / 'processed_data' / 'sessions'
+
+# Из кликов читаются только эти колонки, пакетами
+CLICK_COLUMNS = ['uid', 'campaign_id', 'region', 'click_time']
+
+# Корзины распределения числа сессий на пользователя (последняя - "и больше")
+SESSIONS_PER_USER_BINS = [1, 2, 3, 4, 5, 10, 20]
+
+
+# ========================================
+# Загрузка данных
+# ========================================
+def load_data(click_files=(CLICKS_FILE,)):
+    print("Загрузка данных для разметки сессий...")
+
+    try:
+        # Клики не загружаются целиком: пакеты читаются партиция за партицией
+        clicks = (batch for path in click_files for batch in iter_parquet_batches(path, CLICK_COLUMNS))
+        print(f"Кликов: {sum(parquet_num_rows(path) for path in click_files):,}")
+        return clicks
+
+    except Exception as e:
+        print(f"Ошибка загрузки данных: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+# ========================================
+# Разметка сессий
+# ========================================
+def analyze_sessions(clicks, gap_minutes=SESSION_GAP_MINUTES, n_partitions=USER_PARTITIONS):
+    """Таблица сессий (одна строка на сессию) по всем кликам
+
+    Клики раскладываются на диск по партициям хэша uid (внешняя сортировка): сессии
+    размечаются по партициям независимо, в памяти одновременно одна из них.
+    """
+    print(f"\nРазметка сессий (перерыв {gap_minutes} мин, партиций {n_partitions})...")
+    start_time = time()
+
+    sessions = []
+    for part in iter_user_partitions(clicks, n_partitions):
+        part = part[part['click_time'].notna()]
+        # В партиции могут остаться только клики без времени
+        if not len(part):
+            continue
+        sessions.append(session_summary(
+            part['uid'].to_numpy(),
+            part['click_time'].to_numpy('datetime64[ns]').view('int64'),
+            part['campaign_id'].to_numpy(),
+            part['region'].to_numpy(),
+            gap_minutes
+        ))
+
+    if not sessions:
+        # Нет ни одного клика со временем: пустая таблица сессий с теми же колонками
+        empty = np.zeros(0, dtype='int64')
+        sessions = [session_summary(empty, empty, empty, empty, gap_minutes)]
+
+    sessions = pd.concat(sessions, ignore_index=True)
+    sessions.insert(0, 'session_id', np.arange(len(sessions), dtype='int64'))
+
+    print(f"Разметка завершена за {time() - start_time:.1f} сек")
+    print(f"Сессий: {len(sessions):,}, пользователей: {sessions['uid'].nunique():,}")
+    return sessions
+
+
+def sessions_per_user(sessions):
+    """Сессии, клики и суммарная длительность по каждому пользователю"""
+    codes, uids = pd.factorize(sessions['uid'], sort=True)
+    return pd.DataFrame({
+        'uid': uids,
+        'sessions': count_by_key(codes, len(uids)),
+        'clicks': count_by_key(codes, len(uids), sessions['clicks'].to_numpy()).astype('int64'),
+        'duration_sec': count_by_key(codes, len(uids), sessions['duration_sec'].to_numpy()).astype('int64')
+    })
+
+
+def sessions_per_region(sessions):
+    """Сессии по региону первого клика сессии: число, пользователи, средние длина и длительность"""
+    codes, regions = pd.factorize(sessions['region'], sort=True)
+    present = codes >= 0
+    codes = codes[present]
+
+    counts = count_by_key(codes, len(regions))
+    clicks = count_by_key(codes, len(regions), sessions['clicks'].to_numpy()[present])
+    duration = count_by_key(codes, len(regions), sessions['duration_sec'].to_numpy()[present])
+
+    # Пользователь учитывается в каждом регионе, где у него начиналась сессия
+    region_users = distinct_by_key(codes, sessions['uid'].to_numpy()[present], len(regions))
+
+    return pd.DataFrame({
+        'region': regions,
+        'sessions': counts,
+        'users': region_users,
+        'sessions_per_user': counts / region_users,
+        'avg_clicks': clicks / counts,
+        'avg_duration_sec': duration / counts
+    })
+
+
+# ========================================
+# Визуализация данных
+# ========================================
+def visualize_sessions(sessions, users):
+    import os
+    if not os.path.exists(PLOTS_DIR):
+        os.makedirs(PLOTS_DIR)
+
+    print("\nСоздание визуализаций...")
+
+    fig, axes = plt.subplots(1, 2, figsize=(16, 6))
+
+    # Распределение числа сессий на пользователя
+    edges = SESSIONS_PER_USER_BINS + [np.inf]
+    labels = [str(left) if right - left == 1 else f'{left}+' if np.isinf(right) else f'{left}-{right - 1}'
+              for left, right in zip(edges[:-1], edges[1:])]
+    counts = pd.cut(users['sessions'], bins=edges, right=False, labels=labels).value_counts(sort=False)
+    axes[0].bar(labels, counts.values, color='skyblue')
+    axes[0].set_title('Пользователи по числу сессий')
+    axes[0].set_xlabel('Сессий на пользователя')
+    axes[0].set_ylabel('Пользователей')
+
+    # Распределение длины сессий в кликах
+    clicks = sessions['clicks'].clip(upper=20)
+    axes[1].bar(*np.unique(clicks, return_counts=True), color='lightgreen')
+    axes[1].set_title('Сессии по числу кликов (20 - и больше)')
+    axes[1].set_xlabel('Кликов в сессии')
+    axes[1].set_ylabel('Сессий')
+    axes[1].set_yscale('log')
+
+    fig.tight_layout()
+    fig.savefig(f'{PLOTS_DIR}/sessions_distribution.png')
+    plt.close(fig)
+
+    print(f"Графики сохранены в папку {PLOTS_DIR}")
+
+
+# ========================================
+# Сохранение результатов
+# ========================================
+def save_results(sessions, users, regions):
+    print("\nСохранение результатов...")
+
+    try:
+        sessions.to_parquet(SESSIONS_FILE, engine='pyarrow')
+        users.to_parquet(f"{OUTPUT_FILE}_per_user.parquet", engine='pyarrow')
+        regions.to_parquet(f"{OUTPUT_FILE}_per_region.parquet", engine='pyarrow')
+        print(f"Результаты сохранены в {SESSIONS_FILE}, {OUTPUT_FILE}_per_user.parquet, "
+              f"{OUTPUT_FILE}_per_region.parquet")
+    except Exception as e:
+        print(f"Ошибка при сохранении: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+# ========================================
+# Вывод красивых таблиц
+# ========================================
+def print_tables(sessions, users, regions):
+    summary = [
+        ['Сессий', f"{len(sessions):,}"],
+        ['Пользователей', f"{len(users):,}"],
+        ['Сессий на пользователя', f"{len(sessions) / len(users):.2f}"],
+        ['Кликов в сессии (медиана / среднее)', f"{sessions['clicks'].median():.0f} / {sessions['clicks'].mean():.2f}"],
+        ['Длительность сессии, сек (медиана / среднее)',
+         f"{sessions['duration_sec'].median():.0f} / {sessions['duration_sec'].mean():.0f}"],
+        ['Кампаний в сессии (среднее)', f"{sessions['campaigns'].mean():.2f}"]
+    ]
+    print("\nСессии:")
+    print(tabulate(summary, tablefmt='pretty'))
+
+    top_regions = regions.nlargest(10, 'sessions').round(2).astype(object)
+    print("\nТоп-10 регионов по числу сессий:")
+    print(tabulate(top_regions, headers='keys', tablefmt='pretty', showindex=False))
+
+
+# ========================================
+# Главная функция
+# ========================================
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Разметка сессий пользователей по перерыву между кликами')
+    parser.add_argument('--gap', type=int, default=SESSION_GAP_MINUTES,
+                        help='Перерыв между кликами, после которого начинается новая сессия (минуты)')
+    parser.add_argument('--partitions', type=int, default=USER_PARTITIONS,
+                        help='Число партиций по хэшу uid для внешней сортировки')
+    parser.add_argument('--clicks', nargs='+', type=Path, default=[CLICKS_FILE],
+                        help='Файлы кликов (партиции), обрабатываются по очереди')
+    args = parser.parse_args()
+
+    if args.gap <= 0 or args.partitions <= 0:
+        parser.error('--gap и --partitions должны быть положительными')
+
+    # Загрузка данных
+    clicks = load_data(args.clicks)
+
+    # Разметка сессий
+    sessions = analyze_sessions(clicks, args.gap, args.partitions)
+    users = sessions_per_user(sessions)
+    regions = sessions_per_region(sessions)
+
+    # Визуализация данных
+    visualize_sessions(sessions, users)
+
+    # Вывод таблиц
+    print_tables(sessions, users, regions)
+
+    # Сохранение результатов
+    save_results(sessions, users, regions)
+
+    print("\nГотово! Разметка сессий завершена.")
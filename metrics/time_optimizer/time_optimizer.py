@@ -1,16 +1,30 @@
 import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
 from tabulate import tabulate
 from pathlib import Path
+import argparse
 import sys
 from time import time
 
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from metrics.common.aggregations import add_percentage, aggregate_by_key
+from metrics.common.histograms import count_matrix
+from metrics.common.send_time import build_send_time_matrix, load_send_time_matrix, recommend_send_windows, \
+    save_send_time_matrix
+from metrics.common.timezones import MOSCOW_UTC_OFFSET, hour_of_day, hour_of_week, local_time_ns, \
+    region_utc_offsets, timezone_label
+
 # Конфигурация
 PROJECT_ROOT = Path(__file__).parent.parent.parent
 CLICKS_FILE = PROJECT_ROOT / 'processed_data' / 'clicks_processed.parquet'
+MATRIX_FILE = PROJECT_ROOT / 'processed_data' / 'send_time_matrix.npz'
 PLOTS_DIR = PROJECT_ROOT / 'plots'
 PLOTS_DIR.mkdir(exist_ok=True)
 
+# Сколько лучших часов рекомендовать
+TOP_HOURS = 3
+
 
 # Загрузка данных
 def load_clicks_data():
@@ -24,22 +38,47 @@ def load_clicks_data():
         sys.exit(1)
 
 
-# Анализ активности по часам
+# Местное время кликов (int64 нс); клики без времени отбрасываются
+def local_click_times(clicks):
+    click_time = clicks['click_time'].to_numpy('datetime64[ns]')
+    valid = ~np.isnat(click_time)
+    regions = clicks['region'].to_numpy()[valid]
+    return local_time_ns(click_time[valid].view('int64'), regions), valid
+
+
+# Анализ активности по часам (местное время региона клика)
 def analyze_activity(clicks):
     print("\nАнализ активности пользователей...")
     start_time = time()
 
-    # Анализ по UTC
-    clicks['hour'] = clicks['click_time'].dt.hour
-    hour_activity = clicks['hour'].value_counts().sort_index().reset_index()
-    hour_activity.columns = ['hour', 'clicks_count']
-    hour_activity['pct'] = (hour_activity['clicks_count'] / hour_activity['clicks_count'].sum()) * 100
+    local_ns, valid = local_click_times(clicks)
+    regions = clicks['region'].to_numpy()[valid]
+    hours = hour_of_day(local_ns)
+
+    hour_activity = aggregate_by_key(hours, key_name='hour', count_name='clicks_count')
+    add_percentage(hour_activity, 'clicks_count', name='pct')
 
     # Топ-3 лучших часа
-    best_hours = hour_activity.nlargest(3, 'clicks_count')['hour'].tolist()
+    best_hours = hour_activity.nlargest(TOP_HOURS, 'clicks_count')['hour'].tolist()
+
+    # Лучшие местные часы отдельно для каждого часового пояса
+    offset_index, offsets = pd.factorize(region_utc_offsets(regions), sort=True)
+    counts = count_matrix(offset_index, hours, len(offsets), 24)
+    timezone_hours = pd.DataFrame({
+        'utc_offset': np.repeat(offsets, TOP_HOURS),
+        'rank': np.tile(np.arange(1, TOP_HOURS + 1), len(offsets)),
+        'local_hour': np.argsort(-counts, axis=1, kind='stable')[:, :TOP_HOURS].ravel()
+    })
+    timezone_hours['clicks_count'] = counts[np.repeat(np.arange(len(offsets)), TOP_HOURS),
+                                            timezone_hours['local_hour']]
+    timezone_hours['timezone'] = timezone_hours['utc_offset'].map(timezone_label)
+
+    # Час отправки в UTC и по Москве, чтобы письмо пришло в лучший местный час
+    timezone_hours['utc_hour'] = (timezone_hours['local_hour'] - timezone_hours['utc_offset']) % 24
+    timezone_hours['msk_hour'] = (timezone_hours['utc_hour'] + MOSCOW_UTC_OFFSET) % 24
 
     print(f"Анализ завершен за {time() - start_time:.1f} сек")
-    return hour_activity, best_hours
+    return hour_activity, best_hours, timezone_hours
 
 
 # Визуализация результатов
@@ -53,8 +92,8 @@ def visualize_results(hour_activity, best_hours):
     for hour in best_hours:
         bars[hour].set_color('red')
 
-    plt.title('Активность пользователей по часам (UTC)', fontsize=14)
-    plt.xlabel('Час дня (UTC)', fontsize=12)
+    plt.title('Активность пользователей по часам (местное время)', fontsize=14)
+    plt.xlabel('Час дня (местное время)', fontsize=12)
     plt.ylabel('Количество кликов', fontsize=12)
     plt.xticks(range(0, 24))
     plt.grid(axis='y', linestyle='--', alpha=0.7)
@@ -65,39 +104,112 @@ def visualize_results(hour_activity, best_hours):
 
 
 # Формирование рекомендаций
-def generate_recommendations(hour_activity, best_hours):
+def generate_recommendations(hour_activity, best_hours, timezone_hours):
     print("\nРекомендации по времени отправки кампаний:")
 
     print("\nТоп-5 часов активности:")
     print(tabulate(hour_activity.nlargest(5, 'clicks_count'),
-                   headers=['Час (UTC)', 'Кликов', 'Доля,%'],
+                   headers=['Час (местный)', 'Кликов', 'Доля,%'],
                    tablefmt='pretty',
                    floatfmt=".1f"))
 
-    print("\nЛучшее время для отправки (UTC):")
+    print("\nЛучшее время для получения (местное время клиента):")
     for i, hour in enumerate(best_hours, 1):
-        print(f"{i}. {hour:02d}:00 - {hour + 1:02d}:00")
+        print(f"{i}. {hour:02d}:00 - {(hour + 1) % 24:02d}:00")
 
-    # Пример конвертации в московское время (UTC+3)
-    print("\nПример для Москвы (UTC+3):")
-    for hour in best_hours:
-        msk_hour = (hour + 3) % 24
-        print(f"- UTC {hour:02d}:00 → МСК {msk_hour:02d}:00")
+    # Когда отправлять, чтобы попасть в лучший местный час каждого пояса
+    print("\nВремя отправки по часовым поясам:")
+    rows = [[row.timezone, row.rank, f"{row.local_hour:02d}:00", f"{row.utc_hour:02d}:00", f"{row.msk_hour:02d}:00"]
+            for row in timezone_hours.itertuples()]
+    print(tabulate(rows,
+                   headers=['Часовой пояс', '#', 'Местное время', 'Отправка (UTC)', 'Отправка (МСК)'],
+                   tablefmt='pretty'))
+
+
+# Матрица часов недели для рекомендаций по срезам
+def build_matrix(clicks):
+    print("\nПостроение матрицы регион x устройство x час недели...")
+    start_time = time()
+
+    local_ns, valid = local_click_times(clicks)
+    matrix = build_send_time_matrix(clicks['region'].to_numpy()[valid],
+                                    clicks['device'][valid],
+                                    clicks['campaign_id'].to_numpy()[valid],
+                                    hour_of_week(local_ns))
+
+    save_send_time_matrix(matrix, MATRIX_FILE)
+    print(f"Матрица построена за {time() - start_time:.1f} сек и сохранена в {MATRIX_FILE}")
+    return matrix
+
+
+def print_send_windows(recommendations, title):
+    print(f"\n{title}")
+    rows = [[row.rank, row.weekday_name, f"{row.start_hour:02d}:00-{row.end_hour:02d}:00",
+             f"{row.share:.2f}%", f"{row.observed_share:.2f}% [{row.ci_low:.2f}-{row.ci_high:.2f}]",
+             row.clicks, f"{row.lift:.2f}"]
+            + ([f"{row.send_utc_hour:02d}:00"] if 'send_utc_hour' in recommendations else [])
+            for row in recommendations.itertuples()]
+    headers = ['#', 'День', 'Местное время', 'Доля (сглаж.)', 'Фактическая доля [95% ДИ]', 'Кликов', 'Лифт']
+    if 'send_utc_hour' in recommendations:
+        headers.append('Отправка (UTC)')
+    print(tabulate(rows, headers=headers, tablefmt='pretty'))
+
+
+def print_region_windows(matrix, window_hours):
+    """Лучшее окно получения для каждого региона"""
+    rows = []
+    for region in matrix['region_codes']:
+        best = recommend_send_windows(matrix, regions=[int(region)], top_n=1, window_hours=window_hours).iloc[0]
+        rows.append([int(region), best['weekday_name'], f"{best['start_hour']:02d}:00-{best['end_hour']:02d}:00",
+                     f"{best['send_utc_hour']:02d}:00", f"{best['share']:.2f}%", best['clicks']])
+    print("\nЛучшее окно получения по регионам:")
+    print(tabulate(rows, headers=['Регион', 'День', 'Местное время', 'Отправка (UTC)', 'Доля', 'Кликов'],
+                   tablefmt='pretty'))
 
 
 # Главная функция
 def main():
+    parser = argparse.ArgumentParser(description='Оптимальное время отправки кампаний')
+    parser.add_argument('--region', type=int, nargs='+', help='Коды регионов')
+    parser.add_argument('--device', nargs='+', help='Устройства (Android, iPhone, ...)')
+    parser.add_argument('--campaign', type=int, nargs='+', help='ID кампаний (сегмент кампаний)')
+    parser.add_argument('--top', type=int, default=3, help='Сколько окон рекомендовать')
+    parser.add_argument('--window', type=int, default=2, help='Длина окна в часах')
+    args = parser.parse_args()
+
+    if args.campaign and (args.region or args.device):
+        parser.error('--campaign не сочетается с --region и --device')
+    if not 1 <= args.window <= 24:
+        parser.error('--window должно быть от 1 до 24 часов')
+
+    # Запрос по срезу отвечается по сохраненной матрице, без чтения кликов
+    if (args.region or args.device or args.campaign) and MATRIX_FILE.exists():
+        matrix = load_send_time_matrix(MATRIX_FILE)
+        recommendations = recommend_send_windows(matrix, args.region, args.device, args.campaign,
+                                                 top_n=args.top, window_hours=args.window)
+        print_send_windows(recommendations, "Лучшие окна получения для выбранного среза:")
+        return
+
     # Загрузка данных
     clicks = load_clicks_data()
 
     # Анализ активности
-    hour_activity, best_hours = analyze_activity(clicks)
+    hour_activity, best_hours, timezone_hours = analyze_activity(clicks)
 
     # Визуализация
     visualize_results(hour_activity, best_hours)
 
     # Рекомендации
-    generate_recommendations(hour_activity, best_hours)
+    generate_recommendations(hour_activity, best_hours, timezone_hours)
+
+    # Матрица часов недели и рекомендации по регионам / выбранному срезу
+    matrix = build_matrix(clicks)
+    if args.region or args.device or args.campaign:
+        recommendations = recommend_send_windows(matrix, args.region, args.device, args.campaign,
+                                                 top_n=args.top, window_hours=args.window)
+        print_send_windows(recommendations, "Лучшие окна получения для выбранного среза:")
+    else:
+        print_region_windows(matrix, args.window)
 
     print("\nАнализ завершен. Результаты сохранены в:", PLOTS_DIR)
 
@@ -0,0 +1,174 @@
+import pandas as pd
+import sys
+from time import time
+import matplotlib.pyplot as plt
+import seaborn as sns
+from tabulate import tabulate
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from metrics.common.time_series import ANOMALY_Z, ROLLING_WINDOWS, ZSCORE_WINDOW, daily_metrics, dense_daily
+
+# Настройка стиля графиков
+plt.style.use('seaborn-v0_8')
+sns.set_palette("husl")
+
+# ========================================
+# Конфигурация
+# ========================================
+PROJECT_ROOT = Path(__file__).parent.parent.parent  # Поднимаемся на уровень выше metrics/
+(PROJECT_ROOT / 'processed_data').mkdir(parents=True, exist_ok=True)
+CLICKS_PER_DAY_FILE = PROJECT_ROOT / 'processed_data' / 'processed_data_per_day.parquet'
+CAMPAIGNS_PER_DAY_FILE = PROJECT_ROOT / 'processed_data' / 'campaign_dynamics_daily.parquet'
+PLOTS_DIR = PROJECT_ROOT / 'plots'
+OUTPUT_FILE = PROJECT_ROOT / 'processed_data' / 'time_series_daily.parquet'
+
+
+# ========================================
+# Загрузка данных
+# ========================================
+def load_data():
+    """Дневные итоги кликов и созданных кампаний (результаты clicks_per_day_and_month и campaign_dinamics)"""
+    print("Загрузка дневных рядов...")
+    start_time = time()
+
+    try:
+        clicks_per_day = pd.read_parquet(CLICKS_PER_DAY_FILE, columns=['click_date', 'total_clicks'])
+        campaigns_per_day = pd.read_parquet(CAMPAIGNS_PER_DAY_FILE, columns=['date', 'campaigns_count'])
+
+        print(f"Данные загружены за {time() - start_time:.1f} сек")
+        print(f"Дней с кликами: {len(clicks_per_day):,}")
+        print(f"Дней с созданными кампаниями: {len(campaigns_per_day):,}")
+
+        return clicks_per_day, campaigns_per_day
+
+    except Exception as e:
+        print(f"Ошибка загрузки данных: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+def day_numbers(dates):
+    """Номера дней от начала эпохи для колонки дат (datetime.date или datetime64)"""
+    return pd.to_datetime(dates).to_numpy('datetime64[D]').astype('int64')
+
+
+# ========================================
+# Расчет метрик временных рядов
+# ========================================
+def analyze_time_series(clicks_per_day, campaigns_per_day):
+    """Одна широкая таблица по всем дням общего диапазона: метрики кликов и созданных кампаний"""
+    print("\nРасчет скользящих метрик...")
+    start_time = time()
+
+    click_days = day_numbers(clicks_per_day['click_date'])
+    campaign_days = day_numbers(campaigns_per_day['date'])
+    first_day = min(click_days.min(), campaign_days.min())
+    last_day = max(click_days.max(), campaign_days.max())
+
+    days, clicks = dense_daily(click_days, clicks_per_day['total_clicks'], first_day, last_day)
+    _, campaigns = dense_daily(campaign_days, campaigns_per_day['campaigns_count'], first_day, last_day)
+
+    time_series = pd.concat([
+        pd.DataFrame({'date': days.view('datetime64[D]').astype('datetime64[ns]')}),
+        daily_metrics(clicks, 'clicks'),
+        daily_metrics(campaigns, 'campaigns')
+    ], axis=1)
+
+    print(f"Расчет завершен за {time() - start_time:.1f} сек")
+    print(f"Дней в ряду: {len(time_series):,} ({time_series['date'].min():%Y-%m-%d} - "
+          f"{time_series['date'].max():%Y-%m-%d})")
+    print(f"Аномальных дней (|z| >= {ANOMALY_Z:g}): клики - {time_series['clicks_anomaly'].sum()}, "
+          f"кампании - {time_series['campaigns_anomaly'].sum()}")
+
+    return time_series
+
+
+# ========================================
+# Визуализация данных
+# ========================================
+def visualize_time_series(time_series):
+    import os
+    if not os.path.exists(PLOTS_DIR):
+        os.makedirs(PLOTS_DIR)
+
+    print("\nСоздание визуализаций...")
+
+    fig, axes = plt.subplots(2, 1, figsize=(14, 10), sharex=True)
+    for ax, name, title in ((axes[0], 'clicks', 'Клики'), (axes[1], 'campaigns', 'Созданные кампании')):
+        ax.plot(time_series['date'], time_series[name], color='lightgray', linewidth=1, label='За день')
+        for window in ROLLING_WINDOWS:
+            ax.plot(time_series['date'], time_series[f'{name}_{window}d'] / window, linewidth=2,
+                    label=f'Среднее за {window} дн.')
+
+        anomalies = time_series[time_series[f'{name}_anomaly']]
+        ax.scatter(anomalies['date'], anomalies[name], color='red', zorder=3,
+                   label=f'Аномалия (|z| >= {ANOMALY_Z:g})')
+        ax.set_title(f'{title}: скользящие средние и аномалии')
+        ax.set_ylabel(title)
+        ax.legend(loc='upper left')
+
+    axes[1].set_xlabel('Дата')
+    fig.tight_layout()
+    fig.savefig(f'{PLOTS_DIR}/time_series_trends.png')
+    plt.close(fig)
+
+    print(f"Графики сохранены в папку {PLOTS_DIR}")
+
+
+# ========================================
+# Сохранение результатов
+# ========================================
+def save_results(time_series):
+    print("\nСохранение результатов...")
+
+    try:
+        time_series.to_parquet(OUTPUT_FILE, engine='pyarrow')
+        print(f"Результаты сохранены в {OUTPUT_FILE}")
+    except Exception as e:
+        print(f"Ошибка при сохранении: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+# ========================================
+# Вывод красивых таблиц
+# ========================================
+def print_tables(time_series):
+    last = time_series.iloc[-1]
+    print(f"\nПоследний день ряда ({last['date']:%Y-%m-%d}):")
+    summary = [
+        [name, f"{last[f'{name}_7d']:,.0f}", f"{last[f'{name}_28d']:,.0f}",
+         f"{last[f'{name}_wow_pct']:+.1f}%", f"{last[f'{name}_cumulative']:,}"]
+        for name in ('clicks', 'campaigns')
+    ]
+    print(tabulate(summary, headers=['Ряд', 'За 7 дней', 'За 28 дней', 'Неделя к неделе', 'Всего'],
+                   tablefmt='pretty'))
+
+    # Самые сильные отклонения от базовой линии предыдущих дней
+    top_anomalies = time_series.loc[time_series['clicks_zscore'].abs().nlargest(5).index,
+                                    ['date', 'clicks', 'clicks_zscore']]
+    top_anomalies = top_anomalies.assign(date=top_anomalies['date'].dt.date,
+                                         clicks_zscore=top_anomalies['clicks_zscore'].round(2))
+    print(f"\nТоп-5 отклонений кликов от среднего за предыдущие {ZSCORE_WINDOW} дней:")
+    print(tabulate(top_anomalies, headers='keys', tablefmt='pretty', showindex=False))
+
+
+# ========================================
+# Главная функция
+# ========================================
+if __name__ == '__main__':
+    # Загрузка данных
+    clicks_per_day, campaigns_per_day = load_data()
+
+    # Расчет метрик
+    time_series = analyze_time_series(clicks_per_day, campaigns_per_day)
+
+    # Визуализация данных
+    visualize_time_series(time_series)
+
+    # Вывод таблиц
+    print_tables(time_series)
+
+    # Сохранение результатов
+    save_results(time_series)
+
+    print("\nГотово! Расчет временных рядов завершен.")
@@ -0,0 +1,266 @@
+import pandas as pd
+import numpy as np
+import sys
+from time import time
+from tabulate import tabulate
+from pathlib import Path
+import argparse
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from metrics.common.distinct import build_hll, hll_estimate, hll_union, merge_hll
+from metrics.common.parquet_stream import iter_parquet_batches, parquet_num_rows
+from metrics.common.timezones import NS_PER_DAY, hour_of_day, local_time_ns
+
+# ========================================
+# Конфигурация
+# ========================================
+PROJECT_ROOT = Path(__file__).parent.parent.parent  # Поднимаемся на уровень выше metrics/
+(PROJECT_ROOT / 'processed_data').mkdir(parents=True, exist_ok=True)
+CLICKS_FILE = PROJECT_ROOT / 'processed_data' / 'clicks_processed.parquet'
+OUTPUT_FILE = PROJECT_ROOT / 'processed_data' / 'unique_users_by_dimension.parquet'
+
+# Скетчи HyperLogLog по всем срезам для объединения с последующими запусками и запросов
+HLL_FILE = PROJECT_ROOT / 'processed_data' / 'unique_users_hll.parquet'
+
+# Из кликов читаются только эти колонки, пакетами
+CLICK_COLUMNS = ['uid', 'campaign_id', 'region', 'click_time']
+
+# Срезы уникальных пользователей: час и день по местному времени региона клика
+# (день - число дней с 1970-01-01), регион, кампания
+DIMENSIONS = ('hour', 'day', 'region', 'campaign')
+
+
+# ========================================
+# Загрузка данных
+# ========================================
+def load_data(click_files=(CLICKS_FILE,)):
+    print("Загрузка данных для подсчета уникальных пользователей...")
+
+    try:
+        # Клики не загружаются целиком: пакеты читаются партиция за партицией
+        clicks = (batch for path in click_files for batch in iter_parquet_batches(path, CLICK_COLUMNS))
+        print(f"Кликов: {sum(parquet_num_rows(path) for path in click_files):,}")
+        return clicks
+
+    except Exception as e:
+        print(f"Ошибка загрузки данных: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+def load_hll_state():
+    """Скетчи предыдущего запуска: {срез: DataFrame (group, register, rank)}"""
+    if not HLL_FILE.exists():
+        print("Скетчи предыдущего запуска не найдены, расчет начнется с нуля")
+        return None
+
+    state = pd.read_parquet(HLL_FILE)
+    return {dimension: part.drop(columns='dimension').reset_index(drop=True)
+            for dimension, part in state.groupby('dimension', observed=True)}
+
+
+# ========================================
+# Ключи срезов
+# ========================================
+def iter_dimension_keys(clicks):
+    """Для каждого пакета: {срез: (ключи группы, uid)}; клики без uid не учитываются"""
+    for batch in clicks:
+        batch = batch[batch['uid'].notna()]
+        uids = batch['uid'].to_numpy()
+
+        click_time = batch['click_time'].to_numpy('datetime64[ns]')
+        valid = ~np.isnat(click_time)
+        local_ns = local_time_ns(click_time[valid].view('int64'), batch['region'].to_numpy()[valid])
+
+        yield {
+            'hour': (hour_of_day(local_ns), uids[valid]),
+            'day': (local_ns // NS_PER_DAY, uids[valid]),
+            'region': (batch['region'].to_numpy(), uids),
+            'campaign': (batch['campaign_id'].to_numpy(), uids)
+        }
+
+
+# ========================================
+# Подсчет уникальных пользователей
+# ========================================
+def exact_unique_users(parts):
+    """Точный подсчет: все пары (группа, uid) собираются в памяти (режим для проверки скетчей)"""
+    pairs = {dimension: [] for dimension in DIMENSIONS}
+    for part in parts:
+        for dimension, (groups, uids) in part.items():
+            pairs[dimension].append(pd.DataFrame({'group': groups.astype('int64'), 'uid': uids}))
+
+    result = []
+    for dimension in DIMENSIONS:
+        merged = pd.concat(pairs[dimension], ignore_index=True)
+        unique = merged.groupby('group')['uid'].nunique()
+        result.append(pd.DataFrame({'dimension': dimension, 'group': unique.index, 'unique_users': unique.values}))
+        if dimension == 'region':
+            total = merged['uid'].nunique()
+
+    result.append(pd.DataFrame({'dimension': ['total'], 'group': [0], 'unique_users': [total]}))
+    return pd.concat(result, ignore_index=True)
+
+
+def sketch_unique_users(parts, previous_state=None):
+    """Оценка по скетчам HyperLogLog за один проход; uid в памяти не накапливаются
+
+    Скетчи объединяются взятием максимума, поэтому пакеты, партиции и запуски можно
+    объединять в любом порядке, а уникальные пользователи любого набора групп
+    считаются по скетчам без повторного чтения кликов. Скетч каждого пакета сразу
+    сворачивается в состояние, поэтому в памяти не больше группы x 2^12 регистров.
+    """
+    previous_state = previous_state or {}
+    state = {dimension: merge_hll([previous_state.get(dimension)]) for dimension in DIMENSIONS}
+    for part in parts:
+        for dimension, (groups, uids) in part.items():
+            state[dimension] = merge_hll([state[dimension], build_hll(groups, uids)])
+
+    result = []
+    for dimension in DIMENSIONS:
+        unique = hll_estimate(state[dimension])
+        result.append(pd.DataFrame({'dimension': dimension, 'group': unique.index, 'unique_users': unique.values}))
+
+    # Все пользователи - объединение скетчей всех регионов
+    result.append(pd.DataFrame({'dimension': ['total'], 'group': [0], 'unique_users': [hll_union(state['region'])]}))
+    return pd.concat(result, ignore_index=True), state
+
+
+def count_unique_users(clicks, mode='sketch', previous_state=None, validate=False):
+    """clicks - пакеты DataFrame с колонками CLICK_COLUMNS (или один DataFrame)
+
+    mode='exact' - точный nunique; mode='sketch' - оценка HyperLogLog, скетчи возвращаются
+    вторым значением (в точном режиме - None). validate=True дополнительно считает
+    точные значения по тем же кликам (колонка exact_users).
+    """
+    print(f"\nПодсчет уникальных пользователей (режим: {mode})...")
+    start_time = time()
+
+    if isinstance(clicks, pd.DataFrame):
+        clicks = [clicks]
+
+    parts = iter_dimension_keys(clicks)
+    if validate:
+        parts = list(parts)
+
+    if mode == 'sketch':
+        unique_users, state = sketch_unique_users(parts, previous_state)
+        if validate:
+            exact = exact_unique_users(parts).rename(columns={'unique_users': 'exact_users'})
+            unique_users = unique_users.merge(exact, on=['dimension', 'group'], how='left')
+    else:
+        unique_users, state = exact_unique_users(parts), None
+
+    unique_users['dimension'] = pd.Categorical(unique_users['dimension'], categories=[*DIMENSIONS, 'total'])
+    unique_users['group'] = unique_users['group'].astype('int64')
+
+    print(f"Подсчет завершен за {time() - start_time:.1f} сек")
+    total = unique_users.loc[unique_users['dimension'] == 'total', 'unique_users'].iloc[0]
+    print(f"Уникальных пользователей: {total:,}")
+
+    return unique_users, state
+
+
+# ========================================
+# Запросы к сохраненным скетчам
+# ========================================
+def parse_group_keys(dimension, keys):
+    """Ключи групп из командной строки; дни задаются датами YYYY-MM-DD"""
+    if dimension == 'day':
+        return pd.to_datetime(keys).to_numpy('datetime64[D]').astype('int64')
+    return np.array([int(key) for key in keys], dtype='int64')
+
+
+def query_union(dimension, keys):
+    """Уникальные пользователи в объединении групп одного среза - только по скетчам"""
+    state = load_hll_state()
+    if state is None or dimension not in state:
+        print(f"Нет скетчей среза {dimension}: сначала запустите подсчет в режиме sketch", file=sys.stderr)
+        sys.exit(1)
+
+    groups = parse_group_keys(dimension, keys)
+    unique = hll_union(state[dimension], groups)
+    print(f"\nУникальных пользователей ({dimension}: {', '.join(keys)}): {unique:,}")
+    return unique
+
+
+# ========================================
+# Сохранение результатов
+# ========================================
+def save_results(unique_users, state=None):
+    print("\nСохранение результатов...")
+
+    try:
+        unique_users.to_parquet(OUTPUT_FILE, engine='pyarrow')
+        print(f"Уникальные пользователи по срезам сохранены в {OUTPUT_FILE}")
+
+        # Скетчи сохраняются, чтобы следующий запуск и запросы могли их объединять
+        if state is not None:
+            hll = pd.concat([sketch.assign(dimension=dimension) for dimension, sketch in state.items()],
+                            ignore_index=True)
+            hll['dimension'] = pd.Categorical(hll['dimension'], categories=list(DIMENSIONS))
+            hll.to_parquet(HLL_FILE, engine='pyarrow')
+            print(f"Скетчи HyperLogLog сохранены в {HLL_FILE}")
+    except Exception as e:
+        print(f"Ошибка при сохранении: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+# ========================================
+# Вывод красивых таблиц
+# ========================================
+def print_tables(unique_users):
+    summary = unique_users.groupby('dimension', observed=True).agg(
+        groups=('group', 'size'),
+        max_unique_users=('unique_users', 'max')
+    ).reset_index()
+    print("\nУникальные пользователи по срезам:")
+    print(tabulate(summary, headers='keys', tablefmt='pretty', showindex=False))
+
+    # Ошибка оценки относительно точного подсчета (только с --validate)
+    if 'exact_users' in unique_users:
+        errors = unique_users.assign(
+            error_pct=(unique_users['unique_users'] / unique_users['exact_users'] - 1).abs() * 100
+        )
+        errors = errors.groupby('dimension', observed=True)['error_pct'].agg(['median', 'max']).round(2).reset_index()
+        print("\nОтносительная ошибка скетчей HyperLogLog, %:")
+        print(tabulate(errors, headers=['Срез', 'Медиана', 'Максимум'], tablefmt='pretty', showindex=False))
+
+
+# ========================================
+# Главная функция
+# ========================================
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Уникальные пользователи по часам, дням, регионам и кампаниям')
+    parser.add_argument('--mode', choices=['exact', 'sketch'], default='sketch',
+                        help='exact - точный nunique, sketch - скетчи HyperLogLog за один проход')
+    parser.add_argument('--clicks', nargs='+', type=Path, default=[CLICKS_FILE],
+                        help='Файлы кликов (партиции), обрабатываются по очереди')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Добавить клики к скетчам предыдущего запуска (только с --mode sketch)')
+    parser.add_argument('--validate', action='store_true',
+                        help='Сравнить оценки скетчей с точным подсчетом (только с --mode sketch)')
+    parser.add_argument('--union', nargs='+', metavar=('DIMENSION', 'KEY'),
+                        help='Уникальные пользователи объединения групп по сохраненным скетчам, '
+                             'например: --union region 77 50')
+    args = parser.parse_args()
+
+    if (args.incremental or args.validate) and args.mode != 'sketch':
+        parser.error('--incremental и --validate работают только с --mode sketch')
+
+    # Запрос к сохраненным скетчам, клики не читаются
+    if args.union:
+        if len(args.union) < 2 or args.union[0] not in DIMENSIONS:
+            parser.error(f"--union: срез ({', '.join(DIMENSIONS)}) и хотя бы один ключ группы")
+        query_union(args.union[0], args.union[1:])
+        sys.exit(0)
+
+    clicks = load_data(args.clicks)
+    previous_state = load_hll_state() if args.incremental else None
+
+    unique_users, state = count_unique_users(clicks, mode=args.mode, previous_state=previous_state,
+                                             validate=args.validate)
+
+    print_tables(unique_users)
+    save_results(unique_users, state)
+
+    print("\nГотово! Подсчет уникальных пользователей завершен.")
@@ -1,8 +1,12 @@
 from time import time
 import pandas as pd
+from pandas.api.types import union_categoricals
 from pathlib import Path
 import sys
 
+sys.path.append(str(Path(__file__).parent.parent))
+from metrics.common.languages import normalize_languages
+
 # ========================================
 # Конфигурация - используем абсолютные пути
 # ========================================
@@ -22,9 +26,12 @@ DTYPES = {
     'OS': 'category',
     'browser': 'category',
     'device': 'category',
-    'language': 'str'
+    'language': 'category'
 }
 
+# Колонки-категории: словарь общий для всех чанков и сохраняется в Parquet
+CATEGORY_COLUMNS = [column for column, dtype in DTYPES.items() if dtype == 'category']
+
 BOT_KEYWORDS = ['bot', 'axios', 'spider', 'crawler']
 VALID_DEVICES = ['Android', 'iPhone', 'Generic_Android', 'Samsung']
 
@@ -56,6 +63,9 @@ def process_chunks():
             is_valid_device = chunk['device'].isin(VALID_DEVICES)
             filtered_chunk = chunk[~is_bot & is_valid_device]
 
+            # Язык хранится словарем: варианты (ru-RU, RU, ru) сводятся к одному коду
+            filtered_chunk = filtered_chunk.assign(language=normalize_languages(filtered_chunk['language']))
+
             result_chunks.append(filtered_chunk)
             stats['total_rows'] += len(chunk)
             stats['filtered_rows'] += len(filtered_chunk)
@@ -73,7 +83,14 @@ def process_chunks():
                     f"Время: {elapsed:.1f} сек"
                 )
 
-        df_final = pd.concat(result_chunks, ignore_index=True)
+        # У каждого чанка свой набор категорий, и pd.concat превратил бы такие колонки в object:
+        # приводим чанки к объединенному словарю (перекодируются только коды)
+        categories = {
+            column: pd.CategoricalDtype(union_categoricals([chunk[column] for chunk in result_chunks],
+                                                           sort_categories=True).categories)
+            for column in CATEGORY_COLUMNS
+        }
+        df_final = pd.concat([chunk.astype(categories) for chunk in result_chunks], ignore_index=True)
 
         print("\n" + "=" * 50)
         print(f"ОБРАБОТКА ЗАВЕРШЕНА")
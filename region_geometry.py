@@ -0,0 +1,237 @@
+# region_geometry.py
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ========================================
+# Конфигурация
+# ========================================
+# Границы регионов РФ (GeoJSON, WGS84, admin-1), хранятся локально вместе с дашбордом; у объектов -
+# свойство region_id с кодом из REGION_NAMES дашборда. Без файла карта строится по центроидам,
+# формат и упрощение проверяются на tests/fixtures/region_grid.geojson
+GEOJSON_FILE = Path(__file__).parent / 'assets' / 'geo' / 'russia_regions.geojson'
+
+# Свойство объекта с кодом региона; если его нет - регион ищется по названию
+REGION_ID_PROPERTY = 'region_id'
+REGION_NAME_PROPERTIES = ('name', 'name_ru', 'NAME_1', 'region_name')
+
+# Уровни детализации: допуск упрощения в градусах (0 - самый грубый)
+SIMPLIFY_TOLERANCES = (0.15, 0.05, 0.01)
+
+# Масштаб карты (geo.projection.scale), начиная с которого включается уровень
+LEVEL_MIN_SCALE = (0, 2.5, 6)
+
+# Точность сравнения вершин соседних регионов (градусы)
+COORD_PRECISION = 6
+
+
+# ========================================
+# Упрощение линий (Дуглас-Пекер)
+# ========================================
+def _douglas_peucker(points, tolerance):
+    """Маска сохраняемых точек ломаной; первая и последняя точки сохраняются всегда"""
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+
+        a, b = points[start], points[end]
+        inner = points[start + 1:end]
+        ab = b - a
+        length = np.hypot(ab[0], ab[1])
+        if length == 0:
+            dist = np.hypot(inner[:, 0] - a[0], inner[:, 1] - a[1])
+        else:
+            dist = np.abs(ab[0] * (inner[:, 1] - a[1]) - ab[1] * (inner[:, 0] - a[0])) / length
+
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+
+    return keep
+
+
+# ========================================
+# Топологическое упрощение: общие границы упрощаются один раз
+# ========================================
+def _iter_rings(geometry):
+    if geometry['type'] == 'Polygon':
+        polygons = [geometry['coordinates']]
+    elif geometry['type'] == 'MultiPolygon':
+        polygons = geometry['coordinates']
+    else:
+        polygons = []
+
+    for polygon in polygons:
+        rings = []
+        for ring in polygon:
+            ring = np.round(np.asarray(ring, dtype='float64')[:, :2], COORD_PRECISION)
+            if not np.array_equal(ring[0], ring[-1]):
+                ring = np.vstack([ring, ring[:1]])
+            rings.append(ring)
+        yield rings
+
+
+def _junctions(polygons_by_feature):
+    """Вершины, в которых меняется набор колец (стыки границ соседних регионов)"""
+    owners = {}
+    for feature_polygons in polygons_by_feature:
+        for polygon in feature_polygons:
+            for ring in polygon:
+                ring_id = id(ring)
+                for vertex in map(tuple, ring[:-1]):
+                    owners.setdefault(vertex, set()).add(ring_id)
+
+    junctions = set()
+    for feature_polygons in polygons_by_feature:
+        for polygon in feature_polygons:
+            for ring in polygon:
+                vertices = [tuple(v) for v in ring[:-1]]
+                for i, vertex in enumerate(vertices):
+                    if (owners[vertex] != owners[vertices[i - 1]]
+                            or owners[vertex] != owners[vertices[(i + 1) % len(vertices)]]):
+                        junctions.add(vertex)
+    return junctions
+
+
+def _simplify_ring(ring, junctions, tolerance, arc_cache):
+    """Упрощает кольцо по дугам между стыками; одна и та же дуга соседей упрощается одинаково"""
+    vertices = ring[:-1]
+    fixed = [i for i, v in enumerate(map(tuple, vertices)) if v in junctions]
+    if not fixed:
+        # Кольцо без стыков (остров или анклав) начинаем с минимальной вершины
+        fixed = [int(np.lexsort((vertices[:, 1], vertices[:, 0]))[0])]
+
+    # Начинаем кольцо со стыка, чтобы дуги не разрезались на границе массива
+    vertices = np.roll(vertices, -fixed[0], axis=0)
+    fixed = [i - fixed[0] for i in fixed] + [len(vertices)]
+    closed = np.vstack([vertices, vertices[:1]])
+
+    result = []
+    for start, end in zip(fixed[:-1], fixed[1:]):
+        arc = closed[start:end + 1]
+
+        # Каноническое направление дуги: у соседнего региона она записана в обратном порядке
+        reverse = (tuple(arc[0]), tuple(arc[1])) > (tuple(arc[-1]), tuple(arc[-2]))
+        canonical = arc[::-1] if reverse else arc
+        key = canonical.tobytes()
+        if key not in arc_cache:
+            arc_cache[key] = canonical[_douglas_peucker(canonical, tolerance)]
+        simplified = arc_cache[key][::-1] if reverse else arc_cache[key]
+
+        result.append(simplified[:-1])
+
+    result = np.vstack(result)
+    return np.vstack([result, result[:1]])
+
+
+def simplify_features(features, tolerance, junctions, polygons_by_feature):
+    """Упрощенная копия объектов GeoJSON для одного уровня детализации"""
+    arc_cache = {}
+    simplified = []
+
+    for feature, feature_polygons in zip(features, polygons_by_feature):
+        polygons = []
+        for polygon in feature_polygons:
+            rings = [_simplify_ring(ring, junctions, tolerance, arc_cache) for ring in polygon]
+            # Внешнее кольцо, выродившееся в отрезок, отбрасываем вместе с дырами
+            if len(rings[0]) < 4:
+                continue
+            polygons.append([ring.tolist() for ring in rings if len(ring) >= 4])
+
+        # Мелкий регион не должен исчезнуть с карты целиком
+        if not polygons:
+            polygons = [[ring.tolist() for ring in polygon] for polygon in feature_polygons]
+
+        simplified.append({
+            'type': 'Feature',
+            'id': feature['id'],
+            'properties': feature.get('properties', {}),
+            'geometry': {'type': 'MultiPolygon', 'coordinates': polygons}
+        })
+
+    return {'type': 'FeatureCollection', 'features': simplified}
+
+
+# ========================================
+# Загрузка и кэширование геометрии
+# ========================================
+def _region_id(feature, name_to_id):
+    properties = feature.get('properties') or {}
+    if properties.get(REGION_ID_PROPERTY) is not None:
+        return int(properties[REGION_ID_PROPERTY])
+    for name_property in REGION_NAME_PROPERTIES:
+        name = str(properties.get(name_property, '')).strip().lower()
+        if name in name_to_id:
+            return name_to_id[name]
+    return None
+
+
+def load_region_geometry(region_names, geojson_file=GEOJSON_FILE, cache_file=None,
+                         tolerances=SIMPLIFY_TOLERANCES):
+    """Геометрия регионов по уровням детализации: {уровень: FeatureCollection}; None, если файла нет"""
+    geojson_file = Path(geojson_file)
+    if not geojson_file.exists():
+        logger.warning(f"Файл границ регионов {geojson_file} не найден, карта будет построена по центроидам")
+        return None
+
+    # Кэш действителен, пока не изменился исходный файл и набор уровней
+    if cache_file is not None and Path(cache_file).exists():
+        with open(cache_file, encoding='utf-8') as f:
+            cached = json.load(f)
+        if (cached.get('source_mtime') == geojson_file.stat().st_mtime
+                and cached.get('tolerances') == list(tolerances)):
+            logger.info(f"Геометрия регионов загружена из кэша {cache_file}")
+            return {int(level): geometry for level, geometry in cached['levels'].items()}
+
+    with open(geojson_file, encoding='utf-8') as f:
+        source = json.load(f)
+
+    name_to_id = {name.lower(): region_id for region_id, name in region_names.items()}
+    features = []
+    for feature in source['features']:
+        region_id = _region_id(feature, name_to_id)
+        if region_id is None or feature.get('geometry') is None:
+            continue
+        features.append({**feature, 'id': region_id})
+
+    polygons_by_feature = [list(_iter_rings(feature['geometry'])) for feature in features]
+    junctions = _junctions(polygons_by_feature)
+
+    levels = {}
+    for level, tolerance in enumerate(tolerances):
+        levels[level] = simplify_features(features, tolerance, junctions, polygons_by_feature)
+        vertices = sum(len(ring) for feature in levels[level]['features']
+                       for polygon in feature['geometry']['coordinates'] for ring in polygon)
+        logger.info(f"Геометрия регионов, уровень {level} (допуск {tolerance}°): {vertices:,} вершин")
+
+    if cache_file is not None:
+        Path(cache_file).parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'source_mtime': geojson_file.stat().st_mtime,
+                'tolerances': list(tolerances),
+                'levels': levels
+            }, f)
+
+    return levels
+
+
+def level_for_scale(scale, n_levels=len(SIMPLIFY_TOLERANCES)):
+    """Уровень детализации для текущего масштаба карты"""
+    level = 0
+    for i, min_scale in enumerate(LEVEL_MIN_SCALE[:n_levels]):
+        if scale >= min_scale:
+            level = i
+    return level
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Общие модули импортируются как metrics.common.*, как в скриптах метрик
+sys.path.append(str(Path(__file__).parent.parent))
@@ -0,0 +1,159 @@
+# Проверка общих ядер агрегации и интервалов времени против pandas
+import numpy as np
+import pandas as pd
+import pytest
+
+from metrics.common.aggregations import add_percentage, aggregate_by_key, count_by_key, distinct_by_key
+from metrics.common.time_buckets import BUCKET_UNITS, bucket_labels, bucket_start, time_bucket
+
+# ========================================
+# Данные
+# ========================================
+PANDAS_FREQ = {'hour': 'h', 'day': 'D', 'week': 'W-SUN', 'month': 'M', 'quarter': 'Q'}
+
+
+def sample_frame(n=5000, seed=0):
+    """Ключи и значения с пропусками: строковый ключ, целые и строковые значения"""
+    rng = np.random.default_rng(seed)
+    keys = pd.Series(rng.choice(['a', 'b', 'c', 'd', None], n), dtype=object)
+    numbers = pd.Series(rng.integers(0, 50, n).astype('float64'))
+    numbers[rng.random(n) < 0.1] = np.nan
+    labels = pd.Series(rng.choice(['x', 'y', 'z', None], n), dtype=object)
+    return pd.DataFrame({'key': keys, 'number': numbers, 'label': labels})
+
+
+def pandas_reference(frame, value):
+    return (frame.groupby('key', sort=True)[value].agg(['count', 'nunique'])
+            .reset_index().rename(columns={'count': 'clicks', 'nunique': 'users'}))
+
+
+# ========================================
+# Счетчики по ключу
+# ========================================
+def test_count_by_key_matches_value_counts():
+    codes = np.random.default_rng(1).integers(0, 7, 1000)
+    expected = pd.Series(codes).value_counts().reindex(range(10), fill_value=0).to_numpy()
+    np.testing.assert_array_equal(count_by_key(codes, 10), expected)
+
+
+def test_count_by_key_weights():
+    codes = np.array([0, 2, 2, 1, 0])
+    weights = np.array([1.5, 2.0, 3.0, 0.5, 1.0])
+    expected = pd.Series(weights).groupby(codes).sum().to_numpy()
+    np.testing.assert_allclose(count_by_key(codes, 3, weights), expected)
+
+
+def test_count_by_key_empty():
+    result = count_by_key(np.array([], dtype='int64'), 4)
+    np.testing.assert_array_equal(result, np.zeros(4, dtype='int64'))
+
+
+@pytest.mark.parametrize('value', ['number', 'label'])
+def test_distinct_by_key_matches_nunique(value):
+    frame = sample_frame()
+    frame = frame[frame['key'].notna()]
+    codes, uniques = pd.factorize(frame['key'], sort=True)
+    expected = frame.groupby('key', sort=True)[value].nunique().reindex(uniques, fill_value=0).to_numpy()
+    np.testing.assert_array_equal(distinct_by_key(codes, frame[value].to_numpy(), len(uniques)), expected)
+
+
+def test_distinct_by_key_all_null_and_empty():
+    np.testing.assert_array_equal(distinct_by_key(np.array([0, 1, 1]), np.array([None, None, None]), 3), [0, 0, 0])
+    np.testing.assert_array_equal(distinct_by_key(np.array([], dtype='int64'), np.array([]), 2), [0, 0])
+
+
+# ========================================
+# Аналог groupby().agg(count, nunique)
+# ========================================
+@pytest.mark.parametrize('value', ['number', 'label'])
+def test_aggregate_by_key_matches_groupby(value):
+    frame = sample_frame()
+    result = aggregate_by_key(frame['key'], frame[value], key_name='key', count_name='clicks', distinct_name='users')
+    pd.testing.assert_frame_equal(result, pandas_reference(frame, value), check_dtype=False)
+
+
+def test_aggregate_by_key_without_values_counts_rows():
+    frame = sample_frame()
+    result = aggregate_by_key(frame['key'], key_name='key', count_name='clicks')
+    expected = frame.groupby('key', sort=True).size().rename('clicks').reset_index()
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_aggregate_by_key_null_keys_only():
+    result = aggregate_by_key(pd.Series([None, np.nan], dtype=object), pd.Series([1, 2]),
+                              key_name='key', count_name='clicks', distinct_name='users')
+    assert list(result.columns) == ['key', 'clicks', 'users']
+    assert result.empty
+
+
+def test_aggregate_by_key_empty_input():
+    frame = sample_frame().iloc[:0]
+    result = aggregate_by_key(frame['key'], frame['number'], key_name='key', count_name='clicks', distinct_name='users')
+    assert list(result.columns) == ['key', 'clicks', 'users']
+    assert result.empty
+
+
+def test_add_percentage():
+    frame = sample_frame()
+    table = aggregate_by_key(frame['key'], key_name='key', count_name='clicks')
+    expected = table['clicks'] / table['clicks'].sum() * 100
+    np.testing.assert_allclose(add_percentage(table, 'clicks')['percentage'], expected)
+    assert add_percentage(table, 'clicks')['percentage'].sum() == pytest.approx(100)
+
+    result = add_percentage(table.copy(), 'clicks', name='share', total=len(frame))
+    np.testing.assert_allclose(result['share'], table['clicks'] / len(frame) * 100)
+
+
+def test_add_percentage_empty():
+    table = add_percentage(pd.DataFrame({'clicks': pd.Series(dtype='int64')}), 'clicks')
+    assert 'percentage' in table and table.empty
+
+
+# ========================================
+# Интервалы времени, включая время до 1970 года
+# ========================================
+def sample_times(n=3000, seed=2):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('1965-01-01').value
+    end = pd.Timestamp('1975-12-31').value
+    times = np.sort(rng.integers(start, end, n))
+    # Границы интервалов вокруг эпохи
+    edges = pd.to_datetime(['1969-12-31 23:59:59.999999999', '1970-01-01', '1969-12-29', '1969-12-28 23:00',
+                            '1969-12-01', '1969-11-30 23:59', '1969-10-01', '1969-09-30 12:00'], format='ISO8601').asi8
+    return np.r_[times, edges]
+
+
+@pytest.mark.parametrize('unit', BUCKET_UNITS)
+def test_time_bucket_matches_pandas_periods(unit):
+    times = sample_times()
+    codes = time_bucket(times, unit)
+    expected = pd.DatetimeIndex(times).to_period(PANDAS_FREQ[unit]).start_time
+    np.testing.assert_array_equal(bucket_start(codes, unit), expected.to_numpy())
+
+    # Номера идут подряд: соседние интервалы отличаются на единицу
+    starts = pd.DatetimeIndex(times).to_period(PANDAS_FREQ[unit])
+    np.testing.assert_array_equal(codes - codes.min(), (starts - starts.min()).map(lambda offset: offset.n))
+
+
+@pytest.mark.parametrize('unit', BUCKET_UNITS)
+def test_bucket_labels_match_pandas(unit):
+    times = sample_times()
+    labels = bucket_labels(time_bucket(times, unit), unit)
+    periods = pd.DatetimeIndex(times).to_period(PANDAS_FREQ[unit])
+
+    if unit == 'hour':
+        expected = periods.start_time.to_numpy()
+    elif unit in ('day', 'week'):
+        expected = periods.start_time.date
+    elif unit == 'month':
+        expected = periods.strftime('%Y-%m')
+    else:
+        expected = periods.strftime('%YQ%q')
+    np.testing.assert_array_equal(labels, np.asarray(expected))
+
+
+def test_unknown_unit():
+    with pytest.raises(ValueError):
+        time_bucket(np.array([0]), 'minute')
+    with pytest.raises(ValueError):
+        bucket_labels(np.array([0]), 'minute')
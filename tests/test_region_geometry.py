@@ -0,0 +1,148 @@
+# Проверка топологического упрощения границ регионов на небольшой сетке соседних регионов
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from region_geometry import COORD_PRECISION, load_region_geometry
+
+# ========================================
+# Данные
+# ========================================
+# Сетка 3 x 2 региона с извилистыми общими границами, город-анклав внутри области (дыра),
+# остров и объект без соответствия в справочнике
+FIXTURE = Path(__file__).parent / 'fixtures' / 'region_grid.geojson'
+
+REGION_NAMES = {
+    33: "Владимирская область",
+    40: "Калужская область",
+    50: "Московская область",
+    62: "Рязанская область",
+    69: "Тверская область",
+    76: "Ярославская область",
+    77: "Москва"
+}
+
+TOLERANCES = (0.15, 0.05, 0.01)
+
+
+@pytest.fixture(scope='module')
+def levels():
+    return load_region_geometry(REGION_NAMES, FIXTURE, tolerances=TOLERANCES)
+
+
+def source_vertices():
+    """Вершины каждого региона в исходном файле (с тем же округлением, что при загрузке)"""
+    with open(FIXTURE, encoding='utf-8') as f:
+        features = json.load(f)['features']
+    name_to_id = {name: region_id for region_id, name in REGION_NAMES.items()}
+
+    vertices = {}
+    for feature in features:
+        properties = feature['properties']
+        region_id = properties.get('region_id', name_to_id.get(properties.get('name')))
+        if region_id is None:
+            continue
+        geometry = feature['geometry']
+        polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+        vertices[region_id] = {tuple(np.round(point, COORD_PRECISION)) for polygon in polygons
+                               for ring in polygon for point in ring}
+    return vertices
+
+
+def feature_vertices(collection):
+    return {feature['id']: {tuple(point) for polygon in feature['geometry']['coordinates']
+                            for ring in polygon for point in ring}
+            for feature in collection['features']}
+
+
+def vertex_count(collection):
+    return sum(len(ring) for feature in collection['features']
+               for polygon in feature['geometry']['coordinates'] for ring in polygon)
+
+
+# ========================================
+# Уровни и сопоставление регионов
+# ========================================
+def test_levels_and_region_ids(levels):
+    assert sorted(levels) == list(range(len(TOLERANCES)))
+    for collection in levels.values():
+        # Рязанская область сопоставлена по названию, неизвестная территория отброшена
+        assert sorted(feature['id'] for feature in collection['features']) == sorted(REGION_NAMES)
+
+
+def test_coarser_levels_have_fewer_vertices(levels):
+    counts = [vertex_count(levels[level]) for level in sorted(levels)]
+    source = sum(len(vertices) for vertices in source_vertices().values())
+    assert counts == sorted(counts)
+    assert counts[0] < counts[-1] < source
+
+
+def test_rings_stay_closed(levels):
+    for collection in levels.values():
+        for feature in collection['features']:
+            for polygon in feature['geometry']['coordinates']:
+                for ring in polygon:
+                    assert len(ring) >= 4 and ring[0] == ring[-1]
+
+
+# ========================================
+# Общие границы упрощаются одинаково у обоих соседей
+# ========================================
+@pytest.mark.parametrize('level', range(len(TOLERANCES)))
+def test_shared_borders_identical(levels, level):
+    source = source_vertices()
+    simplified = feature_vertices(levels[level])
+
+    shared_pairs = 0
+    for a in source:
+        for b in source:
+            if a >= b:
+                continue
+            border = source[a] & source[b]
+            if len(border) < 3:
+                continue
+            shared_pairs += 1
+            # Упрощение только отбрасывает вершины, поэтому граница соседей совпадает как множество вершин
+            assert simplified[a] & border == simplified[b] & border, (a, b)
+            assert len(simplified[a] & border) < len(border)
+
+    # Соседи по сетке и область с городом внутри
+    assert shared_pairs >= 8
+
+
+def test_junctions_kept(levels):
+    """Вершины, общие для трех и более регионов (узлы сетки), сохраняются на всех уровнях"""
+    source = source_vertices()
+    owners = {}
+    for region_id, vertices in source.items():
+        for vertex in vertices:
+            owners.setdefault(vertex, set()).add(region_id)
+    junctions = {vertex for vertex, regions in owners.items() if len(regions) >= 3}
+    assert junctions
+
+    for collection in levels.values():
+        simplified = feature_vertices(collection)
+        for vertex in junctions:
+            assert all(vertex in simplified[region_id] for region_id in owners[vertex])
+
+
+# ========================================
+# Кэш и отсутствующий файл
+# ========================================
+def test_cache_roundtrip(levels, tmp_path):
+    cache_file = tmp_path / 'regions_simplified.json'
+    built = load_region_geometry(REGION_NAMES, FIXTURE, cache_file=cache_file, tolerances=TOLERANCES)
+    assert cache_file.exists()
+    cached = load_region_geometry(REGION_NAMES, FIXTURE, cache_file=cache_file, tolerances=TOLERANCES)
+    assert json.loads(json.dumps(built)) == json.loads(json.dumps(cached))
+    assert vertex_count(cached[0]) == vertex_count(levels[0])
+
+    # Другой набор уровней - кэш пересобирается
+    rebuilt = load_region_geometry(REGION_NAMES, FIXTURE, cache_file=cache_file, tolerances=TOLERANCES[:2])
+    assert sorted(rebuilt) == [0, 1]
+
+
+def test_missing_file(tmp_path):
+    assert load_region_geometry(REGION_NAMES, tmp_path / 'missing.geojson') is None